@@ -2,45 +2,340 @@
 FastAPI server for the enrichment API.
 Run with: uvicorn api.api_server:app --reload
 """
-from fastapi import FastAPI, HTTPException, Request
-from schemas.api_schema import EnrichRequest, EnrichResponse, ErrorResponse, Enrichment
-from core.preprocessing import fill_missing_fields, normalize_alert_types
-from core.io import push_to_elasticsearch
+from fastapi import FastAPI, HTTPException, Request, Response, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Tuple
+from schemas.api_schema import (
+    EnrichRequest, EnrichResponse, ErrorResponse, Enrichment, BatchItemResult, JobAccepted, JobStatus
+)
+from core.preprocessing import normalize_alert
+from schemas.output_schema import EnrichedAlertOutput
+from utils.validation import validate_input_alert
 from core.factory import get_llm_query_function
+from core.cost import meter, start_cost_rollup
+from core.metrics import time_stage, render_metrics, ALERTS_PROCESSED, FALLBACKS, FILTERED
+from core.filters import get_filter_engine, filtered_output, SKIP, YARA_ONLY
+from core.yara_integration import get_yara_matches
+from core.utils import enrichment_failed
+from core import codec
+from core.tracing import start_trace
+from core.profiler import start_profile
+from core.sinks import build_sinks
+from core.index_template import ensure_index_template
+from api.jobs import JobManager, QueueFull, check_callback_url
+from config import (
+    ADMIN_TOKEN, PROFILE_SECONDS, API_LLM_WORKERS, API_OUTPUT_SINKS,
+    BATCH_MAX_ITEMS, BATCH_MAX_BYTES, BATCH_CONCURRENCY, JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RESULT_TTL
+)
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import contextvars
 import datetime
+import hmac
+import threading
 
-app = FastAPI()
+# Provider calls and ES pushes block (HTTP, retry sleeps), so they run off the event loop
+_llm_executor = ThreadPoolExecutor(max_workers=API_LLM_WORKERS, thread_name_prefix="api-llm")
+_sinks = None
+_jobs = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _sinks, _jobs
+    start_cost_rollup()
+    get_filter_engine()  # Load filter rules now so a bad file fails at startup
+    await asyncio.get_running_loop().run_in_executor(None, ensure_index_template)
+    _sinks = build_sinks(API_OUTPUT_SINKS)
+    _jobs = JobManager(enrich_and_index, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE, result_ttl=JOB_RESULT_TTL)
+    _jobs.start()
+    yield
+    await _jobs.stop()
+    await asyncio.get_running_loop().run_in_executor(None, _sinks.close)
+    _llm_executor.shutdown(wait=False)
+
+class CodecJSONResponse(JSONResponse):
+    """Renders responses with the configured JSON codec (orjson/msgspec when installed)."""
+
+    def render(self, content) -> bytes:
+        return codec.dumps_bytes(content)
+
+app = FastAPI(lifespan=lifespan, default_response_class=CodecJSONResponse)
+
+# Built once so stateful wrappers (e.g. hedging latency history) persist across requests
+_query_llm = None
+_query_llm_lock = threading.Lock()
+
+def get_query_llm():
+    global _query_llm
+    # Called from pool threads: build exactly one instance (single-flight state must be shared)
+    with _query_llm_lock:
+        if _query_llm is None:
+            _query_llm = get_llm_query_function()
+    return _query_llm
+
+async def run_blocking(fn, *args):
+    """Runs a blocking call on the bounded provider pool, keeping the caller's trace context."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_llm_executor, contextvars.copy_context().run, fn, *args)
+
+async def index_document(doc):
+    """
+    Queues a document on the output sinks (API_OUTPUT_SINKS). A sink whose queue is full
+    gets it off-loop with its overflow policy, so SINK_OVERFLOW=block slows clients down.
+    """
+    if _sinks is None:
+        return
+    for sink in _sinks.offer(doc):
+        await asyncio.get_running_loop().run_in_executor(None, sink.put, doc)
+
+def enrich_document(alert: dict) -> Tuple[EnrichedAlertOutput, bool]:
+    """
+    Preprocesses, validates (once), filters and enriches one alert.
+
+    Args:
+        alert (dict): Unwrapped alert JSON.
+
+    Returns:
+        tuple: The enriched document, and whether to index it (False when the
+            pre-enrichment filter skipped the alert).
+
+    Raises:
+        pydantic.ValidationError: If the alert does not match the input schema.
+    """
+    ALERTS_PROCESSED.labels("api").inc()
+    with time_stage("preprocess"):
+        alert = normalize_alert(alert)
+    with time_stage("validation"):
+        alert_obj = validate_input_alert(alert)
+    with time_stage("filter"):
+        decision = get_filter_engine().route(alert_obj)
+    FILTERED.labels(decision.action, decision.rule).inc()
+    if decision.action == SKIP:
+        return filtered_output(alert_obj, decision), False
+    if decision.action == YARA_ONLY:
+        return filtered_output(alert_obj, decision, get_yara_matches(alert_obj)), True
+    query_llm = get_query_llm()
+    with time_stage("llm"):
+        enriched = query_llm(alert_obj)
+    if enrichment_failed(enriched):
+        FALLBACKS.labels("provider").inc()
+    return enriched, True
+
+def document_dict(enriched: EnrichedAlertOutput) -> dict:
+    """Response form of an enriched document (alert_id, timestamp, alert, enrichment)."""
+    return {
+        "alert_id": enriched.alert_id,
+        "timestamp": enriched.timestamp.isoformat() if hasattr(enriched.timestamp, 'isoformat') else str(enriched.timestamp),
+        "alert": enriched.alert.model_dump(),
+        "enrichment": enriched.enrichment.model_dump()
+    }
+
+def unwrap_alert(body):
+    """Accepts wrapped ({"alert": ...}), unwrapped, and ES/Kibana ({"_source": ...}) formats."""
+    if isinstance(body, dict):
+        if "alert" in body and isinstance(body["alert"], dict):
+            return body["alert"]
+        if "_source" in body and isinstance(body["_source"], dict):
+            return body["_source"]
+    return body
+
+async def enrich_and_index(alert) -> dict:
+    """Enriches one unwrapped alert off the event loop, queues it for indexing and returns its dict."""
+    alert_id = alert.get("id") if isinstance(alert, dict) else None
+    with start_trace(alert_id or "unknown", source="api"):
+        enriched, index = await run_blocking(enrich_document, alert)
+    if index:
+        await index_document(enriched)
+    return document_dict(enriched)
 
 @app.post("/v1/enrich", response_model=EnrichResponse, responses={400: {"model": ErrorResponse}})
 async def enrich_alert(request: Request):
     try:
         body = await request.json()
-        # Accept wrapped, unwrapped, and ES/Kibana formats
-        if isinstance(body, dict):
-            if "alert" in body and isinstance(body["alert"], dict):
-                alert = body["alert"]
-            elif "_source" in body and isinstance(body["_source"], dict):
-                alert = body["_source"]
-            else:
-                alert = body
-        else:
-            alert = body
-        alert = fill_missing_fields(alert)
-        alert = normalize_alert_types(alert)
-        query_llm = get_llm_query_function()
-        enriched = query_llm(alert)
-        es_doc = {
-            "alert_id": enriched.alert_id,
-            "timestamp": enriched.timestamp.isoformat() if hasattr(enriched.timestamp, 'isoformat') else str(enriched.timestamp),
-            "alert": enriched.alert.model_dump() if hasattr(enriched.alert, 'model_dump') else dict(enriched.alert),
-            "enrichment": enriched.enrichment.model_dump() if hasattr(enriched.enrichment, 'model_dump') else dict(enriched.enrichment)
-        }
-        push_to_elasticsearch(es_doc)
+        es_doc = await enrich_and_index(unwrap_alert(body))
         return EnrichResponse(
-            alert_id=enriched.alert_id,
+            alert_id=es_doc["alert_id"],
             timestamp=es_doc["timestamp"],
             alert=es_doc["alert"],
             enrichment=es_doc["enrichment"]
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+def parse_batch_body(raw: bytes, content_type: str) -> list:
+    """
+    Parses a batch body: a JSON array, or NDJSON (one alert per line).
+
+    Raises:
+        ValueError: If the body is neither.
+    """
+    text = raw.decode("utf-8").strip()
+    if not text:
+        return []
+    if text.startswith("[") and "ndjson" not in content_type:
+        items = codec.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of alerts")
+        return items
+    items = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(codec.loads(line))
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {lineno}: {e}")
+    return items
+
+async def read_batch_body(request: Request) -> bytes:
+    """
+    Reads a batch body, stopping with 413 as soon as it passes BATCH_MAX_BYTES (checked
+    against Content-Length first) or, for NDJSON, BATCH_MAX_ITEMS non-empty lines, so an
+    oversized request is never held in memory whole.
+    """
+    too_large = HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_BYTES} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > BATCH_MAX_BYTES:
+        raise too_large
+    ndjson = "ndjson" in request.headers.get("content-type", "") or None  # None: not known yet
+    chunks, size, lines, partial = [], 0, 0, b""
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > BATCH_MAX_BYTES:
+            raise too_large
+        chunks.append(chunk)
+        if ndjson is None and chunk.strip():
+            ndjson = not chunk.lstrip().startswith(b"[")
+        if ndjson:
+            *complete, partial = (partial + chunk).split(b"\n")
+            lines += sum(1 for line in complete if line.strip())
+            if lines > BATCH_MAX_ITEMS:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+    return b"".join(chunks)
+
+async def _enrich_batch_item(index: int, item, semaphore: asyncio.Semaphore) -> BatchItemResult:
+    async with semaphore:
+        try:
+            es_doc = await enrich_and_index(unwrap_alert(item))
+        except Exception as e:
+            return BatchItemResult(index=index, status="error", error=str(e))
+    return BatchItemResult(
+        index=index,
+        status="ok",
+        alert_id=es_doc["alert_id"],
+        timestamp=es_doc["timestamp"],
+        alert=es_doc["alert"],
+        enrichment=es_doc["enrichment"],
+    )
+
+@app.post(
+    "/v1/enrich/batch",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}, "description": "One BatchItemResult per line, in completion order"},
+        400: {"model": ErrorResponse},
+        413: {"model": ErrorResponse},
+    },
+)
+async def enrich_batch(request: Request):
+    """
+    Enriches a JSON array or NDJSON body of alerts, up to BATCH_CONCURRENCY at a time,
+    and streams one NDJSON result per item as it finishes. A failed item produces an
+    ``"status": "error"`` line and does not fail the batch.
+    """
+    try:
+        items = parse_batch_body(await read_batch_body(request), request.headers.get("content-type", ""))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+
+    async def results():
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+        tasks = [asyncio.ensure_future(_enrich_batch_item(i, item, semaphore)) for i, item in enumerate(items)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield result.model_dump_json() + "\n"
+        finally:
+            # Client went away: stop items that have not started
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post(
+    "/v1/jobs",
+    status_code=202,
+    response_model=JobAccepted,
+    responses={400: {"model": ErrorResponse}, 429: {"model": ErrorResponse}},
+)
+async def submit_job(request: Request, callback_url: Optional[str] = None):
+    """
+    Queues an alert (same formats as /v1/enrich) and returns a job id immediately.
+    Poll GET /v1/jobs/{job_id}, or pass ``callback_url`` (query or top-level body field)
+    to receive the finished job as a POST. Returns 429 with Retry-After when the queue is full.
+    """
+    try:
+        body = await request.json()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if isinstance(body, dict) and "callback_url" in body:
+        # Not part of the alert: keep it out of the prompt, fingerprint and indexed document
+        body_callback_url = body.pop("callback_url")
+        if isinstance(body_callback_url, str):
+            callback_url = callback_url or body_callback_url
+    if callback_url:
+        try:
+            # Resolves the host, so off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, check_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        job = _jobs.submit(unwrap_alert(body), callback_url)
+    except QueueFull as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return JobAccepted(job_id=job.id, status=job.status, status_url=f"/v1/jobs/{job.id}")
+
+@app.get("/v1/jobs/{job_id}", response_model=JobStatus, responses={404: {"model": ErrorResponse}})
+async def job_status(job_id: str):
+    """Job status; ``result`` holds the enriched document once the job has succeeded."""
+    job = _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
+@app.get("/v1/usage")
+async def usage():
+    """Token usage and estimated cost since startup, per provider/model, rule group and rule."""
+    return meter.snapshot()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (stage latency histograms, counters, gauges)."""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+@app.post("/admin/profile", status_code=202)
+async def profile(seconds: float = PROFILE_SECONDS, x_admin_token: Optional[str] = Header(None)):
+    """
+    Samples the running process with the statistical profiler for ``seconds`` and
+    writes collapsed stacks to PROFILE_OUTPUT_DIR. Requires X-Admin-Token; disabled
+    (404) while ADMIN_TOKEN is unset.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not 0 < seconds <= 300:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 300")
+    output_dir = start_profile(seconds)
+    return {"status": "started", "seconds": seconds, "output_dir": output_dir}
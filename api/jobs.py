@@ -0,0 +1,207 @@
+"""
+Asynchronous enrichment jobs for the API.
+A bounded in-process queue drained by a fixed number of worker tasks, with status polling and optional callbacks.
+"""
+# api/jobs.py
+import asyncio
+import ipaddress
+import math
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from config import CALLBACK_ALLOWED_HOSTS, CALLBACK_WORKERS, CALLBACK_TIMEOUT
+from core.logger import log
+from core.metrics import QUEUE_DEPTH
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised by ``JobManager.submit`` when the queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def check_callback_url(url: str, allowed_hosts: str = CALLBACK_ALLOWED_HOSTS) -> None:
+    """
+    Checks that a callback URL may be called: http(s), and a host in
+    CALLBACK_ALLOWED_HOSTS (``*.example.com`` matches subdomains) or, with no allowlist,
+    a host that resolves only to public addresses (no loopback, private, link-local or
+    reserved ranges), so clients cannot make the server call internal services.
+
+    Raises:
+        ValueError: If the URL is not allowed.
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError("callback_url must be an http(s) URL")
+    allowed = [h.strip().lower() for h in allowed_hosts.split(",") if h.strip()]
+    if allowed:
+        if not any(host == h or (h.startswith("*.") and host.endswith(h[1:])) for h in allowed):
+            raise ValueError(f"callback_url host {host} is not in CALLBACK_ALLOWED_HOSTS")
+        return
+    try:
+        infos = socket.getaddrinfo(host, parts.port or (443 if parts.scheme == "https" else 80),
+                                   proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"callback_url host {host} does not resolve: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"callback_url host {host} resolves to a non-public address")
+
+
+class Job:
+    """State of one submitted alert."""
+
+    def __init__(self, alert: Any, callback_url: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.alert = alert
+        self.callback_url = callback_url
+        self.status = QUEUED
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        iso = lambda d: d.isoformat() if d else None
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Bounded job queue processed by ``workers`` asyncio tasks.
+
+    Args:
+        handler (callable): Coroutine function ``handler(alert) -> dict`` producing the result.
+        workers (int): Jobs processed concurrently.
+        max_queue (int): Jobs waiting beyond the running ones; ``submit`` raises QueueFull past this.
+        result_ttl (float): Seconds finished jobs stay pollable.
+        callback_workers (int): Threads sending callbacks, apart from the job workers so a
+            slow callback endpoint does not delay other jobs.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[dict]],
+        workers: int = 8,
+        max_queue: int = 1000,
+        result_ttl: float = 3600.0,
+        callback_workers: int = CALLBACK_WORKERS,
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._tasks = []
+        self._avg_seconds = None  # EWMA of job duration, for Retry-After
+        self._depth = QUEUE_DEPTH.labels("jobs")
+        self._callbacks = ThreadPoolExecutor(max_workers=max(1, callback_workers), thread_name_prefix="job-callback")
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._callbacks.shutdown(wait=False, cancel_futures=True)
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely free, from the queue length and recent job duration."""
+        avg = self._avg_seconds or 1.0
+        return max(1, math.ceil(self._queue.qsize() * avg / self.workers))
+
+    def submit(self, alert: Any, callback_url: Optional[str] = None) -> Job:
+        """
+        Queues an alert for enrichment.
+
+        Raises:
+            QueueFull: If the queue is at capacity.
+        """
+        self._prune()
+        job = Job(alert, callback_url)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(self.retry_after())
+        self.jobs[job.id] = job
+        self._depth.inc()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished_at is not None and job.finished_at.timestamp() < cutoff
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._depth.dec()
+            job.status = RUNNING
+            job.started_at = datetime.now(timezone.utc)
+            start = time.perf_counter()
+            try:
+                job.result = await self.handler(job.alert)
+                job.status = SUCCEEDED
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            job.finished_at = datetime.now(timezone.utc)
+            job.alert = None
+            elapsed = time.perf_counter() - start
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.9 * self._avg_seconds + 0.1 * elapsed
+            if job.callback_url:
+                self._callbacks.submit(_send_callback, job)
+
+
+def _send_callback(job: Job):
+    """
+    POSTs the finished job to its callback URL (best effort, one retry). The URL is
+    checked again before sending, and redirects are not followed.
+    """
+    try:
+        check_callback_url(job.callback_url)
+    except ValueError as e:
+        log(f"Callback for job {job.id} not sent: {e}", tag="!")
+        return
+    for attempt in range(2):
+        try:
+            response = requests.post(job.callback_url, json=job.to_dict(), timeout=CALLBACK_TIMEOUT,
+                                     allow_redirects=False)
+            response.raise_for_status()
+            return
+        except requests.RequestException as e:
+            log(f"Callback for job {job.id} failed (attempt {attempt + 1}): {e}", tag="!")
+            time.sleep(1)
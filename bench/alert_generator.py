@@ -0,0 +1,234 @@
+"""
+Synthetic Wazuh alert generator for benchmarks.
+Produces alerts with a realistic (heavily skewed) mix of rules, levels, agents and full_log text.
+
+Usage:
+    python -m bench.alert_generator -n 10000 -o /tmp/alerts.json
+"""
+# bench/alert_generator.py
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+# (weight, rule) - weights approximate a typical manager: a few noisy rules dominate volume.
+RULE_CATALOG = [
+    (25.0, {"id": "5715", "level": 3, "description": "sshd: authentication success.",
+            "groups": ["syslog", "sshd", "authentication_success"], "decoder": "sshd", "program": "sshd",
+            "log": "{date} {host} sshd[{pid}]: Accepted password for {user} from {ip} port {port} ssh2",
+            "location": "/var/log/auth.log"}),
+    (15.0, {"id": "5402", "level": 3, "description": "Successful sudo to ROOT executed.",
+            "groups": ["syslog", "sudo"], "decoder": "sudo", "program": "sudo",
+            "log": "{date} {host} sudo: {user} : TTY=pts/0 ; PWD=/home/{user} ; USER=root ; COMMAND=/usr/bin/{cmd}",
+            "location": "/var/log/auth.log"}),
+    (15.0, {"id": "60106", "level": 3, "description": "Windows Logon Success",
+            "groups": ["windows", "windows_security", "authentication_success"], "decoder": "windows_eventchannel",
+            "program": "", "log": "", "location": "EventChannel"}),
+    (10.0, {"id": "550", "level": 7, "description": "Integrity checksum changed.",
+            "groups": ["ossec", "syscheck", "syscheck_entry_modified", "syscheck_file"],
+            "decoder": "syscheck_integrity_changed", "program": "",
+            "log": "File '/etc/{file}' modified\nMode: realtime\nChanged attributes: size,mtime,md5,sha1,sha256",
+            "location": "syscheck"}),
+    (8.0, {"id": "5710", "level": 5, "description": "sshd: Attempt to login using a non-existent user",
+           "groups": ["syslog", "sshd", "authentication_failed", "invalid_login"], "decoder": "sshd", "program": "sshd",
+           "log": "{date} {host} sshd[{pid}]: Invalid user {user} from {ip} port {port}",
+           "location": "/var/log/auth.log"}),
+    (6.0, {"id": "5760", "level": 5, "description": "sshd: authentication failed.",
+           "groups": ["syslog", "sshd", "authentication_failed"], "decoder": "sshd", "program": "sshd",
+           "log": "{date} {host} sshd[{pid}]: Failed password for {user} from {ip} port {port} ssh2",
+           "location": "/var/log/auth.log"}),
+    (6.0, {"id": "31101", "level": 5, "description": "Web server 400 error code.",
+           "groups": ["web", "accesslog", "attack"], "decoder": "web-accesslog", "program": "",
+           "log": "{ip} - - [{date}] \"GET /{path} HTTP/1.1\" 404 {size} \"-\" \"Mozilla/5.0\"",
+           "location": "/var/log/nginx/access.log"}),
+    (4.0, {"id": "554", "level": 5, "description": "File added to the system.",
+           "groups": ["ossec", "syscheck", "syscheck_entry_added", "syscheck_file"],
+           "decoder": "syscheck_new_entry", "program": "", "log": "File '/usr/local/bin/{file}' added\nMode: realtime",
+           "location": "syscheck"}),
+    (3.0, {"id": "502", "level": 3, "description": "Wazuh server started.",
+           "groups": ["ossec"], "decoder": "ossec", "program": "", "log": "ossec: Manager started.",
+           "location": "wazuh-monitord"}),
+    (2.0, {"id": "533", "level": 7, "description": "Listened ports status (netstat) changed (new port opened or closed).",
+           "groups": ["ossec"], "decoder": "ossec", "program": "",
+           "log": "ossec: output: 'netstat listening ports':\ntcp 0.0.0.0:{port} 0.0.0.0:* {pid}/{cmd}",
+           "location": "netstat listening ports"}),
+    (2.0, {"id": "553", "level": 7, "description": "File deleted.",
+           "groups": ["ossec", "syscheck", "syscheck_entry_deleted", "syscheck_file"],
+           "decoder": "syscheck_deleted", "program": "", "log": "File '/etc/{file}' deleted\nMode: realtime",
+           "location": "syscheck"}),
+    (1.5, {"id": "510", "level": 7, "description": "Host-based anomaly detection event (rootcheck).",
+           "groups": ["ossec", "rootcheck"], "decoder": "rootcheck", "program": "",
+           "log": "Trojaned version of file '/bin/{cmd}' detected. Signature used: 'bash|^/bin/sh'",
+           "location": "rootcheck"}),
+    (1.0, {"id": "31103", "level": 7, "description": "SQL injection attempt.",
+           "groups": ["web", "accesslog", "attack", "sql_injection"], "decoder": "web-accesslog", "program": "",
+           "log": "{ip} - - [{date}] \"GET /index.php?id=1%27%20UNION%20SELECT%20password%20FROM%20users-- HTTP/1.1\" 200 {size}",
+           "location": "/var/log/nginx/access.log"}),
+    (1.0, {"id": "23505", "level": 10, "description": "CVE-2024-6387 affects openssh-server",
+           "groups": ["vulnerability-detector"], "decoder": "json", "program": "", "log": "",
+           "location": "vulnerability-detector"}),
+    (0.8, {"id": "5712", "level": 10, "description": "sshd: brute force trying to get access to the system. Non existent user.",
+           "groups": ["syslog", "sshd", "authentication_failures"], "decoder": "sshd", "program": "sshd",
+           "log": "{date} {host} sshd[{pid}]: Invalid user {user} from {ip} port {port}",
+           "location": "/var/log/auth.log"}),
+    (0.2, {"id": "100010", "level": 12, "description": "Malware detected by YARA rule: MAL_WIPER_Unknown_Jun25_RID2F13",
+           "groups": ["malware", "yara", "critical"], "decoder": "yara", "program": "yara-scan",
+           "log": "YARA rule MAL_WIPER_Unknown_Jun25_RID2F13 matched in file /tmp/{file}. File quarantined.",
+           "location": "/tmp"}),
+]
+
+# Compliance mappings present on every rule (empty lists where a rule has none)
+COMPLIANCE = {
+    "pci_dss": ["10.6.1"],
+    "gpg13": ["4.12"],
+    "gdpr": ["IV_35.7.d"],
+    "hipaa": ["164.312.b"],
+    "nist_800_53": ["AU.6"],
+    "tsc": ["CC7.2", "CC7.3"],
+    "mitre": {"id": [], "tactic": [], "technique": []},
+}
+
+USERS = ["root", "admin", "ubuntu", "deploy", "jenkins", "oracle", "postgres", "test", "guest", "svc_backup"]
+COMMANDS = ["systemctl", "apt", "docker", "cat", "vim", "journalctl", "tail", "bash", "python3", "ls"]
+FILES = ["passwd", "shadow", "hosts", "sudoers", "crontab", "ssh/sshd_config", "resolv.conf", "payload.bin"]
+PATHS = ["wp-login.php", "admin", ".env", "phpmyadmin", "api/v1/users", "robots.txt", "cgi-bin/test.cgi"]
+
+
+class AlertGenerator:
+    """
+    Generates synthetic Wazuh alerts.
+
+    Args:
+        seed (int, optional): Random seed for reproducible streams.
+        agents (int): Size of the agent pool.
+        duplicate_rate (float): Fraction of alerts that re-emit an earlier alert verbatim
+            (same id), to exercise de-duplication.
+        start (datetime, optional): Timestamp of the first alert. Defaults to now, or to a
+            fixed date when seeded so the same seed yields identical alerts (and cassette keys).
+    """
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        agents: int = 50,
+        duplicate_rate: float = 0.0,
+        start: Optional[datetime] = None,
+    ):
+        self.rng = random.Random(seed)
+        self.weights = [w for w, _ in RULE_CATALOG]
+        self.rules = [r for _, r in RULE_CATALOG]
+        self.agents = [
+            {"id": f"{i:03d}", "name": f"{'web' if i % 3 == 0 else 'db' if i % 3 == 1 else 'ws'}-{i:03d}",
+             "ip": f"10.0.{i // 250}.{i % 250 + 1}"}
+            for i in range(1, agents + 1)
+        ]
+        self.duplicate_rate = duplicate_rate
+        if start is None:
+            start = datetime(2025, 1, 1, tzinfo=timezone.utc) if seed is not None else datetime.now(timezone.utc)
+        self.clock = start
+        self.offset = 0
+        self.fired: Dict[str, int] = {}
+        self._recent = []
+
+    def _ip(self) -> str:
+        return f"{self.rng.choice([45, 61, 103, 185, 193, 203])}.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+
+    def _data(self, rule: dict, agent: dict, fields: dict) -> dict:
+        if rule["decoder"] in ("sshd", "sudo"):
+            return {"srcip": fields["ip"], "srcuser": fields["user"], "srcport": str(fields["port"])}
+        if rule["decoder"] == "web-accesslog":
+            return {"srcip": fields["ip"], "protocol": "GET", "url": "/" + fields["path"], "id": "404"}
+        if rule["decoder"] == "windows_eventchannel":
+            return {"win": {"system": {"eventID": "4624", "computer": agent["name"], "channel": "Security"},
+                            "eventdata": {"targetUserName": fields["user"], "logonType": "3", "ipAddress": fields["ip"]}}}
+        if rule["decoder"] == "json":
+            return {"vulnerability": {"cve": "CVE-2024-6387", "severity": "High", "package": {"name": "openssh-server"}}}
+        if rule["decoder"] == "yara":
+            return {"yara_rule": "MAL_WIPER_Unknown_Jun25_RID2F13", "file_path": "/tmp/" + fields["file"]}
+        return {}
+
+    def generate(self) -> dict:
+        """Returns one alert dict."""
+        if self._recent and self.rng.random() < self.duplicate_rate:
+            return self.rng.choice(self._recent)
+
+        rule = self.rng.choices(self.rules, weights=self.weights)[0]
+        agent = self.rng.choice(self.agents)
+        self.clock += timedelta(milliseconds=self.rng.expovariate(1 / 200.0))
+        self.offset += self.rng.randint(300, 3000)
+        self.fired[rule["id"]] = self.fired.get(rule["id"], 0) + 1
+        fields = {
+            "date": self.clock.strftime("%b %d %H:%M:%S"),
+            "host": agent["name"],
+            "pid": self.rng.randint(1000, 65000),
+            "user": self.rng.choice(USERS),
+            "ip": self._ip(),
+            "port": self.rng.randint(1024, 65535),
+            "cmd": self.rng.choice(COMMANDS),
+            "file": self.rng.choice(FILES),
+            "path": self.rng.choice(PATHS),
+            "size": self.rng.randint(100, 20000),
+        }
+        timestamp = self.clock.strftime("%Y-%m-%dT%H:%M:%S.") + f"{self.clock.microsecond // 1000:03d}+0000"
+        alert = {
+            "timestamp": timestamp,
+            "rule": {
+                "level": rule["level"],
+                "description": rule["description"],
+                "id": rule["id"],
+                "firedtimes": self.fired[rule["id"]],
+                "mail": rule["level"] >= 12,
+                "groups": list(rule["groups"]),
+            },
+            "agent": dict(agent),
+            "manager": {"name": "wazuh-manager"},
+            "id": f"{int(self.clock.timestamp())}.{self.offset}",
+            "full_log": rule["log"].format(**fields),
+            "decoder": {"name": rule["decoder"]},
+            "data": self._data(rule, agent, fields),
+            "location": rule["location"],
+        }
+        if rule["program"]:
+            alert["predecoder"] = {"program_name": rule["program"], "timestamp": fields["date"], "hostname": agent["name"]}
+            alert["decoder"]["parent"] = rule["decoder"]
+        alert["rule"].update({k: list(v) for k, v in COMPLIANCE.items()})
+        if "authentication" in " ".join(rule["groups"]):
+            alert["rule"]["mitre"] = {"id": ["T1078"], "tactic": ["Initial Access"], "technique": ["Valid Accounts"]}
+            alert["rule"]["pci_dss"] = ["10.2.5"]
+            alert["rule"]["nist_800_53"] = ["AU.14", "AC.7"]
+        if "syscheck" in rule["groups"]:
+            alert["syscheck"] = {"path": "/etc/" + fields["file"], "event": "modified", "mode": "realtime"}
+        self._recent.append(alert)
+        if len(self._recent) > 100:
+            self._recent.pop(0)
+        return alert
+
+    def stream(self, count: int) -> Iterator[dict]:
+        """Yields ``count`` alerts."""
+        for _ in range(count):
+            yield self.generate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Wazuh alerts (NDJSON, alerts.json format).")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    gen = AlertGenerator(seed=args.seed, agents=args.agents, duplicate_rate=args.duplicate_rate)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for alert in gen.stream(args.count):
+            out.write(json.dumps(alert, separators=(",", ":")) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,474 @@
+"""
+Local stand-in servers for benchmarks.
+Serves the Ollama, OpenAI, Anthropic and Gemini generation APIs and the Elasticsearch
+document, bulk, multi-get and point-in-time search endpoints from one threaded HTTP server,
+with configurable latency and error rates.
+
+Usage:
+    python -m bench.mock_servers --port 8099 --llm-latency-ms 800 --llm-error-rate 0.02
+"""
+# bench/mock_servers.py
+import argparse
+import fnmatch
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class LatencyProfile:
+    """
+    Lognormal latency with an error rate.
+
+    Args:
+        median_ms (float): Median latency.
+        sigma (float): Lognormal shape; 0 gives a constant latency, ~0.5 a realistic long tail.
+        error_rate (float): Fraction of requests answered with an error (429 for LLMs, 503 for ES).
+    """
+
+    def __init__(self, median_ms: float = 0.0, sigma: float = 0.0, error_rate: float = 0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+
+    def delay(self, rng: random.Random) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median_ms / 1000.0
+        return rng.lognormvariate(math.log(self.median_ms), self.sigma) / 1000.0
+
+    def fails(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+CATEGORIES = {
+    "authentication_failed": "Brute Force",
+    "authentication_failures": "Brute Force",
+    "authentication_success": "Authentication",
+    "syscheck": "File Integrity",
+    "sql_injection": "Web Attack",
+    "attack": "Web Attack",
+    "rootcheck": "Rootkit",
+    "malware": "Malware",
+    "vulnerability-detector": "Vulnerability",
+}
+
+
+def fake_enrichment(prompt: str) -> dict:
+    """Builds a plausible enrichment for the alert embedded in a rendered prompt."""
+    level = re.search(r'"level":\s*(\d+)', prompt)
+    level = int(level.group(1)) if level else 3
+    category = next((c for g, c in CATEGORIES.items() if f'"{g}"' in prompt), "System")
+    cves = re.findall(r"CVE-\d{4}-\d{4,7}", prompt)
+    return {
+        "summary_text": f"{category} activity at rule level {level}. Review the source and affected host.",
+        "tags": [category.lower().replace(" ", "_"), f"level_{level}"],
+        "risk_score": min(100, level * 8),
+        "false_positive_likelihood": round(max(0.05, 1.0 - level / 15.0), 2),
+        "alert_category": category,
+        "remediation_steps": ["Verify the activity with the asset owner", "Review related events on the agent"],
+        "related_cves": sorted(set(cves)),
+        "external_refs": ["https://attack.mitre.org/"],
+    }
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockState:
+    """Shared configuration, RNG and the in-memory Elasticsearch store."""
+
+    def __init__(self, llm: LatencyProfile, es: LatencyProfile, seed: Optional[int] = None):
+        self.llm = llm
+        self.es = es
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.docs = {}  # index -> {id: doc}
+        self.docs_lock = threading.Lock()
+        self.pits = {}  # point-in-time id -> index pattern
+        self.templates = {}  # index template name -> body
+        self.aliases = {}  # alias -> write index
+        self.counts = {"llm": 0, "es_docs": 0, "errors": 0}
+
+    def draw(self, profile: LatencyProfile):
+        with self.rng_lock:
+            return profile.delay(self.rng), profile.fails(self.rng)
+
+    def store(self, index: str, doc_id: Optional[str], doc: dict, partial: bool = False) -> str:
+        doc_id = doc_id or uuid.uuid4().hex[:20]
+        index = self.aliases.get(index, index)
+        with self.docs_lock:
+            bucket = self.docs.setdefault(index, {})
+            if partial and doc_id in bucket:
+                bucket[doc_id].update(doc)
+            else:
+                bucket[doc_id] = doc
+            self.counts["es_docs"] += 1
+        return doc_id
+
+    def matching(self, pattern: str):
+        """``(index, id, doc)`` for every document in the indices matching a comma-separated pattern."""
+        with self.docs_lock:
+            return [
+                (index, doc_id, doc)
+                for index, bucket in self.docs.items()
+                if any(fnmatch.fnmatchcase(index, p) for p in pattern.split(","))
+                for doc_id, doc in bucket.items()
+            ]
+
+
+def _field(doc: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def _matches(doc: dict, query: Optional[dict], doc_id: Optional[str] = None) -> bool:
+    """Evaluates the subset of the query DSL the mock understands: bool, range, term(s), ids, exists, match_all."""
+    if not query:
+        return True
+    kind, spec = next(iter(query.items()))
+    if kind == "ids":
+        return doc_id in spec.get("values", [])
+    if kind == "exists":
+        return _field(doc, spec["field"]) is not None
+    if kind == "bool":
+        def clauses(key):
+            value = spec.get(key, [])
+            return value if isinstance(value, list) else [value]
+        return (all(_matches(doc, q, doc_id) for q in clauses("filter") + clauses("must"))
+                and not any(_matches(doc, q, doc_id) for q in clauses("must_not"))
+                and (not clauses("should") or any(_matches(doc, q, doc_id) for q in clauses("should"))))
+    if kind == "range":
+        field, bounds = next(iter(spec.items()))
+        value = _field(doc, field)
+        if value is None:
+            return False
+        checks = {"gte": lambda a, b: a >= b, "gt": lambda a, b: a > b, "lte": lambda a, b: a <= b, "lt": lambda a, b: a < b}
+        return all(checks[op](value, type(value)(bound)) for op, bound in bounds.items() if op in checks)
+    if kind in ("term", "terms"):
+        field, expected = next(iter(spec.items()))
+        expected = expected.get("value") if isinstance(expected, dict) else expected
+        values = expected if isinstance(expected, list) else [expected]
+        return str(_field(doc, field)) in {str(v) for v in values}
+    return True  # match_all and anything unsupported
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _simulate(self, profile: LatencyProfile, error_status: int) -> bool:
+        delay, failed = self.state.draw(profile)
+        if delay:
+            time.sleep(delay)
+        if failed:
+            self.state.counts["errors"] += 1
+            self._send(error_status, {"error": {"message": "simulated failure", "type": "mock_error"}})
+            return False
+        return True
+
+    # --- LLM providers ---
+
+    def _ollama(self, req: dict):
+        prompt = req.get("prompt", "")
+        text = json.dumps(fake_enrichment(prompt))
+        self._send(200, {
+            "model": req.get("model"), "response": text, "done": True,
+            "prompt_eval_count": _tokens(prompt), "eval_count": _tokens(text),
+        })
+
+    def _openai(self, req: dict):
+        prompt = " ".join(m.get("content", "") for m in req.get("messages", []))
+        text = json.dumps(fake_enrichment(prompt))
+        self._send(200, {
+            "id": "chatcmpl-" + uuid.uuid4().hex[:12], "object": "chat.completion",
+            "created": int(time.time()), "model": req.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(text),
+                      "total_tokens": _tokens(prompt) + _tokens(text)},
+        })
+
+    def _anthropic(self, req: dict):
+        prompt = " ".join(str(m.get("content", "")) for m in req.get("messages", []))
+        enrichment = fake_enrichment(prompt)
+        if req.get("tools"):
+            block = {"type": "tool_use", "id": "toolu_" + uuid.uuid4().hex[:12],
+                     "name": req["tools"][0]["name"], "input": enrichment}
+        else:
+            block = {"type": "text", "text": json.dumps(enrichment)}
+        self._send(200, {
+            "id": "msg_" + uuid.uuid4().hex[:12], "type": "message", "role": "assistant",
+            "model": req.get("model"), "content": [block], "stop_reason": "end_turn",
+            "usage": {"input_tokens": _tokens(prompt), "output_tokens": _tokens(json.dumps(enrichment))},
+        })
+
+    def _gemini(self, req: dict):
+        prompt = " ".join(p.get("text", "") for c in req.get("contents", []) for p in c.get("parts", []))
+        text = json.dumps(fake_enrichment(prompt))
+        self._send(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": _tokens(prompt), "candidatesTokenCount": _tokens(text)},
+        })
+
+    # --- Elasticsearch ---
+
+    def _bulk(self, default_index: Optional[str], body: bytes):
+        lines = [l for l in body.decode().split("\n") if l.strip()]
+        items, errors, i = [], False, 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op, meta = next(iter(action.items()))
+            index = meta.get("_index") or default_index
+            source = json.loads(lines[i + 1]) if op != "delete" else None
+            i += 1 if op == "delete" else 2
+            if op == "update" and source is not None:
+                doc = source.get("doc", {})
+                if source.get("doc_as_upsert") or meta.get("_id") in self.state.docs.get(index, {}):
+                    doc_id = self.state.store(index, meta.get("_id"), doc, partial=True)
+                    items.append({op: {"_index": index, "_id": doc_id, "status": 200, "result": "updated"}})
+                else:
+                    errors = True
+                    items.append({op: {"_index": index, "_id": meta.get("_id"), "status": 404,
+                                       "error": {"type": "document_missing_exception"}}})
+                continue
+            doc_id = self.state.store(index, meta.get("_id"), source or {})
+            items.append({op: {"_index": index, "_id": doc_id, "status": 201, "result": "created"}})
+        self._send(200, {"took": 1, "errors": errors, "items": items})
+
+    def _search(self, body: bytes, pattern: Optional[str] = None):
+        """Index or point-in-time search: filter, sort (the document ID breaks ties) and search_after."""
+        req = json.loads(body or b"{}")
+        pit = (req.get("pit") or {}).get("id")
+        if pit is not None:
+            if pit not in self.state.pits:
+                return self._send(404, {"error": {"type": "search_context_missing_exception"}})
+            pattern = self.state.pits[pit]
+        sort_fields = [next(iter(s)) if isinstance(s, dict) else s for s in req.get("sort", [])]
+        sort_fields = [f for f in sort_fields if f not in ("_shard_doc", "_id")]
+        hits = []
+        for index, doc_id, doc in self.state.matching(pattern or "*"):
+            if _matches(doc, req.get("query"), doc_id):
+                hits.append(([_field(doc, f) if _field(doc, f) is not None else "" for f in sort_fields] + [doc_id], index, doc))
+        hits.sort(key=lambda h: h[0])
+        total = len(hits)
+        after = req.get("search_after")
+        if after is not None:
+            hits = [h for h in hits if h[0] > after]
+        size = req.get("size", 10)
+        self._send(200, {
+            "pit_id": pit, "took": 1, "timed_out": False,
+            "hits": {"total": {"value": total, "relation": "eq"},
+                     "hits": [{"_index": index, "_id": key[-1], "_source": doc, "sort": key}
+                              for key, index, doc in hits[:size]]},
+        })
+
+    def _mget(self, index: str, body: bytes):
+        ids = json.loads(body or b"{}").get("ids", [])
+        bucket = self.state.docs.get(self.state.aliases.get(index, index), {})
+        self._send(200, {"docs": [{"_index": index, "_id": i, "found": i in bucket} for i in ids]})
+
+    def _route(self, method: str):
+        path = self.path.split("?", 1)[0]
+        body = self._body()
+        parts = [p for p in path.split("/") if p]
+
+        llm_route = (
+            path == "/api/generate" or path.endswith("/chat/completions")
+            or path.endswith("/v1/messages") or path.endswith(":generateContent")
+        )
+        if llm_route:
+            if not self._simulate(self.state.llm, 429):
+                return
+            self.state.counts["llm"] += 1
+            req = json.loads(body or b"{}")
+            if path == "/api/generate":
+                return self._ollama(req)
+            if path.endswith("/chat/completions"):
+                return self._openai(req)
+            if path.endswith("/v1/messages"):
+                return self._anthropic(req)
+            return self._gemini(req)
+
+        if method == "GET" and not parts:
+            return self._send(200, {"name": "mock", "version": {"number": "8.13.0"}, "tagline": "You Know, for Search"})
+        if method == "GET" and len(parts) == 2 and parts[1] == "_count":
+            return self._send(200, {"count": len(self.state.docs.get(parts[0], {}))})
+        if method == "GET" and len(parts) == 3 and parts[1] == "_doc":
+            doc = self.state.docs.get(parts[0], {}).get(parts[2])
+            if doc is None:
+                return self._send(404, {"_index": parts[0], "_id": parts[2], "found": False})
+            return self._send(200, {"_index": parts[0], "_id": parts[2], "found": True, "_source": doc})
+
+        if method == "PUT" and len(parts) == 2 and parts[0] == "_index_template":
+            self.state.templates[parts[1]] = json.loads(body or b"{}")
+            return self._send(200, {"acknowledged": True})
+        if method == "PUT" and len(parts) == 2 and parts[1] == "_mapping":
+            return self._send(200, {"acknowledged": True})
+        if method == "PUT" and len(parts) == 1:
+            with self.state.docs_lock:
+                self.state.docs.setdefault(parts[0], {})
+            for alias in json.loads(body or b"{}").get("aliases", {}):
+                self.state.aliases[alias] = parts[0]
+            return self._send(200, {"acknowledged": True, "index": parts[0]})
+        if method == "HEAD":
+            if len(parts) == 2 and parts[0] in ("_alias", "_index_template"):
+                found = parts[1] in (self.state.aliases if parts[0] == "_alias" else self.state.templates)
+            else:
+                found = len(parts) == 1 and parts[0] in self.state.docs
+            return self._send(200 if found else 404, b"")
+
+        if method == "POST" and len(parts) == 2 and parts[1] == "_pit":
+            pit = uuid.uuid4().hex
+            self.state.pits[pit] = parts[0]
+            return self._send(200, {"id": pit})
+        if method == "DELETE" and parts == ["_pit"]:
+            self.state.pits.pop(json.loads(body or b"{}").get("id"), None)
+            return self._send(200, {"succeeded": True, "num_freed": 1})
+        if method in ("GET", "POST") and parts and parts[-1] == "_search" and len(parts) <= 2:
+            if not self._simulate(self.state.es, 503):
+                return
+            return self._search(body, self.state.aliases.get(parts[0], parts[0]) if len(parts) == 2 else None)
+        if method in ("GET", "POST") and len(parts) == 2 and parts[1] == "_mget":
+            if not self._simulate(self.state.es, 503):
+                return
+            return self._mget(parts[0], body)
+
+        if method in ("POST", "PUT") and parts and (parts[-1] == "_bulk" or parts[1:2] in (["_doc"], ["_update"])):
+            if not self._simulate(self.state.es, 503):
+                return
+            if parts[-1] == "_bulk":
+                return self._bulk(parts[0] if len(parts) == 2 else None, body)
+            index, op = parts[0], parts[1]
+            doc_id = parts[2] if len(parts) > 2 else None
+            doc = json.loads(body or b"{}")
+            if op == "_update":
+                doc_id = self.state.store(index, doc_id, doc.get("doc", {}), partial=True)
+                return self._send(200, {"_index": index, "_id": doc_id, "result": "updated"})
+            doc_id = self.state.store(index, doc_id, doc)
+            return self._send(201, {"_index": index, "_id": doc_id, "result": "created", "_version": 1})
+
+        self._send(404, {"error": f"no mock route for {method} {path}"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+    def do_HEAD(self):
+        if self.path.split("?", 1)[0] == "/":
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._route("HEAD")
+
+
+def start_mock_server(
+    port: int = 0,
+    host: str = "127.0.0.1",
+    llm: Optional[LatencyProfile] = None,
+    es: Optional[LatencyProfile] = None,
+    seed: Optional[int] = None,
+):
+    """
+    Starts the mock server in a daemon thread.
+
+    Args:
+        port (int): Listen port (0 picks a free port).
+        llm (LatencyProfile, optional): Latency/error profile for the LLM routes.
+        es (LatencyProfile, optional): Latency/error profile for the Elasticsearch routes.
+
+    Returns:
+        ThreadingHTTPServer: The running server; ``server.state`` holds the counters and
+        stored documents, ``server.server_address`` the bound address.
+    """
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(llm or LatencyProfile(), es or LatencyProfile(), seed)
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server
+
+
+def provider_env(base_url: str) -> dict:
+    """Environment variables pointing every provider and Elasticsearch at the mock server."""
+    return {
+        "OLLAMA_API": f"{base_url}/api/generate",
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "OPENAI_API_KEY": "mock",
+        "CLAUDE_API_URL": f"{base_url}/v1/messages",
+        "ANTHROPIC_API_KEY": "mock",
+        "GEMINI_API_URL_TEMPLATE": base_url + "/v1beta/models/{model}:generateContent",
+        "GEMINI_API_KEY": "mock",
+        "ELASTICSEARCH_URL": base_url,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock LLM provider and Elasticsearch server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0, help="Median LLM latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="Lognormal sigma of LLM latency")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--es-latency-ms", type=float, default=5.0, help="Median ES latency")
+    parser.add_argument("--es-sigma", type=float, default=0.3)
+    parser.add_argument("--es-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = start_mock_server(
+        args.port, args.host,
+        llm=LatencyProfile(args.llm_latency_ms, args.llm_sigma, args.llm_error_rate),
+        es=LatencyProfile(args.es_latency_ms, args.es_sigma, args.es_error_rate),
+        seed=args.seed,
+    )
+    base_url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Mock server listening on {base_url}")
+    for key, value in provider_env(base_url).items():
+        print(f"  {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark for alert preprocessing.
+Compares the legacy fill_missing_fields + normalize_alert_types pair with the compiled
+normalizer (per alert and batch), and checks both produce the same validated alert.
+
+Usage:
+    python -m bench.normalizer -n 20000
+    python -m bench.normalizer -n 20000 --messy 0.5 --repeat 5 --json results.json
+"""
+# bench/normalizer.py
+import argparse
+import json
+import random
+import time
+from typing import Callable, Dict, List
+
+from bench.alert_generator import AlertGenerator
+from core import codec
+from core.preprocessing import (
+    fill_missing_fields,
+    normalize_alert,
+    normalize_alert_types,
+    normalize_alerts,
+)
+from schemas.input_schema import as_alert
+
+
+def messy(alert: dict, rng: random.Random) -> dict:
+    """Damages an alert the way real feeds do: stringly numbers, scalar lists, missing sections."""
+    rule = alert["rule"]
+    rule["level"] = str(rule["level"])
+    rule["firedtimes"] = str(rule.get("firedtimes", 1))
+    rule["pci_dss"] = None
+    rule["tsc"] = "CC6.1"
+    if rng.random() < 0.5:
+        rule.pop("mitre", None)
+    else:
+        rule["mitre"] = {"id": "T1110", "technique": None}
+    alert.pop(rng.choice(["decoder", "predecoder", "full_log"]), None)
+    if isinstance(alert.get("agent"), dict):
+        alert["agent"]["id"] = int(alert["agent"].get("id") or 0)
+    return alert
+
+
+def _legacy(alert: dict) -> dict:
+    return normalize_alert_types(fill_missing_fields(alert))
+
+
+def _time(label: str, lines: List[bytes], run: Callable[[List[dict]], List[dict]], repeat: int) -> Dict:
+    best = None
+    for _ in range(repeat):
+        alerts = [codec.loads(line) for line in lines]  # fresh copies, parsed outside the timer
+        start = time.perf_counter()
+        run(alerts)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {"name": label, "seconds": round(best, 6), "us_per_alert": round(best / len(lines) * 1e6, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Legacy vs compiled alert normalizer benchmark.")
+    parser.add_argument("-n", "--count", type=int, default=20000, help="Alerts per run")
+    parser.add_argument("--messy", type=float, default=0.3, help="Fraction of alerts damaged before normalizing")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best is reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    lines = []
+    for alert in AlertGenerator(seed=args.seed).stream(args.count):
+        if rng.random() < args.messy:
+            alert = messy(alert, rng)
+        lines.append(codec.dumps_bytes(alert))
+
+    # Equivalence: both paths must validate to the same alert (an empty timestamp
+    # validates to "now", so timestamps are compared before validation)
+    mismatches = 0
+    for line in lines:
+        expected, actual = _legacy(codec.loads(line)), normalize_alert(codec.loads(line))
+        if (expected["timestamp"] != actual["timestamp"]
+                or as_alert(expected).model_dump(exclude={"timestamp"}) != as_alert(actual).model_dump(exclude={"timestamp"})):
+            mismatches += 1
+
+    results = [
+        _time("legacy", lines, lambda alerts: [_legacy(a) for a in alerts], args.repeat),
+        _time("compiled", lines, lambda alerts: [normalize_alert(a) for a in alerts], args.repeat),
+        _time("compiled_batch", lines, normalize_alerts, args.repeat),
+    ]
+    report = {"count": args.count, "messy": args.messy, "mismatches": mismatches, "results": results}
+
+    print(f"\n== normalizer benchmark ({args.count} alerts, {args.messy:.0%} messy) ==")
+    baseline = results[0]["seconds"]
+    for r in results:
+        print(f"  {r['name']:<15} {r['us_per_alert']:>8.2f} us/alert  ({baseline / r['seconds']:.2f}x)")
+    print(f"  mismatches      {mismatches}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
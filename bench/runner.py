@@ -0,0 +1,324 @@
+"""
+End-to-end throughput benchmark for the LLM enrichment project.
+Runs the file-tail engine or the /v1/enrich API against the mock LLM/Elasticsearch server
+and reports alerts/sec, latency percentiles, CPU time and peak RSS of the process under test.
+
+Usage:
+    python -m bench.runner engine -n 500 --rate 50 --provider ollama
+    python -m bench.runner api -n 1000 --concurrency 16 --provider claude --json results.json
+"""
+# bench/runner.py
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from bench.alert_generator import AlertGenerator
+from bench.mock_servers import LatencyProfile, provider_env, start_mock_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (0-100) of ``samples``, or None if empty."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_kb(pid: int) -> Optional[int]:
+    """Peak resident set size of a live process (Linux /proc), in KiB."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class ProcessUnderTest:
+    """
+    Runs the engine or API in a child process and measures its CPU time and peak RSS.
+
+    CPU time comes from RUSAGE_CHILDREN deltas, so only one instance may run at a time.
+    """
+
+    def __init__(self, args: List[str], env: Dict[str, str], log_path: str):
+        self.args = args
+        self.env = env
+        self.log_path = log_path
+        self.proc = None
+        self.peak_rss_kb = None
+        self.cpu_seconds = None
+
+    def __enter__(self):
+        self._usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self._log = open(self.log_path, "w")
+        # Prompt templates and YARA rules are resolved relative to the repo root
+        self.proc = subprocess.Popen(
+            self.args, cwd=REPO_ROOT, env=self.env, stdout=self._log, stderr=subprocess.STDOUT
+        )
+        return self
+
+    def sample_rss(self):
+        rss = _peak_rss_kb(self.proc.pid)
+        if rss is not None:
+            self.peak_rss_kb = max(self.peak_rss_kb or 0, rss)
+
+    def __exit__(self, *exc):
+        self.sample_rss()
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self._log.close()
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.cpu_seconds = (usage.ru_utime - self._usage.ru_utime) + (usage.ru_stime - self._usage.ru_stime)
+        if self.peak_rss_kb is None:
+            # ru_maxrss is the largest child ever reaped (KiB on Linux); a fallback only
+            self.peak_rss_kb = usage.ru_maxrss
+        return False
+
+
+def _base_env(mock_url: str, args, workdir: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(provider_env(mock_url))
+    env.update({
+        "LLM_PROVIDER": args.provider,
+        "LLM_MODEL": args.model,
+        "ENRICHED_OUTPUT_PATH": os.path.join(workdir, "enriched.jsonl"),
+        "ENGINE_THROTTLE_SECONDS": "0",
+        "PYTHONUNBUFFERED": "1",
+    })
+    for item in args.env or []:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def run_engine(args, mock_url: str, workdir: str) -> dict:
+    """
+    Appends alerts to a temp alerts.json at ``args.rate`` alerts/sec while the engine tails it.
+    Latency is measured from the write of each alert to its line in the enriched output.
+    """
+    alert_path = os.path.join(workdir, "alerts.json")
+    output_path = os.path.join(workdir, "enriched.jsonl")
+    open(alert_path, "w").close()
+    env = _base_env(mock_url, args, workdir)
+    env["ALERT_LOG_PATH"] = alert_path
+
+    gen = AlertGenerator(seed=args.seed, duplicate_rate=args.duplicate_rate)
+    written: Dict[str, float] = {}
+    done: Dict[str, float] = {}
+    finished = threading.Event()
+    cmd = [sys.executable, "-c", "from core.engine import run_enrichment_loop; run_enrichment_loop()"]
+
+    with ProcessUnderTest(cmd, env, os.path.join(workdir, "process.log")) as put:
+        def writer():
+            interval = 1.0 / args.rate if args.rate else 0.0
+            with open(alert_path, "a", encoding="utf-8") as f:
+                for alert in gen.stream(args.count):
+                    f.write(json.dumps(alert, separators=(",", ":")) + "\n")
+                    f.flush()
+                    written.setdefault(alert["id"], time.time())
+                    if interval:
+                        time.sleep(interval)
+            finished.set()
+
+        start = time.time()
+        threading.Thread(target=writer, name="bench-writer", daemon=True).start()
+        deadline = start + args.timeout
+        position = 0
+        fallbacks = 0
+        while time.time() < deadline:
+            if put.proc.poll() is not None:
+                raise RuntimeError(f"Engine exited with {put.proc.returncode}; see {put.log_path}")
+            if os.path.exists(output_path):
+                with open(output_path, "r", encoding="utf-8") as f:
+                    f.seek(position)
+                    for line in f:
+                        if not line.endswith("\n"):
+                            break
+                        position += len(line.encode("utf-8"))
+                        try:
+                            doc = json.loads(line)
+                            alert_id = doc["alert_id"]
+                        except (ValueError, KeyError):
+                            continue
+                        if alert_id not in done:
+                            done[alert_id] = time.time()
+                            fallbacks += bool((doc.get("enrichment") or {}).get("error"))
+            put.sample_rss()
+            # Duplicates are skipped by the engine, so finish once every unique id is out
+            if finished.is_set() and len(done) >= len(written):
+                break
+            time.sleep(0.02)
+        elapsed = max(time.time() - start, 1e-9)
+
+    latencies = [done[i] - written[i] for i in done if i in written]
+    report = _report("engine", args, elapsed, latencies, len(written), put)
+    report["fallbacks"] = fallbacks
+    return report
+
+
+def run_api(args, mock_url: str, workdir: str) -> dict:
+    """Sends ``args.count`` alerts to /v1/enrich from ``args.concurrency`` client threads."""
+    port = _free_port()
+    env = _base_env(mock_url, args, workdir)
+    cmd = [sys.executable, "-m", "uvicorn", "api.api_server:app",
+           "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    url = f"http://127.0.0.1:{port}"
+    gen = AlertGenerator(seed=args.seed, duplicate_rate=args.duplicate_rate)
+    alerts = list(gen.stream(args.count))
+    latencies: List[float] = []
+    counts = {"fallbacks": 0, "http_errors": 0}
+    lock = threading.Lock()
+    local = threading.local()
+
+    with ProcessUnderTest(cmd, env, os.path.join(workdir, "process.log")) as put:
+        ready_by = time.time() + 30
+        while True:
+            try:
+                requests.get(f"{url}/v1/usage", timeout=1)
+                break
+            except requests.RequestException:
+                if put.proc.poll() is not None or time.time() > ready_by:
+                    raise RuntimeError(f"API server did not start; see {put.log_path}")
+                time.sleep(0.2)
+
+        def send(alert):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            t0 = time.time()
+            fallback = False
+            try:
+                response = session.post(f"{url}/v1/enrich", json=alert, timeout=args.timeout)
+                ok = response.status_code < 300
+                if ok:
+                    fallback = bool(response.json().get("enrichment", {}).get("error"))
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.time() - t0)
+                    counts["fallbacks"] += fallback
+                else:
+                    counts["http_errors"] += 1
+            put.sample_rss()
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(send, alerts))
+        elapsed = max(time.time() - start, 1e-9)
+
+    report = _report("api", args, elapsed, latencies, len(alerts), put)
+    report.update(counts)
+    return report
+
+
+def _report(mode: str, args, elapsed: float, latencies: List[float], sent: int, put: ProcessUnderTest) -> dict:
+    ms = lambda v: round(v * 1000, 1) if v is not None else None
+    return {
+        "mode": mode,
+        "provider": args.provider,
+        "alerts_sent": sent,
+        "alerts_completed": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "alerts_per_sec": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(max(latencies) if latencies else None),
+        },
+        "cpu_seconds": round(put.cpu_seconds, 3),
+        "cpu_per_alert_ms": round(put.cpu_seconds / len(latencies) * 1000, 2) if latencies else None,
+        "peak_rss_mb": round(put.peak_rss_kb / 1024, 1) if put.peak_rss_kb else None,
+        "mock": {
+            "llm_latency_ms": args.llm_latency_ms, "llm_sigma": args.llm_sigma,
+            "llm_error_rate": args.llm_error_rate, "es_latency_ms": args.es_latency_ms,
+            "es_error_rate": args.es_error_rate,
+        },
+    }
+
+
+def print_report(report: dict):
+    lat = report["latency_ms"]
+    print(f"\n== {report['mode']} benchmark ({report['provider']}) ==")
+    print(f"  completed     {report['alerts_completed']}/{report['alerts_sent']} in {report['elapsed_s']}s")
+    print(f"  throughput    {report['alerts_per_sec']} alerts/sec")
+    print(f"  latency (ms)  p50={lat['p50']}  p95={lat['p95']}  p99={lat['p99']}  max={lat['max']}")
+    print(f"  cpu           {report['cpu_seconds']}s ({report['cpu_per_alert_ms']} ms/alert)")
+    print(f"  peak rss      {report['peak_rss_mb']} MiB")
+    print(f"  fallbacks     {report['fallbacks']}")
+    if "http_errors" in report:
+        print(f"  http errors   {report['http_errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end enrichment benchmark against mock LLM/ES servers.")
+    parser.add_argument("mode", choices=["engine", "api"], help="File-tail engine or the /v1/enrich API")
+    parser.add_argument("-n", "--count", type=int, default=200, help="Alerts to send")
+    parser.add_argument("--rate", type=float, default=0, help="Engine mode: alerts/sec written (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=8, help="API mode: concurrent client requests")
+    parser.add_argument("--provider", default="ollama", choices=["ollama", "openai", "claude", "gemini", "cassette"])
+    parser.add_argument("--model", default="llama3:8b")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="Median mock LLM latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--es-latency-ms", type=float, default=2.0, help="Median mock ES latency")
+    parser.add_argument("--es-sigma", type=float, default=0.3)
+    parser.add_argument("--es-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300, help="Give up after this many seconds")
+    parser.add_argument("--env", action="append", metavar="KEY=VALUE", help="Extra env for the process under test")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    server = start_mock_server(
+        llm=LatencyProfile(args.llm_latency_ms, args.llm_sigma, args.llm_error_rate),
+        es=LatencyProfile(args.es_latency_ms, args.es_sigma, args.es_error_rate),
+        seed=args.seed,
+    )
+    mock_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with tempfile.TemporaryDirectory(prefix="enrich-bench-") as workdir:
+            run = run_engine if args.mode == "engine" else run_api
+            report = run(args, mock_url, workdir)
+            report["mock"]["llm_calls"] = server.state.counts["llm"]
+            report["mock"]["es_docs"] = server.state.counts["es_docs"]
+    finally:
+        server.shutdown()
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
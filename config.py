@@ -9,8 +9,149 @@ LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
 
 ALERT_LOG_PATH = os.getenv("ALERT_LOG_PATH", "/var/ossec/logs/alerts/alerts.json")
 ENRICHED_OUTPUT_PATH = os.getenv("ENRICHED_OUTPUT_PATH", "llm_enriched_alerts.json")
+# Pause after each enriched alert (provider rate limiting); 0 disables
+ENGINE_THROTTLE_SECONDS = float(os.getenv("ENGINE_THROTTLE_SECONDS", "1.5"))
+# Tailer: bytes per read, and dropping duplicates/filter skips from raw bytes before JSON parsing
+INGEST_BLOCK_SIZE = int(os.getenv("INGEST_BLOCK_SIZE", str(1 << 20)))
+INGEST_PREFILTER = os.getenv("INGEST_PREFILTER", "true").lower() == "true"
+
+# Engine input: tail ALERT_LOG_PATH, or accept NDJSON alerts on stdin or a socket
+INPUT_SOURCE = os.getenv("INPUT_SOURCE", "file")  # file | stdin | unix | tcp
+INPUT_SOCKET_PATH = os.getenv("INPUT_SOCKET_PATH", "/var/run/llm-enrichment/alerts.sock")
+INPUT_TCP_ADDR = os.getenv("INPUT_TCP_ADDR", "127.0.0.1")
+INPUT_TCP_PORT = int(os.getenv("INPUT_TCP_PORT", "5145"))
+INPUT_MAX_LINE_BYTES = int(os.getenv("INPUT_MAX_LINE_BYTES", str(1 << 20)))  # Longer lines are dropped
+INPUT_READ_SIZE = int(os.getenv("INPUT_READ_SIZE", "65536"))  # Bytes per read from a pipe or connection
+INPUT_QUEUE_SIZE = int(os.getenv("INPUT_QUEUE_SIZE", "64"))  # Buffered reads before readers block
+INPUT_MAX_CONNECTIONS = int(os.getenv("INPUT_MAX_CONNECTIONS", "64"))
+
+# Durable work queue between input and enrichment (SQLite WAL); empty path = off
+WORKQUEUE_PATH = os.getenv("WORKQUEUE_PATH", "")
+WORKQUEUE_ROLE = os.getenv("WORKQUEUE_ROLE", "both")  # both | ingest | consume (extra worker processes)
+WORKQUEUE_BATCH_SIZE = int(os.getenv("WORKQUEUE_BATCH_SIZE", "100"))  # Jobs leased at once
+WORKQUEUE_VISIBILITY_TIMEOUT = float(os.getenv("WORKQUEUE_VISIBILITY_TIMEOUT", "600"))  # Seconds before redelivery
+WORKQUEUE_MAX_ATTEMPTS = int(os.getenv("WORKQUEUE_MAX_ATTEMPTS", "5"))  # Deliveries before dead-lettering (0 = no limit)
+WORKQUEUE_POLL_INTERVAL = float(os.getenv("WORKQUEUE_POLL_INTERVAL", "0.5"))  # Seconds between polls when empty
+WORKQUEUE_SYNCHRONOUS = os.getenv("WORKQUEUE_SYNCHRONOUS", "NORMAL")  # NORMAL | FULL (survives power loss)
+# JSON backend for ingest/output: auto (orjson, then msgspec, then stdlib) | orjson | msgspec | stdlib
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()
 
 ELASTICSEARCH_URL = os.getenv("ELASTICSEARCH_URL", "https://localhost:9200")
 ELASTIC_USER = os.getenv("ELASTIC_USER", "admin")
 ELASTIC_PASS = os.getenv("ELASTIC_PASS", "admin")
-ENRICHED_INDEX = os.getenv("ENRICHED_INDEX", "wazuh-enriched-alerts")
\ No newline at end of file
+ENRICHED_INDEX = os.getenv("ENRICHED_INDEX", "wazuh-enriched-alerts")
+ES_ALERTS_INDEX = os.getenv("ES_ALERTS_INDEX", "wazuh-alerts-*")  # Where Wazuh indexes the original alerts
+# copy: index full enriched documents into ENRICHED_INDEX | update: add enrichment to the original alert document
+ES_OUTPUT_MODE = os.getenv("ES_OUTPUT_MODE", "copy")
+# Managed index template for ENRICHED_INDEX (applied at startup; existing indices keep their mapping)
+ES_MANAGE_TEMPLATE = os.getenv("ES_MANAGE_TEMPLATE", "true").lower() == "true"
+ES_DATA_MAPPING = os.getenv("ES_DATA_MAPPING", "flattened")  # alert.data and YARA meta: flattened | disabled
+ES_INDEX_SHARDS = int(os.getenv("ES_INDEX_SHARDS", "1"))
+ES_INDEX_REPLICAS = int(os.getenv("ES_INDEX_REPLICAS", "1"))
+ES_INDEX_REFRESH_INTERVAL = os.getenv("ES_INDEX_REFRESH_INTERVAL", "30s")
+ES_INDEX_FIELD_LIMIT = int(os.getenv("ES_INDEX_FIELD_LIMIT", "1000"))  # index.mapping.total_fields.limit
+ES_ROLLOVER = os.getenv("ES_ROLLOVER", "false").lower() == "true"  # ENRICHED_INDEX becomes a write alias
+ES_ILM_POLICY = os.getenv("ES_ILM_POLICY", "")  # Elasticsearch ILM policy for rolled-over indices
+
+# Hedged requests (tail-latency control)
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PROVIDER = os.getenv("HEDGE_PROVIDER", "")  # Empty: hedge to the same provider
+HEDGE_MODEL = os.getenv("HEDGE_MODEL", "")  # Empty: same model (or the hedge provider's default)
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_MS = int(os.getenv("HEDGE_MIN_DELAY_MS", "500"))
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))  # Max hedges per primary request
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "10"))
+
+# Circuit breakers and provider failover
+# Comma-separated chain of provider[:model], e.g. "claude,openai:gpt-4o-mini,ollama:llama3:8b"
+LLM_FAILOVER_CHAIN = os.getenv("LLM_FAILOVER_CHAIN", "")
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "false").lower() == "true"
+CB_FAILURE_RATE = float(os.getenv("CB_FAILURE_RATE", "0.5"))
+CB_SLOW_CALL_MS = int(os.getenv("CB_SLOW_CALL_MS", "30000"))
+CB_SLOW_CALL_RATE = float(os.getenv("CB_SLOW_CALL_RATE", "0.8"))
+CB_WINDOW = int(os.getenv("CB_WINDOW", "20"))
+CB_MIN_CALLS = int(os.getenv("CB_MIN_CALLS", "5"))
+CB_OPEN_SECONDS = float(os.getenv("CB_OPEN_SECONDS", "30"))
+CB_HALF_OPEN_PROBES = int(os.getenv("CB_HALF_OPEN_PROBES", "1"))
+
+# Share one in-flight LLM call between concurrent copies of the same alert (ids/timestamps ignored)
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+
+# Static fast-path enrichment for well-known rules (see core/knowledge_base.py)
+KB_PATH = os.getenv("KB_PATH", "")  # Empty disables the knowledge base
+KB_MODE = os.getenv("KB_MODE", "static")  # static | refresh (answer, then refresh stale entries via the LLM)
+KB_REFRESH_SECONDS = float(os.getenv("KB_REFRESH_SECONDS", "86400"))  # Entry age that triggers a refresh
+KB_REFRESH_WORKERS = int(os.getenv("KB_REFRESH_WORKERS", "1"))
+KB_SAVE_REFRESHED = os.getenv("KB_SAVE_REFRESHED", "true").lower() == "true"  # Write refreshed entries back to KB_PATH
+
+# Pre-enrichment filter: JSON list of rules routing alerts to skip | yara_only | enrich
+FILTER_RULES_PATH = os.getenv("FILTER_RULES_PATH", "")  # Empty: every alert gets FILTER_DEFAULT_ACTION
+FILTER_DEFAULT_ACTION = os.getenv("FILTER_DEFAULT_ACTION", "enrich")
+
+# Native structured output (JSON mode / response schema) for every provider
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "true").lower() == "true"
+
+# Token usage and cost metering
+LLM_PRICE_TABLE = os.getenv("LLM_PRICE_TABLE", "")  # JSON file: {"model": {"input": usd_per_1m, "output": usd_per_1m}}
+COST_ROLLUP_PATH = os.getenv("COST_ROLLUP_PATH", "")  # JSONL file for periodic usage rollups
+COST_ROLLUP_INTERVAL = float(os.getenv("COST_ROLLUP_INTERVAL", "300"))
+
+# Prometheus metrics listener for the daemon (0 disables; the API serves /metrics itself)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "0.0.0.0")
+
+# Per-alert stage tracing (OTLP/JSON lines) and on-demand profiling
+TRACE_OUTPUT_PATH = os.getenv("TRACE_OUTPUT_PATH", "")  # Empty disables tracing
+TRACE_SLOW_MS = int(os.getenv("TRACE_SLOW_MS", "5000"))  # Only alerts slower than this are written
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", "profiles")
+PROFILE_SECONDS = float(os.getenv("PROFILE_SECONDS", "30"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Required in X-Admin-Token for /admin routes; unset = disabled
+
+# Cassette provider (LLM_PROVIDER=cassette): record real responses, replay them offline
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "replay")  # record | replay
+CASSETTE_PATH = os.getenv("CASSETTE_PATH", "cassette.sqlite3")
+CASSETTE_PROVIDER = os.getenv("CASSETTE_PROVIDER", "ollama")  # Provider recorded (and keyed) in the cassette
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "0"))  # Replay: sleep recorded latency x this
+CASSETTE_ON_MISS = os.getenv("CASSETTE_ON_MISS", "fallback")  # Replay miss: fallback | error
+
+# Output sinks: each has its own queue, worker threads, batching and retries
+OUTPUT_SINKS = os.getenv("OUTPUT_SINKS", "file,elasticsearch")  # file, elasticsearch, stdout, webhook, unix_socket
+API_OUTPUT_SINKS = os.getenv("API_OUTPUT_SINKS", "elasticsearch")  # Sinks the API writes enriched alerts to
+SINK_QUEUE_SIZE = int(os.getenv("SINK_QUEUE_SIZE") or os.getenv("INDEX_QUEUE_SIZE", "1000"))  # Per sink
+SINK_BATCH_SIZE = int(os.getenv("SINK_BATCH_SIZE", "200"))  # Max documents per sink write
+SINK_LINGER_MS = float(os.getenv("SINK_LINGER_MS", "0"))  # Wait for a batch to fill (0 = write what is queued)
+SINK_RETRIES = int(os.getenv("SINK_RETRIES", "3"))  # Retries of a failed batch before it is dead-lettered
+SINK_RETRY_BACKOFF = float(os.getenv("SINK_RETRY_BACKOFF", "1"))  # Seconds before the first retry, doubling
+SINK_OVERFLOW = os.getenv("SINK_OVERFLOW", "block")  # Full queue: block | dead_letter
+SINK_WEBHOOK_URL = os.getenv("SINK_WEBHOOK_URL", "")
+SINK_WEBHOOK_TOKEN = os.getenv("SINK_WEBHOOK_TOKEN", "")  # Sent as a Bearer token when set
+SINK_WEBHOOK_TIMEOUT = float(os.getenv("SINK_WEBHOOK_TIMEOUT", "10"))
+SINK_SOCKET_PATH = os.getenv("SINK_SOCKET_PATH", "")
+
+# API concurrency: provider calls run on a bounded pool; outputs go through the sink queues
+API_LLM_WORKERS = int(os.getenv("API_LLM_WORKERS", "32"))
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "2"))  # Elasticsearch sink threads
+ES_BULK_BATCH_SIZE = int(os.getenv("ES_BULK_BATCH_SIZE", "500"))  # Documents per _bulk request
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))  # Items per /v1/enrich/batch request
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(16 << 20)))  # Body size per /v1/enrich/batch request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))  # Items enriched at once per batch
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))  # Jobs processed concurrently (steady processing rate)
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "1000"))  # Waiting jobs before POST /v1/jobs returns 429
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))  # Seconds finished jobs stay pollable
+CALLBACK_ALLOWED_HOSTS = os.getenv("CALLBACK_ALLOWED_HOSTS", "")  # Job callback hosts (*.example.com ok); empty = public addresses only
+CALLBACK_WORKERS = int(os.getenv("CALLBACK_WORKERS", "4"))  # Threads sending job callbacks
+CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", "10"))  # Seconds per callback attempt
+
+# Archive backfill (python -m core.backfill)
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))  # Chunks enriched at once
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "1000"))  # Alert lines per chunk (the unit of resume)
+BACKFILL_MANIFEST_PATH = os.getenv("BACKFILL_MANIFEST_PATH", "backfill_manifest.json")
+
+# Elasticsearch/OpenSearch alert source (python -m core.es_source)
+ES_SOURCE_INDEX = os.getenv("ES_SOURCE_INDEX") or ES_ALERTS_INDEX
+ES_SOURCE_TIME_FIELD = os.getenv("ES_SOURCE_TIME_FIELD", "timestamp")  # Sort and --since/--until field
+ES_SOURCE_PAGE_SIZE = int(os.getenv("ES_SOURCE_PAGE_SIZE", "500"))  # Hits per search_after page
+ES_SOURCE_KEEP_ALIVE = os.getenv("ES_SOURCE_KEEP_ALIVE", "5m")  # Point-in-time keep-alive between pages
+ES_SOURCE_RATE = float(os.getenv("ES_SOURCE_RATE", "0"))  # Max alerts/sec sent to enrichment; 0 = unlimited
+ES_SOURCE_WORKERS = int(os.getenv("ES_SOURCE_WORKERS", "4"))  # Alerts enriched at once
@@ -0,0 +1,301 @@
+"""
+Parallel backfill of historical Wazuh alert archives.
+Splits alert files (plain NDJSON or rotated ``.json.gz``) into chunks of lines, enriches
+chunks on a thread pool and writes each chunk through the batch output paths (one file
+append and ``_bulk`` requests), recording finished chunks in a resume manifest.
+
+Usage:
+    python -m core.backfill "/var/ossec/logs/alerts/2026/Sep/ossec-alerts-*.json.gz" --workers 8
+    python -m core.backfill alerts.json --chunk-size 500 --manifest sept.json --no-index
+"""
+# core/backfill.py
+import argparse
+import glob
+import gzip
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Iterator, List, NamedTuple
+
+from config import (
+    BACKFILL_WORKERS,
+    BACKFILL_CHUNK_SIZE,
+    BACKFILL_MANIFEST_PATH,
+    ENRICHED_OUTPUT_PATH,
+    INGEST_PREFILTER
+)
+from core import codec
+from core.engine import enrich_alert, prefiltered
+from core.index_template import ensure_index_template
+from core.ingest import parse_line
+from core.io import write_enriched_outputs, push_bulk_to_elasticsearch
+from core.logger import log
+from core.tracing import start_trace
+
+
+class Chunk(NamedTuple):
+    key: str  # "<absolute path>#<index>", the manifest key
+    lines: List[bytes]
+    size: int  # On-disk (compressed for .gz) bytes the chunk spans, for progress
+
+
+def expand_inputs(patterns: List[str]) -> List[str]:
+    """
+    Expands glob patterns (``**`` included) to a sorted, de-duplicated list of files.
+
+    Raises:
+        ValueError: If nothing matches.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) or ([pattern] if os.path.isfile(pattern) else [])
+        paths.extend(os.path.abspath(p) for p in sorted(matches) if os.path.isfile(p))
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        raise ValueError(f"No alert files match {patterns}")
+    return paths
+
+
+def iter_chunks(path: str, chunk_size: int) -> Iterator[Chunk]:
+    """Yields the alert lines of ``path`` (gzip if it ends in ``.gz``) in chunks of ``chunk_size``."""
+    with open(path, "rb") as raw:
+        stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+        index, lines, start = 0, [], 0
+        for line in stream:
+            line = line.strip()
+            if not line.startswith(b"{"):
+                continue
+            lines.append(line)
+            if len(lines) == chunk_size:
+                yield Chunk(f"{path}#{index}", lines, raw.tell() - start)
+                index, lines, start = index + 1, [], raw.tell()
+        if lines:
+            yield Chunk(f"{path}#{index}", lines, os.fstat(raw.fileno()).st_size - start)
+
+
+class Manifest:
+    """
+    Resume state: the number of lines already written for each finished chunk.
+
+    Saved after every chunk (write to a temporary file, then rename). A chunk that has
+    grown since (the live ``alerts.json``) resumes after the lines it already had.
+
+    Raises:
+        ValueError: If the manifest was written with a different chunk size.
+    """
+
+    def __init__(self, path: str, chunk_size: int, restart: bool = False):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        if path and os.path.exists(path) and not restart:
+            with open(path, "rb") as f:
+                data = codec.loads(f.read())
+            if data.get("chunk_size") != chunk_size:
+                raise ValueError(
+                    f"{path} was written with chunk size {data.get('chunk_size')}; "
+                    f"use the same --chunk-size or --restart"
+                )
+            self.chunks = data.get("chunks", {})
+            log(f"Resuming from {path}: {len(self.chunks)} chunks already done", tag="i")
+
+    def done_lines(self, key: str) -> int:
+        return self.chunks.get(key, {}).get("lines", 0)
+
+    def complete(self, key: str, lines: int, written: int):
+        entry = self.chunks.get(key, {})
+        self.chunks[key] = {
+            "lines": lines,
+            "written": entry.get("written", 0) + written,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if self.path:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(codec.dumps({"chunk_size": self.chunk_size, "chunks": self.chunks}, indent=True))
+            os.replace(tmp, self.path)
+
+
+class Progress:
+    """
+    Progress with throughput and ETA, logged at most every ``interval`` seconds.
+
+    Args:
+        total (int): Work to do, in bytes or (``unit="alerts"``) alerts.
+        interval (float): Seconds between progress lines.
+        unit (str): "bytes" or "alerts".
+    """
+
+    def __init__(self, total: int, interval: float = 10.0, unit: str = "bytes"):
+        self.total = max(1, total)
+        self.interval = interval
+        self.unit = unit
+        self.done = 0
+        self.skipped = 0
+        self.alerts = 0
+        self.start = time.monotonic()
+        self._last = 0.0
+
+    def advance(self, size: int, alerts: int = 0, skipped: bool = False):
+        self.done += size
+        if skipped:
+            self.skipped += size
+        self.alerts += alerts
+        if time.monotonic() - self._last >= self.interval:
+            self.report()
+
+    def report(self):
+        self._last = time.monotonic()
+        elapsed = max(1e-9, self._last - self.start)
+        rate = (self.done - self.skipped) / elapsed
+        eta = (self.total - self.done) / rate if rate else None
+        log(
+            f"Backfill {self.done / self.total:6.1%} ({self._amount(self.done)}/{self._amount(self.total)}), "
+            f"{self.alerts} alerts, {self.alerts / elapsed:.1f} alerts/s, ETA {_duration(eta)}",
+            tag="i"
+        )
+
+    def _amount(self, n: int) -> str:
+        return f"{n / (1 << 20):.1f} MiB" if self.unit == "bytes" else str(n)
+
+
+def _duration(seconds) -> str:
+    if seconds is None:
+        return "unknown"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
+
+
+def process_chunk(lines: List[bytes], seen: set, output_path: str, index: bool) -> int:
+    """
+    Enriches one chunk of alert lines, then writes the results in one append and, if
+    ``index``, bulk-indexes them.
+
+    Returns:
+        int: Documents written.
+
+    Raises:
+        OSError: If the output file write fails (the chunk is then not recorded as done).
+    """
+    outputs = []
+    for line in lines:
+        if INGEST_PREFILTER and prefiltered(line, seen):
+            continue
+        try:
+            alert = parse_line(line)
+            with start_trace(alert.get("id") or "unknown", source="backfill"):
+                output, _ = enrich_alert(alert, seen, source="backfill")
+            if output is not None:
+                outputs.append(output)
+        except Exception as e:
+            log(f"Backfill skipped a bad line ({e.__class__.__name__}: {e}): {line[:300].decode('utf-8', errors='replace')}", tag="!")
+    write_enriched_outputs(output_path, outputs, raise_errors=True)
+    if index and outputs:
+        push_bulk_to_elasticsearch(outputs)
+    return len(outputs)
+
+
+def run_backfill(patterns: List[str], workers: int = BACKFILL_WORKERS, chunk_size: int = BACKFILL_CHUNK_SIZE,
+                 manifest_path: str = BACKFILL_MANIFEST_PATH, output_path: str = ENRICHED_OUTPUT_PATH,
+                 index: bool = True, restart: bool = False, progress_interval: float = 10.0) -> int:
+    """
+    Backfills every alert file matching ``patterns``; up to ``workers`` chunks are
+    enriched at once and at most twice that many are held in memory.
+
+    Alert IDs are de-duplicated across the whole run. Chunks already in the manifest
+    are skipped, so an interrupted or partly failed run can be re-run as is.
+
+    Returns:
+        int: Number of chunks that failed (not recorded in the manifest).
+    """
+    outputs = {os.path.abspath(p) for p in (output_path, manifest_path) if p}
+    paths = [p for p in expand_inputs(patterns) if p not in outputs]
+    if not paths:
+        raise ValueError(f"No alert files match {patterns} besides the output and manifest")
+    manifest = Manifest(manifest_path, chunk_size, restart=restart)
+    progress = Progress(sum(os.path.getsize(p) for p in paths), progress_interval)
+    log(f"Backfilling {len(paths)} files with {workers} workers, {chunk_size} alerts per chunk", tag="*")
+    if index:
+        ensure_index_template()
+
+    seen = set()
+    failed = 0
+    pending = {}
+
+    def collect(block: bool):
+        nonlocal failed
+        done, _ = wait(pending, return_when=FIRST_COMPLETED) if block else (
+            [f for f in pending if f.done()], None)
+        for future in done:
+            chunk, offset = pending.pop(future)
+            try:
+                written = future.result()
+            except Exception as e:
+                failed += 1
+                log(f"Backfill chunk {chunk.key} failed: {e}", tag="!")
+                progress.advance(chunk.size)
+                continue
+            manifest.complete(chunk.key, len(chunk.lines), written)
+            progress.advance(chunk.size, len(chunk.lines) - offset)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="backfill")
+    try:
+        for path in paths:
+            for chunk in iter_chunks(path, chunk_size):
+                offset = manifest.done_lines(chunk.key)
+                if offset >= len(chunk.lines):
+                    progress.advance(chunk.size, skipped=True)
+                    continue
+                while len(pending) >= 2 * workers:
+                    collect(block=True)
+                future = executor.submit(process_chunk, chunk.lines[offset:], seen, output_path, index)
+                pending[future] = (chunk, offset)
+                collect(block=False)
+        while pending:
+            collect(block=True)
+    except KeyboardInterrupt:
+        log(f"Interrupted; finished chunks are in {manifest_path}, re-run to resume", tag="!")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    progress.report()
+    if failed:
+        log(f"Backfill finished with {failed} failed chunks; re-run to retry them", tag="!")
+    else:
+        log("Backfill complete", tag="\u2713")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrich historical Wazuh alert archives in parallel.")
+    parser.add_argument("inputs", nargs="+", help="Alert files or glob patterns (alerts.json, *.json.gz)")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Chunks enriched at once")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE, help="Alert lines per chunk")
+    parser.add_argument("--manifest", default=BACKFILL_MANIFEST_PATH, help="Resume manifest path")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing manifest and start over")
+    parser.add_argument("-o", "--output", default=ENRICHED_OUTPUT_PATH, help="Enriched output file (JSON lines)")
+    parser.add_argument("--no-index", action="store_true", help="Write the output file only, no Elasticsearch")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    try:
+        failed = run_backfill(
+            args.inputs,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            manifest_path=args.manifest,
+            output_path=args.output,
+            index=not args.no_index,
+            restart=args.restart,
+            progress_interval=args.progress_interval,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
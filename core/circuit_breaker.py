@@ -0,0 +1,130 @@
+"""
+Per-provider circuit breakers for the LLM enrichment project.
+Tracks recent call outcomes and short-circuits providers that are failing or slow.
+"""
+# core/circuit_breaker.py
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from core.logger import log
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Sliding-window circuit breaker.
+
+    The circuit opens when, over the last ``window`` calls (and at least ``min_calls``),
+    the failure rate or the slow-call rate reaches its threshold. After ``open_seconds``
+    it goes half-open and lets ``half_open_probes`` calls through: a healthy probe closes
+    the circuit, a failed or slow one re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_ms: int = 30000,
+        slow_call_rate_threshold: float = 0.8,
+        window: int = 20,
+        min_calls: int = 5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_s = slow_call_ms / 1000.0
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes = deque(maxlen=window)  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.time() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            log(f"Circuit for {self.name} half-open; probing", tag="i")
+
+    def _trip(self, reason: str):
+        self._state = OPEN
+        self._opened_at = time.time()
+        self._outcomes.clear()
+        log(f"Circuit for {self.name} opened ({reason}); failing over for {self.open_seconds:g}s", tag="!")
+
+    def allow(self) -> bool:
+        """Returns True if a call may be attempted now (reserves a probe slot when half-open)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record(self, failed: bool, duration_s: float):
+        """Records the outcome of a call that was allowed through."""
+        slow = duration_s >= self.slow_call_s
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._trip("half-open probe failed" if failed else "half-open probe slow")
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    log(f"Circuit for {self.name} closed", tag="\u2713")
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append((failed, slow))
+            n = len(self._outcomes)
+            if n < self.min_calls:
+                return
+            failure_rate = sum(1 for f, _ in self._outcomes if f) / n
+            slow_rate = sum(1 for _, s in self._outcomes if s) / n
+            if failure_rate >= self.failure_rate_threshold:
+                self._trip(f"failure rate {failure_rate:.0%}")
+            elif slow_rate >= self.slow_call_rate_threshold:
+                self._trip(f"slow-call rate {slow_rate:.0%}")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """
+    Returns the shared breaker for a provider, creating it on first use.
+
+    Args:
+        name (str): Provider name (e.g. "claude").
+        **kwargs: CircuitBreaker settings, used only when the breaker is created.
+    """
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **kwargs)
+        return _breakers[name]
+
+
+def breaker_states() -> Dict[str, str]:
+    """Returns the current state of every registered breaker."""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.state for b in breakers}
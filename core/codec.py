@@ -0,0 +1,118 @@
+"""
+JSON codec for the LLM enrichment project.
+One encode/decode API used on the ingest and output paths, backed by orjson or msgspec
+when installed and the standard library otherwise. Datetimes and pydantic models are
+serialized natively, so no ``default=`` round trips are needed.
+"""
+# core/codec.py
+import datetime
+import json
+from typing import Any, Union
+
+from config import JSON_CODEC
+
+JSONDecodeError = json.JSONDecodeError
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types the backend does not handle natively."""
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def _stdlib():
+    def dumps_bytes(obj, sort_keys=False, indent=False):
+        return json.dumps(
+            obj, default=_default, sort_keys=sort_keys, ensure_ascii=False,
+            indent=2 if indent else None, separators=None if indent else (",", ":"),
+        ).encode("utf-8")
+
+    return "stdlib", dumps_bytes, json.loads
+
+
+def _orjson():
+    import orjson
+    base = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj, sort_keys=False, indent=False):
+        option = base | (orjson.OPT_SORT_KEYS if sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def loads(data):
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return orjson.loads(data)
+
+    return "orjson", dumps_bytes, loads
+
+
+def _msgspec():
+    import msgspec
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    sorted_encoder = msgspec.json.Encoder(enc_hook=_default, order="sorted")
+    decoder = msgspec.json.Decoder()
+
+    def dumps_bytes(obj, sort_keys=False, indent=False):
+        data = (sorted_encoder if sort_keys else encoder).encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+    def loads(data):
+        try:
+            return decoder.decode(data)
+        except msgspec.DecodeError as e:
+            text = data.decode("utf-8", errors="replace") if isinstance(data, (bytes, bytearray)) else data
+            raise JSONDecodeError(str(e), text, 0) from None
+
+    return "msgspec", dumps_bytes, loads
+
+
+_BACKENDS = {"orjson": _orjson, "msgspec": _msgspec, "stdlib": _stdlib}
+
+
+def _select(name: str):
+    if name != "auto":
+        if name not in _BACKENDS:
+            raise ValueError(f"Unsupported JSON_CODEC: {name}")
+        return _BACKENDS[name]()
+    for candidate in ("orjson", "msgspec"):
+        try:
+            return _BACKENDS[candidate]()
+        except ImportError:
+            continue
+    return _stdlib()
+
+
+BACKEND, _dumps_bytes, _loads = _select(JSON_CODEC)
+
+
+def dumps_bytes(obj: Any, sort_keys: bool = False, indent: bool = False) -> bytes:
+    """
+    Serializes ``obj`` to compact UTF-8 JSON bytes.
+
+    Args:
+        obj: Value to encode; datetimes become ISO 8601 strings, pydantic models dicts.
+        sort_keys (bool): Sort object keys (stable output for hashing).
+        indent (bool): Pretty-print with two-space indentation.
+    """
+    return _dumps_bytes(obj, sort_keys, indent)
+
+
+def dumps(obj: Any, sort_keys: bool = False, indent: bool = False) -> str:
+    """Same as ``dumps_bytes`` but returns ``str``."""
+    return _dumps_bytes(obj, sort_keys, indent).decode("utf-8")
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """
+    Parses JSON from ``str`` or ``bytes``.
+
+    Raises:
+        json.JSONDecodeError: On invalid JSON, whatever the backend.
+    """
+    return _loads(data)
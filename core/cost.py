@@ -0,0 +1,239 @@
+"""
+Token usage and cost metering for the LLM enrichment project.
+Estimates per-call cost from a price table and aggregates usage per provider, model and rule.
+"""
+# core/cost.py
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from core.logger import log
+from core import codec
+
+# USD per 1M tokens: (input, output). Override or extend with LLM_PRICE_TABLE.
+DEFAULT_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-opus": (15.00, 75.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+# Providers whose calls cost nothing per token (local inference)
+FREE_PROVIDERS = {"ollama"}
+
+
+def load_price_table(path: Optional[str] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Returns the default price table merged with an optional JSON override file.
+
+    The file maps model names to ``{"input": usd_per_1m, "output": usd_per_1m}``.
+
+    Args:
+        path (str, optional): Path to the JSON price file (default: LLM_PRICE_TABLE env).
+    """
+    prices = dict(DEFAULT_PRICES)
+    from config import LLM_PRICE_TABLE
+    path = path if path is not None else LLM_PRICE_TABLE
+    if path:
+        try:
+            with open(path, encoding="utf-8") as f:
+                for model, price in json.load(f).items():
+                    prices[model] = (float(price["input"]), float(price["output"]))
+        except Exception as e:
+            log(f"Failed to load price table {path}: {e}", tag="!")
+    return prices
+
+
+PRICES = load_price_table()
+
+
+def estimate_cost(provider: str, model: Optional[str], input_tokens: Optional[int], output_tokens: Optional[int]) -> Optional[float]:
+    """
+    Estimates the USD cost of one call.
+
+    Models are matched exactly, then by the longest price-table prefix (so dated
+    snapshots like "claude-3-haiku-20240307" use the "claude-3-haiku" price).
+
+    Returns:
+        float or None: Estimated cost, or None if token counts or the price are unknown.
+    """
+    if input_tokens is None and output_tokens is None:
+        return None
+    if provider in FREE_PROVIDERS:
+        return 0.0
+    if not model:
+        return None
+    price = PRICES.get(model)
+    if price is None:
+        matches = [name for name in PRICES if model.startswith(name)]
+        if not matches:
+            return None
+        price = PRICES[max(matches, key=len)]
+    return ((input_tokens or 0) * price[0] + (output_tokens or 0) * price[1]) / 1_000_000
+
+
+def usage_fields(provider: str, model: Optional[str], input_tokens: Optional[int], output_tokens: Optional[int]) -> Dict[str, Any]:
+    """
+    Returns the usage fields to merge into an Enrichment.
+    """
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "estimated_cost_usd": estimate_cost(provider, model, input_tokens, output_tokens),
+    }
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"calls": 0, "failed_calls": 0, "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+
+
+class CostMeter:
+    """
+    Thread-safe in-memory usage aggregates.
+
+    Keeps cumulative totals (for the API endpoint) and a rolling window that is
+    reset each time a rollup is written. An alert counts toward every rule group it
+    belongs to, so per-group totals overlap; per-rule and per-model totals do not.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = datetime.now(timezone.utc).isoformat()
+        self._cumulative = self._new_buckets()
+        self._window_started = self._started
+        self._window = self._new_buckets()
+
+    @staticmethod
+    def _new_buckets() -> Dict[str, Dict]:
+        return {"totals": _empty_totals(), "by_model": {}, "by_rule_group": {}, "by_rule": {}}
+
+    @staticmethod
+    def _add(totals: Dict[str, Any], failed: bool, input_tokens: int, output_tokens: int, cost: float):
+        totals["calls"] += 1
+        totals["failed_calls"] += int(failed)
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        totals["cost_usd"] += cost
+
+    def record(self, provider: str, alert, enrichment) -> None:
+        """
+        Records one provider call.
+
+        Args:
+            provider (str): Provider name (e.g. "openai").
+            alert (WazuhAlertInput or dict): The alert that was enriched (for rule id and groups).
+            enrichment: The Enrichment returned by the provider.
+        """
+        model = getattr(enrichment, "llm_model_version", None) or "unknown"
+        input_tokens = getattr(enrichment, "input_tokens", None) or 0
+        output_tokens = getattr(enrichment, "output_tokens", None) or 0
+        cost = getattr(enrichment, "estimated_cost_usd", None) or 0.0
+        failed = getattr(enrichment, "error", None) is not None
+        if isinstance(alert, dict):
+            rule = alert.get("rule") or {}
+            rule_id, groups = rule.get("id"), rule.get("groups")
+        else:
+            rule_id, groups = alert.rule.id, alert.rule.groups
+        rule_id = str(rule_id or "unknown")
+        groups = groups or ["unknown"]
+        with self._lock:
+            for buckets in (self._cumulative, self._window):
+                self._add(buckets["totals"], failed, input_tokens, output_tokens, cost)
+                key = (provider, model)
+                self._add(buckets["by_model"].setdefault(key, _empty_totals()), failed, input_tokens, output_tokens, cost)
+                key = (provider, model, rule_id)
+                self._add(buckets["by_rule"].setdefault(key, _empty_totals()), failed, input_tokens, output_tokens, cost)
+                for group in groups:
+                    key = (provider, model, group)
+                    self._add(buckets["by_rule_group"].setdefault(key, _empty_totals()), failed, input_tokens, output_tokens, cost)
+
+    @staticmethod
+    def _render(buckets: Dict[str, Dict], since: str) -> Dict[str, Any]:
+        def rows(table, names):
+            out = [dict(zip(names, key), **totals) for key, totals in table.items()]
+            return sorted(out, key=lambda r: r["cost_usd"], reverse=True)
+        return {
+            "since": since,
+            "totals": dict(buckets["totals"]),
+            "by_model": rows(buckets["by_model"], ("provider", "model")),
+            "by_rule_group": rows(buckets["by_rule_group"], ("provider", "model", "rule_group")),
+            "by_rule": rows(buckets["by_rule"], ("provider", "model", "rule_id")),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns cumulative aggregates since process start."""
+        with self._lock:
+            return self._render(self._cumulative, self._started)
+
+    def rollup(self) -> Dict[str, Any]:
+        """Returns aggregates since the previous rollup and starts a new window."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            report = self._render(self._window, self._window_started)
+            self._window = self._new_buckets()
+            self._window_started = now
+        report["until"] = now
+        return report
+
+
+meter = CostMeter()
+
+
+def metered(provider: str, query):
+    """
+    Wraps a provider query function so every call is recorded in the global meter.
+    """
+    def wrapper(alert: dict, model: Optional[str] = None):
+        result = query(alert, model=model)
+        enrichment = getattr(result, "enrichment", None)
+        if enrichment is not None:
+            try:
+                meter.record(provider, alert, enrichment)
+            except Exception as e:
+                log(f"Cost metering failed: {e}", tag="!")
+        return result
+    wrapper.__name__ = getattr(query, "__name__", "query")
+    return wrapper
+
+
+_rollup_thread = None
+
+
+def start_cost_rollup(path: Optional[str] = None, interval: Optional[float] = None):
+    """
+    Starts a daemon thread that appends a usage rollup (JSON line) to ``path`` every ``interval`` seconds.
+
+    Does nothing if no path is configured (COST_ROLLUP_PATH) or the thread is already running.
+    """
+    global _rollup_thread
+    from config import COST_ROLLUP_PATH, COST_ROLLUP_INTERVAL
+    path = path or COST_ROLLUP_PATH
+    interval = interval or COST_ROLLUP_INTERVAL
+    if not path or _rollup_thread is not None:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            report = meter.rollup()
+            if report["totals"]["calls"] == 0:
+                continue
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(codec.dumps(report) + "\n")
+            except Exception as e:
+                log(f"Failed to write cost rollup to {path}: {e}", tag="!")
+
+    _rollup_thread = threading.Thread(target=run, name="cost-rollup", daemon=True)
+    _rollup_thread.start()
+    log(f"Writing cost rollups to {path} every {interval:g}s", tag="i")
@@ -3,102 +3,356 @@ Main enrichment engine for the LLM enrichment project.
 Handles reading alerts, running enrichment, and writing output.
 """
 # core/engine.py
-import json
+import threading
 import time
+from typing import Callable, Optional
 from datetime import datetime, timezone
 from config import (
     LLM_MODEL,
-    ALERT_LOG_PATH,
-    ENRICHED_OUTPUT_PATH
+    ENGINE_THROTTLE_SECONDS,
+    INGEST_PREFILTER,
+    WORKQUEUE_PATH,
+    WORKQUEUE_ROLE,
+    WORKQUEUE_BATCH_SIZE,
+    WORKQUEUE_POLL_INTERVAL,
+    INPUT_SOURCE
 )
 from core.factory import get_llm_query_function
-from utils.validation import validate_input_alert, validate_enriched_output
-from core.io import read_alert_log, write_enriched_output, push_to_elasticsearch
+from core.filters import get_filter_engine, filtered_output, SKIP, YARA_ONLY
+from core.yara_integration import get_yara_matches
+from utils.validation import validate_input_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput
+from core.ingest import peek_alert, parse_line
+from core.sources import AlertSource, open_input_source
+from core.index_template import ensure_index_template
+from core.sinks import get_output_sinks, close_output_sinks
+from core.workqueue import Job, WorkQueue
 from core.logger import log
-from core.preprocessing import fill_missing_fields, normalize_alert_types
+from core.preprocessing import normalize_alert
+from core.cost import start_cost_rollup
+from core.metrics import (
+    time_stage, start_metrics_server, ALERTS_PROCESSED, FALLBACKS, FILTERED, INGEST_PREFILTERED
+)
+from core.utils import enrichment_failed
+from core.tracing import start_trace
+from core.profiler import install_signal_trigger
 
 query_llm = get_llm_query_function()
+filter_engine = get_filter_engine()
+_seen_lock = threading.Lock()  # Makes the duplicate check and add one step for shared seen sets
 
 
-def run_enrichment_loop():
+def fallback_enrichment():
     """
-    Continuously reads alerts, enriches them using the selected LLM provider, and writes the output.
+    Returns the enrichment dict written when validation or enrichment fails.
+    """
+    return {
+        "summary_text": None,
+        "tags": [],
+        "risk_score": None,
+        "false_positive_likelihood": None,
+        "alert_category": None,
+        "remediation_steps": [],
+        "related_cves": [],
+        "external_refs": [],
+        "llm_model_version": None,
+        "enriched_by": None,
+        "enrichment_duration_ms": None,
+        "yara_matches": [],
+        "raw_llm_response": None,
+        "error": "Validation or enrichment failed"
+    }
+
 
-    Tracks seen alerts to avoid duplicate enrichment.
+def enrich_alert(alert: dict, seen: set, source: str = "file"):
     """
-    seen = set()
-    log(f"Enriching with {LLM_MODEL}...", tag="*")
+    Preprocesses and enriches a single parsed alert, without writing it.
 
-    with read_alert_log(ALERT_LOG_PATH) as logfile:
-        while True:
-            line = logfile.readline()
-            if not line:
-                time.sleep(1)
-                continue
+    The alert is validated once, here; the resulting WazuhAlertInput is what the
+    provider, the output file and Elasticsearch receive.
+
+    Args:
+        alert (dict): The parsed alert JSON.
+        seen (set): Alert IDs already enriched; duplicates are skipped. It may be shared
+            by threads (the backfill workers).
+        source (str): ``enrichment_alerts_total`` source label.
 
-            line = line.strip()
-            if not line or not line.startswith("{"):
-                continue
+    Returns:
+        tuple: ``(output, llm_called)``. ``output`` is the EnrichedAlertOutput (or a
+            fallback dict for a schema-invalid alert) to write, or None if the alert was
+            a duplicate or skipped by the filter; ``llm_called`` is False in those cases
+            and for yara_only alerts.
+    """
+    with time_stage("preprocess"):
+        alert = normalize_alert(alert)
+    alert_id = alert.get("id") or f"{alert.get('timestamp')}_{alert.get('rule', {}).get('id')}"
+    with _seen_lock:
+        if alert_id in seen:
+            return None, False
+        seen.add(alert_id)
+    ALERTS_PROCESSED.labels(source).inc()
 
+    alert_obj = None
+    enriched = None
+    llm_called = True
+    try:
+        with time_stage("validation"):
+            alert_obj = validate_input_alert(alert)
+        with time_stage("filter"):
+            decision = filter_engine.route(alert_obj)
+        FILTERED.labels(decision.action, decision.rule).inc()
+        if decision.action == SKIP:
+            log(f"Alert {alert_id} skipped by filter rule {decision.rule}", tag="i")
+            return None, False
+        if decision.action == YARA_ONLY:
+            llm_called = False
+            enriched = filtered_output(alert_obj, decision, get_yara_matches(alert_obj))
+        else:
+            log(f"Enriching alert {alert_id}...", tag="+")
             try:
-                alert = json.loads(line)
-
-                alert = fill_missing_fields(alert)
-                alert = normalize_alert_types(alert)
-                alert_id = alert.get("id") or f"{alert.get('timestamp')}_{alert.get('rule', {}).get('id')}"
-                if alert_id in seen:
-                    continue
-                seen.add(alert_id)
-
-                try:
-                    validate_input_alert(alert)
-                    log(f"Enriching alert {alert_id}...", tag="+")
-                    try:
-                        enriched = query_llm(alert, model=LLM_MODEL)
-                    except Exception as e:
-                        log(f"[WARNING] LLM provider failed: {e}", tag="!")
-                        enriched = None
-                    enrichment_data = None
-                    if enriched and hasattr(enriched, "enrichment"):
-                        enrichment_data = enriched.enrichment.model_dump()
-                        # Defensive: ensure yara_matches is always present
-                        if "yara_matches" not in enrichment_data or enrichment_data["yara_matches"] is None:
-                            enrichment_data["yara_matches"] = []
-                    else:
-                        enrichment_data = {
-                            "summary_text": None,
-                            "tags": [],
-                            "risk_score": None,
-                            "false_positive_likelihood": None,
-                            "alert_category": None,
-                            "remediation_steps": [],
-                            "related_cves": [],
-                            "external_refs": [],
-                            "llm_model_version": None,
-                            "enriched_by": None,
-                            "enrichment_duration_ms": None,
-                            "yara_matches": [],
-                            "raw_llm_response": None,
-                            "error": "Validation or enrichment failed"
-                        }
-                output = {
-                    "alert_id": alert_id,
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "alert": alert,
-                    "enrichment": enrichment_data
-                }
-
-                try:
-                    validate_enriched_output(output)
-                except Exception as e:
-                    import traceback
-                    log(f"[FALLBACK] Output schema validation failed: {e}\nTraceback: {traceback.format_exc()}", tag="!")
-                    # Still write and push the output, even if not schema-valid
-                write_enriched_output(ENRICHED_OUTPUT_PATH, output)
-                push_to_elasticsearch(output)
-                time.sleep(1.5)
+                with time_stage("llm"):
+                    enriched = query_llm(alert_obj, model=LLM_MODEL)
+            except Exception as e:
+                log(f"[WARNING] LLM provider failed: {e}", tag="!")
+            if enrichment_failed(enriched):
+                FALLBACKS.labels("provider").inc()
+    except Exception as e:
+        log(f"[WARNING] Alert {alert_id} failed input validation: {e}", tag="!")
+        FALLBACKS.labels("validation").inc()
+
+    if alert_obj is None:
+        # Not schema-valid: written as received; the Elasticsearch push dead-letters it
+        output = {
+            "alert_id": alert_id,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "alert": alert,
+            "enrichment": fallback_enrichment()
+        }
+    else:
+        if enriched is not None and hasattr(enriched, "enrichment"):
+            enrichment = enriched.enrichment
+            # Defensive: ensure yara_matches is always present
+            if enrichment.yara_matches is None:
+                enrichment = enrichment.model_copy(update={"yara_matches": []})
+        else:
+            enrichment = Enrichment.model_construct(**fallback_enrichment())
+        # Built from already-validated parts, so not validated again
+        output = EnrichedAlertOutput.model_construct(
+            alert_id=alert_id,
+            timestamp=datetime.now(timezone.utc),
+            alert=alert_obj,
+            enrichment=enrichment
+        )
+    return output, llm_called
+
+
+def process_alert(alert: dict, seen: set, source: str = "file", done: Optional[Callable[[], None]] = None):
+    """
+    Enriches a single parsed alert (see ``enrich_alert``), then hands it to the output
+    sinks (OUTPUT_SINKS), which write it on their own threads. ``done`` runs once every
+    sink has written it, or right away if there is nothing to write.
+
+    Returns:
+        bool: False if the alert was a duplicate or the pre-enrichment filter kept it
+            from the LLM, True otherwise.
+    """
+    output, llm_called = enrich_alert(alert, seen, source)
+    if output is not None:
+        get_output_sinks().emit(output, done)
+    elif done is not None:
+        done()
+    return llm_called
+
+
+def prefiltered(line: bytes, seen: set) -> bool:
+    """
+    Returns True if a raw alert line can be dropped without parsing: its id (read by the
+    byte scanner) was already enriched, or the filter skips its rule ID/level outright.
+    """
+    peek = peek_alert(line)
+    if peek.alert_id is not None and peek.alert_id in seen:
+        INGEST_PREFILTERED.labels("duplicate").inc()
+        return True
+    if peek.rule_id is not None or peek.level is not None:
+        decision = filter_engine.prefilter(peek.rule_id, peek.level)
+        if decision is not None and decision.action == SKIP:
+            FILTERED.labels(decision.action, decision.rule).inc()
+            INGEST_PREFILTERED.labels("filter").inc()
+            return True
+    return False
+
+
+def handle_line(line: bytes, seen: set, source: str, done: Optional[Callable[[], None]] = None):
+    """Prefilters, parses and processes one raw alert line; a bad line is logged and dropped."""
+    try:
+        if INGEST_PREFILTER and prefiltered(line, seen):
+            processed = False
+        else:
+            alert = parse_line(line)
+            with start_trace(alert.get("id") or "unknown", source=source):
+                processed = process_alert(alert, seen, source, done)
+            done = None
+        if processed and ENGINE_THROTTLE_SECONDS:
+            time.sleep(ENGINE_THROTTLE_SECONDS)
+    except Exception as e:
+        import traceback
+        log(f"{e.__class__.__name__}: {e}\nTraceback: {traceback.format_exc()}", tag="!")
+        log(f"[DEBUG] Bad line: {line[:300].decode('utf-8', errors='replace')}...", tag="DEBUG")
+    if done is not None:
+        done()
+
+
+def ingest_to_queue(source: AlertSource, work_queue: WorkQueue):
+    """
+    Appends every batch from ``source`` to the work queue, with the source's resume
+    position in the same transaction. Lines the filter skips on rule ID and level alone
+    are not stored.
+    """
+    for lines in source.batches():
+        if INGEST_PREFILTER:
+            lines = [line for line in lines if not prefiltered(line, ())]
+        position = source.position()
+        work_queue.put_many(lines, cursor=(source.name, position) if position is not None else None)
+
 
+class _Acks:
+    """
+    Jobs whose alerts every sink has written, acknowledged in batches.
+
+    A background thread extends the leases of jobs still held every half visibility
+    timeout, so a slow batch or a backed-up sink does not let them expire and be
+    delivered to another worker.
+    """
+
+    def __init__(self, work_queue: WorkQueue):
+        self.work_queue = work_queue
+        self._held = {}  # Leased jobs not written yet, by ID
+        self._done = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        threading.Thread(target=self._renew, name="workqueue-renew", daemon=True).start()
+
+    @property
+    def pending(self) -> int:
+        return len(self._held)
+
+    def track(self, job: Job) -> Callable[[], None]:
+        with self._lock:
+            self._held[job.id] = job
+
+        def done():
+            with self._lock:
+                self._held.pop(job.id, None)
+                self._done.append(job)
+        return done
+
+    def flush(self):
+        with self._lock:
+            jobs, self._done = self._done, []
+        self.work_queue.ack(jobs)
+
+    def _renew(self):
+        while not self._stop.wait(self.work_queue.visibility_timeout / 2):
+            with self._lock:
+                jobs = list(self._held.values())
+            try:
+                self.work_queue.extend(jobs)
             except Exception as e:
-                import traceback
-                log(f"{e.__class__.__name__}: {e}\nTraceback: {traceback.format_exc()}", tag="!")
-                log(f"[DEBUG] Bad line: {line[:300]}...", tag="DEBUG")
+                log(f"Failed to extend {len(jobs)} work queue leases: {e}", tag="!")
+
+    def close(self):
+        self._stop.set()
+
+
+def consume_queue(work_queue: WorkQueue, seen: set, stop: Optional[threading.Event] = None,
+                  batch_size: int = WORKQUEUE_BATCH_SIZE):
+    """
+    Leases alert lines from the work queue in batches and enriches them. A job is
+    acknowledged once its output is written by every sink (or it is dropped), so an
+    alert is lost neither by a crash mid-batch nor by one with outputs still queued.
+
+    At most two batches are leased but not yet written, which leaves the rest of a
+    backlog on disk rather than in the sink queues. Leases are extended until the jobs
+    are acknowledged (see ``_Acks``). Runs until ``stop`` is set and the queue has
+    nothing left for this process.
+    """
+    acks = _Acks(work_queue)
+    last_stats = 0.0
+    try:
+        while True:
+            # Lease more only once the sinks have caught up, so they are not overrun
+            while acks.pending >= 2 * batch_size:
+                time.sleep(0.05)
+                acks.flush()
+            jobs = work_queue.get_batch(batch_size)
+            # Every job is held (and its lease kept) from the start, not once its turn comes
+            dones = [acks.track(job) for job in jobs]
+            for job, done in zip(jobs, dones):
+                handle_line(job.payload, seen, "queue", done)
+            finished = stop is not None and stop.is_set() and not jobs and not acks.pending
+            acks.flush()
+            if finished:
+                return
+            if time.monotonic() - last_stats >= 10:
+                work_queue.stats()
+                last_stats = time.monotonic()
+            if not jobs:
+                time.sleep(WORKQUEUE_POLL_INTERVAL)
+    finally:
+        acks.close()
+
+
+def run_enrichment_loop(source: Optional[AlertSource] = None):
+    """
+    Continuously reads alerts, enriches them using the selected LLM provider, and writes the output.
+
+    Alerts come from ``source`` (default: INPUT_SOURCE, the alert log tailer unless set).
+    Tracks seen alerts to avoid duplicate enrichment. Lines are read as raw bytes;
+    duplicates and filter skips are dropped by a byte scan before a line is parsed.
+    With WORKQUEUE_PATH set, lines go through the durable work queue (see
+    ``ingest_to_queue`` and ``consume_queue``; WORKQUEUE_ROLE picks either side).
+    Returns when the source ends (end of stdin).
+    """
+    seen = set()
+    start_cost_rollup()
+    start_metrics_server()
+    install_signal_trigger()
+    work_queue = WorkQueue() if WORKQUEUE_PATH else None
+    consume = work_queue is None or WORKQUEUE_ROLE in ("both", "consume")
+    ingest = work_queue is None or WORKQUEUE_ROLE in ("both", "ingest")
+    if work_queue is not None and not (consume or ingest):
+        raise ValueError(f"Unknown WORKQUEUE_ROLE: {WORKQUEUE_ROLE}")
+    if consume:
+        ensure_index_template()
+        get_output_sinks()  # Built now so a bad sink setting fails at startup
+    if ingest and source is None:
+        source = open_input_source(resume=work_queue.cursor(INPUT_SOURCE) if work_queue else None)
+    log(f"Enriching {source.name if ingest else 'queued'} input with {LLM_MODEL}"
+        + (f" through {WORKQUEUE_PATH} ({WORKQUEUE_ROLE})" if work_queue else "") + "...", tag="*")
+
+    try:
+        if work_queue is None:
+            with source:
+                for lines in source.batches():
+                    for line in lines:
+                        handle_line(line, seen, source.name)
+        elif not consume:
+            with source:
+                ingest_to_queue(source, work_queue)
+        else:
+            stop = threading.Event()
+            if ingest:
+                def run_ingest():
+                    try:
+                        with source:
+                            ingest_to_queue(source, work_queue)
+                    finally:
+                        stop.set()
+                threading.Thread(target=run_ingest, name="queue-ingest", daemon=True).start()
+            consume_queue(work_queue, seen, stop if ingest else None)
+    finally:
+        if consume:
+            # Write what the sinks still hold before exiting (e.g. on Ctrl+C or end of stdin)
+            close_output_sinks()
+        if work_queue is not None:
+            work_queue.close()
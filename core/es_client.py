@@ -0,0 +1,39 @@
+"""
+Small JSON client for the Elasticsearch/OpenSearch REST APIs the tools call directly
+(search, point in time, multi-get, index templates).
+"""
+# core/es_client.py
+import requests
+
+from config import ELASTICSEARCH_URL, ELASTIC_USER, ELASTIC_PASS
+from core import codec
+
+
+class SearchClient:
+    """
+    Minimal JSON client over one HTTP session.
+    Detects OpenSearch from ``GET /``, since its point-in-time API and field types differ.
+    """
+
+    def __init__(self, url: str = ELASTICSEARCH_URL, user: str = ELASTIC_USER, password: str = ELASTIC_PASS):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        self.session.verify = False
+        info = self.request("GET", "/")
+        self.opensearch = info.get("version", {}).get("distribution") == "opensearch"
+
+    def request(self, method: str, path: str, body=None, params=None) -> dict:
+        response = self.session.request(
+            method,
+            f"{self.url}{path}",
+            data=None if body is None else codec.dumps_bytes(body),
+            params=params,
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        return codec.loads(response.content) if response.content else {}
+
+    def exists(self, path: str) -> bool:
+        """True if ``HEAD path`` answers 200 (index, alias or template exists)."""
+        return self.session.head(f"{self.url}{path}").status_code == 200
@@ -0,0 +1,272 @@
+"""
+Elasticsearch/OpenSearch alert source for retroactive enrichment.
+Pages through the Wazuh alert indices with a point in time and ``search_after``, skips
+alerts already in ENRICHED_INDEX with batched multi-get lookups, and enriches the rest
+at a controlled rate through the batch output paths.
+
+Usage:
+    python -m core.es_source "wazuh-alerts-4.x-2026.09.*" --since 2026-09-01 --min-level 7 --rate 20
+    python -m core.es_source --since now-7d --query '{"term": {"agent.name": "web-01"}}' --no-index
+"""
+# core/es_source.py
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+import requests
+
+from config import (
+    ENRICHED_INDEX,
+    ENRICHED_OUTPUT_PATH,
+    ES_OUTPUT_MODE,
+    ES_ROLLOVER,
+    ES_SOURCE_INDEX,
+    ES_SOURCE_TIME_FIELD,
+    ES_SOURCE_PAGE_SIZE,
+    ES_SOURCE_KEEP_ALIVE,
+    ES_SOURCE_RATE,
+    ES_SOURCE_WORKERS
+)
+from core import codec
+from core.backfill import Progress
+from core.engine import enrich_alert
+from core.es_client import SearchClient
+from core.index_template import ensure_index_template
+from core.io import write_enriched_outputs, push_bulk_to_elasticsearch
+from core.logger import log
+from core.tracing import start_trace
+
+
+def build_query(since: Optional[str] = None, until: Optional[str] = None, min_level: Optional[int] = None,
+                extra: Optional[dict] = None, time_field: str = ES_SOURCE_TIME_FIELD) -> dict:
+    """
+    Builds the source filter: ``since <= time_field < until`` (dates or date math such as
+    ``now-7d``), ``rule.level >= min_level`` and an optional extra query clause.
+    """
+    filters = []
+    bounds = {k: v for k, v in (("gte", since), ("lt", until)) if v}
+    if bounds:
+        filters.append({"range": {time_field: bounds}})
+    if min_level is not None:
+        filters.append({"range": {"rule.level": {"gte": min_level}}})
+    if extra:
+        filters.append(extra)
+    return {"bool": {"filter": filters}} if filters else {"match_all": {}}
+
+
+class PointInTimeReader:
+    """
+    Pages through every hit of ``query`` in ``index`` in a consistent snapshot.
+
+    Sorted by ``time_field`` plus the cluster's tiebreaker (``_shard_doc``, ``_id`` on
+    OpenSearch), each page resumes from the previous page's last sort values; the point
+    in time is closed when iteration ends.
+
+    Args:
+        client (SearchClient): Cluster connection.
+        index (str): Index name or pattern (comma-separated patterns allowed).
+        query (dict): Query DSL clause (see ``build_query``).
+        page_size (int): Hits per page.
+        keep_alive (str): How long the point in time is kept between pages.
+        time_field (str): Sort field.
+    """
+
+    def __init__(self, client: SearchClient, index: str, query: dict, page_size: int = ES_SOURCE_PAGE_SIZE,
+                 keep_alive: str = ES_SOURCE_KEEP_ALIVE, time_field: str = ES_SOURCE_TIME_FIELD):
+        self.client = client
+        self.index = index
+        self.query = query
+        self.page_size = page_size
+        self.keep_alive = keep_alive
+        self.sort = [
+            {time_field: {"order": "asc", "unmapped_type": "date"}},
+            {"_id": "asc"} if client.opensearch else {"_shard_doc": "asc"},
+        ]
+        self.total = None
+
+    def _open(self) -> str:
+        if self.client.opensearch:
+            return self.client.request("POST", f"/{self.index}/_search/point_in_time",
+                                       params={"keep_alive": self.keep_alive})["pit_id"]
+        return self.client.request("POST", f"/{self.index}/_pit", params={"keep_alive": self.keep_alive})["id"]
+
+    def _close(self, pit: str):
+        try:
+            if self.client.opensearch:
+                self.client.request("DELETE", "/_search/point_in_time", {"pit_id": [pit]})
+            else:
+                self.client.request("DELETE", "/_pit", {"id": pit})
+        except requests.exceptions.RequestException as e:
+            log(f"Could not close point in time: {e}", tag="!")
+
+    def pages(self) -> Iterator[List[dict]]:
+        pit = self._open()
+        try:
+            search_after = None
+            while True:
+                body = {
+                    "size": self.page_size,
+                    "query": self.query,
+                    "pit": {"id": pit, "keep_alive": self.keep_alive},
+                    "sort": self.sort,
+                    "track_total_hits": self.total is None,
+                }
+                if search_after is not None:
+                    body["search_after"] = search_after
+                result = self.client.request("POST", "/_search", body)
+                pit = result.get("pit_id", pit)
+                hits = result["hits"]["hits"]
+                if self.total is None:
+                    self.total = result["hits"].get("total", {}).get("value", 0)
+                if not hits:
+                    return
+                yield hits
+                search_after = hits[-1]["sort"]
+        finally:
+            self._close(pit)
+
+
+def hit_alert(hit: dict) -> dict:
+    """The alert in a search hit; the document ``_id`` stands in for a missing alert ``id``."""
+    alert = hit["_source"]
+    if not alert.get("id"):
+        alert["id"] = hit["_id"]
+    return alert
+
+
+def already_enriched(client: SearchClient, alert_ids: List[str], index: str = ENRICHED_INDEX) -> set:
+    """
+    Alert IDs that already have a document in the enriched index, in one ``_mget`` (or,
+    with ES_ROLLOVER, one ``ids`` search, since ``_mget`` needs a single concrete index).
+    """
+    if not alert_ids:
+        return set()
+    try:
+        if ES_ROLLOVER:
+            body = {"size": len(alert_ids), "_source": False, "query": {"ids": {"values": alert_ids}}}
+            result = client.request("POST", f"/{index}/_search", body)
+            return {hit["_id"] for hit in result["hits"]["hits"]}
+        result = client.request("POST", f"/{index}/_mget", {"ids": alert_ids}, params={"_source": "false"})
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return set()  # The enriched index does not exist yet
+        raise
+    return {doc["_id"] for doc in result.get("docs", []) if doc.get("found")}
+
+
+class RatePacer:
+    """Spaces calls ``1 / rate`` seconds apart across threads; a rate of 0 does not wait."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def run_es_source(index: str = ES_SOURCE_INDEX, query: Optional[dict] = None, page_size: int = ES_SOURCE_PAGE_SIZE,
+                  keep_alive: str = ES_SOURCE_KEEP_ALIVE, time_field: str = ES_SOURCE_TIME_FIELD,
+                  rate: float = ES_SOURCE_RATE, workers: int = ES_SOURCE_WORKERS,
+                  output_path: str = ENRICHED_OUTPUT_PATH, index_output: bool = True,
+                  progress_interval: float = 10.0) -> int:
+    """
+    Enriches every alert of ``index`` matching ``query`` that is not enriched yet.
+
+    Each page is checked against ENRICHED_INDEX with one ``_mget`` (with
+    ES_OUTPUT_MODE=update, alerts that already carry an ``enrichment`` are excluded by
+    the query instead, and results go back to the hits' own documents). The remaining
+    alerts are enriched on ``workers`` threads, started at most ``rate`` per second, then
+    written with one file append and ``_bulk`` requests. Re-running the same command
+    resumes, since alerts enriched before are skipped (only when indexing is on).
+
+    Returns:
+        int: Alerts enriched.
+    """
+    client = SearchClient()
+    update = ES_OUTPUT_MODE == "update"
+    query = query or {"match_all": {}}
+    if update:
+        query = {"bool": {"filter": [query], "must_not": [{"exists": {"field": "enrichment"}}]}}
+    reader = PointInTimeReader(client, index, query, page_size, keep_alive, time_field)
+    pacer = RatePacer(rate)
+    seen = set()
+    progress = None
+    enriched = 0
+    log(f"Enriching alerts from {index} ({'OpenSearch' if client.opensearch else 'Elasticsearch'}), "
+        f"{page_size} per page, {workers} workers" + (f", {rate:g}/s" if rate else ""), tag="*")
+
+    def enrich(alert):
+        pacer.wait()
+        with start_trace(alert.get("id") or "unknown", source="es"):
+            output, _ = enrich_alert(alert, seen, source="es")
+        return output
+
+    if index_output:
+        ensure_index_template()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="es-source") as executor:
+        for hits in reader.pages():
+            if progress is None:
+                progress = Progress(reader.total, progress_interval, unit="alerts")
+            alerts = [hit_alert(hit) for hit in hits]
+            locations = {str(a["id"]): (hit["_index"], hit["_id"]) for a, hit in zip(alerts, hits)}
+            done = set() if update else already_enriched(client, list(locations))
+            todo = [a for a in alerts if str(a["id"]) not in done]
+            progress.advance(len(alerts) - len(todo), skipped=True)
+            outputs = [o for o in executor.map(enrich, todo) if o is not None]
+            write_enriched_outputs(output_path, outputs)
+            if index_output and outputs:
+                push_bulk_to_elasticsearch(outputs, locations=locations)
+            enriched += len(outputs)
+            progress.advance(len(todo), len(todo))
+    if progress is not None:
+        progress.report()
+    log(f"Source complete: {enriched} alerts enriched", tag="\u2713")
+    return enriched
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrich alerts already stored in Elasticsearch/OpenSearch.")
+    parser.add_argument("index", nargs="?", default=ES_SOURCE_INDEX, help="Source index or pattern")
+    parser.add_argument("--since", help="Start of the time range (inclusive), e.g. 2026-09-01 or now-7d")
+    parser.add_argument("--until", help="End of the time range (exclusive)")
+    parser.add_argument("--min-level", type=int, help="Minimum rule level")
+    parser.add_argument("--query", help="Extra query DSL clause (JSON), ANDed with the filters above")
+    parser.add_argument("--time-field", default=ES_SOURCE_TIME_FIELD)
+    parser.add_argument("--page-size", type=int, default=ES_SOURCE_PAGE_SIZE)
+    parser.add_argument("--keep-alive", default=ES_SOURCE_KEEP_ALIVE)
+    parser.add_argument("--rate", type=float, default=ES_SOURCE_RATE, help="Max alerts/sec enriched (0 = unlimited)")
+    parser.add_argument("--workers", type=int, default=ES_SOURCE_WORKERS, help="Alerts enriched at once")
+    parser.add_argument("-o", "--output", default=ENRICHED_OUTPUT_PATH, help="Enriched output file (JSON lines)")
+    parser.add_argument("--no-index", action="store_true", help="Write the output file only, no Elasticsearch")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    query = build_query(args.since, args.until, args.min_level,
+                        codec.loads(args.query) if args.query else None, args.time_field)
+    run_es_source(
+        args.index,
+        query,
+        page_size=args.page_size,
+        keep_alive=args.keep_alive,
+        time_field=args.time_field,
+        rate=args.rate,
+        workers=args.workers,
+        output_path=args.output,
+        index_output=not args.no_index,
+        progress_interval=args.progress_interval,
+    )
+
+
+if __name__ == "__main__":
+    main()
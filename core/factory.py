@@ -2,20 +2,153 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-def get_llm_query_function():
-    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama")
-    print(f"[DEBUG] LLM_PROVIDER selected: {LLM_PROVIDER}")
-    if LLM_PROVIDER == "gemini":
+def get_provider_function(provider: str):
+    """
+    Returns the raw query function for a single LLM provider.
+
+    Args:
+        provider (str): One of "gemini", "ollama", "openai", "claude", "cassette".
+
+    Returns:
+        callable: ``fn(alert, model=None) -> EnrichedAlertOutput``, wrapped so token
+        usage, cost and in-flight count of every call (including failover and hedge calls)
+        are metered.
+
+    Raises:
+        ValueError: If the provider is not supported.
+    """
+    from core.cost import metered
+    from core.metrics import instrumented
+    if provider == "gemini":
         from providers.gemini import query_gemini
-        return query_gemini
-    elif LLM_PROVIDER == "ollama":
+        return metered(provider, instrumented(provider, query_gemini))
+    elif provider == "ollama":
         from providers.ollama import query_ollama
-        return query_ollama
-    elif LLM_PROVIDER == "openai":
+        return metered(provider, instrumented(provider, query_ollama))
+    elif provider == "openai":
         from providers.openai import query_openai
-        return query_openai
-    elif LLM_PROVIDER == "claude":
+        return metered(provider, instrumented(provider, query_openai))
+    elif provider == "claude":
         from providers.claude import query_claude
-        return query_claude
+        return metered(provider, instrumented(provider, query_claude))
+    elif provider == "cassette":
+        from config import CASSETTE_MODE
+        from providers.cassette import get_cassette_query
+        query = instrumented(provider, get_cassette_query())
+        # Record mode: the wrapped provider meters its real calls. Replay: recorded usage under "cassette"
+        return query if CASSETTE_MODE == "record" else metered(provider, query)
     else:
-        raise ValueError(f"Unsupported LLM provider: {LLM_PROVIDER}")
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+
+def parse_failover_chain(spec: str):
+    """
+    Parses a failover chain such as "claude,openai:gpt-4o-mini,ollama:llama3:8b".
+
+    Args:
+        spec (str): Comma-separated ``provider[:model]`` entries. The model part may itself
+            contain colons (Ollama tags).
+
+    Returns:
+        list: ``(provider, model_or_None)`` tuples in order.
+    """
+    chain = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, _, model = entry.partition(":")
+        chain.append((provider.strip(), model.strip() or None))
+    return chain
+
+def _guarded_query(providers, primary: str):
+    """Builds a FailoverQuery over ``providers`` with one shared circuit breaker per provider."""
+    from config import (
+        CB_FAILURE_RATE, CB_SLOW_CALL_MS, CB_SLOW_CALL_RATE, CB_WINDOW,
+        CB_MIN_CALLS, CB_OPEN_SECONDS, CB_HALF_OPEN_PROBES
+    )
+    from core.circuit_breaker import get_breaker
+    from core.failover import FailoverQuery
+    from core.logger import log
+    chain = []
+    for i, (name, model) in enumerate(providers):
+        try:
+            query = get_provider_function(name)
+        except Exception as e:
+            # A misconfigured fallback (e.g. missing API key) must not take down the primary
+            if i == 0:
+                raise
+            log(f"Skipping provider {name} in failover chain: {e}", tag="!")
+            continue
+        breaker = get_breaker(
+            name,
+            failure_rate_threshold=CB_FAILURE_RATE,
+            slow_call_ms=CB_SLOW_CALL_MS,
+            slow_call_rate_threshold=CB_SLOW_CALL_RATE,
+            window=CB_WINDOW,
+            min_calls=CB_MIN_CALLS,
+            open_seconds=CB_OPEN_SECONDS,
+            half_open_probes=CB_HALF_OPEN_PROBES,
+        )
+        chain.append((name, query, breaker, model))
+    return FailoverQuery(chain, primary)
+
+def get_llm_query_function():
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "ollama")
+    print(f"[DEBUG] LLM_PROVIDER selected: {LLM_PROVIDER}")
+
+    from config import LLM_FAILOVER_CHAIN, CIRCUIT_BREAKER_ENABLED, HEDGE_ENABLED
+    chain = parse_failover_chain(LLM_FAILOVER_CHAIN)
+    use_breakers = bool(chain) or CIRCUIT_BREAKER_ENABLED
+    if use_breakers:
+        chain = chain or [(LLM_PROVIDER, None)]
+        print(f"[DEBUG] Failover chain: {' -> '.join(name for name, _ in chain)}")
+        query = _guarded_query(chain, LLM_PROVIDER)
+    else:
+        query = get_provider_function(LLM_PROVIDER)
+
+    if HEDGE_ENABLED:
+        from config import (
+            HEDGE_PROVIDER, HEDGE_MODEL, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES,
+            HEDGE_MIN_DELAY_MS, HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST,
+            API_LLM_WORKERS, JOB_WORKERS, BACKFILL_WORKERS, ES_SOURCE_WORKERS
+        )
+        from core.hedging import HedgedQuery, HedgeBudget
+        hedge_provider = HEDGE_PROVIDER or LLM_PROVIDER
+        if hedge_provider == LLM_PROVIDER:
+            hedge = query
+        elif use_breakers:
+            hedge = _guarded_query([(hedge_provider, None)], hedge_provider)
+        else:
+            hedge = get_provider_function(hedge_provider)
+        print(f"[DEBUG] Hedging enabled: p{HEDGE_PERCENTILE:g} -> {hedge_provider}")
+        query = HedgedQuery(
+            query,
+            hedge,
+            hedge_model=HEDGE_MODEL or None,
+            percentile=HEDGE_PERCENTILE,
+            min_samples=HEDGE_MIN_SAMPLES,
+            min_delay_ms=HEDGE_MIN_DELAY_MS,
+            budget=HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST),
+            # As many workers as the process has concurrent callers, so primaries never queue
+            max_workers=max(API_LLM_WORKERS + JOB_WORKERS, BACKFILL_WORKERS, ES_SOURCE_WORKERS),
+        )
+
+    from config import SINGLEFLIGHT_ENABLED
+    if SINGLEFLIGHT_ENABLED:
+        from core.singleflight import SingleFlightQuery
+        query = SingleFlightQuery(query)
+
+    from config import KB_PATH
+    if KB_PATH:
+        from config import KB_MODE, KB_REFRESH_SECONDS, KB_REFRESH_WORKERS, KB_SAVE_REFRESHED
+        from core.knowledge_base import KnowledgeBaseQuery, load_knowledge_base
+        print(f"[DEBUG] Knowledge base fast path: {KB_PATH} ({KB_MODE})")
+        query = KnowledgeBaseQuery(
+            load_knowledge_base(KB_PATH),
+            query,
+            mode=KB_MODE,
+            refresh_after=KB_REFRESH_SECONDS,
+            workers=KB_REFRESH_WORKERS,
+            save_path=KB_PATH if KB_SAVE_REFRESHED else None,
+        )
+    return query
@@ -0,0 +1,62 @@
+"""
+Ordered provider failover for the LLM enrichment project.
+Tries each provider in the chain, skipping those whose circuit is open.
+"""
+# core/failover.py
+import time
+from typing import Callable, List, Optional, Tuple
+
+from core.circuit_breaker import CircuitBreaker
+from core.logger import log
+from core.utils import enrichment_failed
+
+
+class FailoverQuery:
+    """
+    Callable wrapper with the same signature as a provider query function.
+
+    Args:
+        chain (list): Ordered ``(name, query_fn, breaker, model)`` tuples. ``model`` is the
+            model pinned for that provider; None means "use the caller's model" for the
+            primary provider and the provider default for the others.
+        primary (str): Name of the provider the caller's ``model`` argument belongs to.
+
+    A provider with an open circuit is skipped without a request, so an outage costs no
+    timeout. Input validation errors (ValueError) are re-raised immediately: they are not
+    provider failures and would fail identically on every provider.
+    """
+
+    def __init__(self, chain: List[Tuple[str, Callable, CircuitBreaker, Optional[str]]], primary: str):
+        self.chain = chain
+        self.primary = primary
+
+    def __call__(self, alert: dict, model: Optional[str] = None):
+        last_result = None
+        last_error = None
+        for name, query, breaker, pinned_model in self.chain:
+            if not breaker.allow():
+                log(f"Circuit open for {name}; skipping", tag="d")
+                continue
+            call_model = pinned_model or (model if name == self.primary else None)
+            start = time.time()
+            try:
+                result = query(alert, model=call_model)
+            except ValueError:
+                breaker.record(False, time.time() - start)
+                raise
+            except Exception as e:
+                breaker.record(True, time.time() - start)
+                log(f"Provider {name} raised: {e}", tag="!")
+                last_error = e
+                continue
+            failed = enrichment_failed(result)
+            breaker.record(failed, time.time() - start)
+            if not failed:
+                return result
+            log(f"Provider {name} returned a fallback enrichment; failing over", tag="!")
+            last_result = result
+        if last_result is not None:
+            return last_result
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError("No LLM provider available: all circuits are open")
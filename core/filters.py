@@ -0,0 +1,253 @@
+"""
+Pre-enrichment filter engine for the LLM enrichment project.
+Routes each alert to skip, YARA-only or LLM enrichment from a declarative rule list,
+with indexed matching so the cost per alert does not grow with the number of rules.
+"""
+# core/filters.py
+import bisect
+import json
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from config import FILTER_RULES_PATH, FILTER_DEFAULT_ACTION
+from core.logger import log
+from schemas.input_schema import WazuhAlertInput
+from schemas.output_schema import Enrichment, EnrichedAlertOutput
+
+SKIP = "skip"
+YARA_ONLY = "yara_only"
+ENRICH = "enrich"
+ACTIONS = (SKIP, YARA_ONLY, ENRICH)
+
+# Rule keys that are lists of exact values (a string is taken as a one-item list)
+_SET_CONDITIONS = ("rule_id", "groups", "agent", "decoder")
+
+
+class Decision(NamedTuple):
+    action: str
+    rule: str  # Name of the matching filter rule, or "default"
+
+
+class FilterEngine:
+    """
+    First-match-wins router over a list of filter rules.
+
+    Each rule has a ``name``, an ``action`` (skip, yara_only, enrich) and any of these
+    conditions, all of which must hold (a list matches if any value does):
+
+    - ``rule_id``: Wazuh rule IDs.
+    - ``level``: ``{"min": n, "max": m}`` (inclusive, either bound optional).
+    - ``groups``: rule groups; matches if the alert is in any of them.
+    - ``agent``: agent names or IDs.
+    - ``decoder``: decoder names.
+    - ``full_log``: regular expression searched in ``full_log``.
+
+    Matching is indexed: each condition maps alert values to a bitset of the rules it
+    satisfies (hash tables for IDs, groups, agents and decoders, an interval table for
+    levels), rules without that condition are wildcards, and the first rule is the lowest
+    bit of the AND. ``full_log`` patterns are gated by one combined regex, so
+    individual patterns only run when some pattern can match. Patterns that cannot be
+    combined safely (capture groups, which backreferences and group names depend on, or
+    global inline flags) are left out of the gate and always searched on their own.
+
+    Args:
+        rules (list): Filter rule dicts, in priority order.
+        default_action (str): Action when no rule matches.
+
+    Raises:
+        ValueError: If a rule has an unknown action or condition, or an invalid regex.
+    """
+
+    def __init__(self, rules: List[dict], default_action: str = ENRICH):
+        if default_action not in ACTIONS:
+            raise ValueError(f"Unknown filter default action: {default_action}")
+        self.default = Decision(default_action, "default")
+        self.decisions = []
+        all_rules = (1 << len(rules)) - 1
+        self._index: Dict[str, Dict[str, int]] = {key: {} for key in _SET_CONDITIONS}
+        self._wildcard = {key: all_rules for key in _SET_CONDITIONS + ("level", "full_log")}
+        level_ranges = []
+        patterns = {}
+        for i, rule in enumerate(rules):
+            bit = 1 << i
+            name = str(rule.get("name") or f"rule-{i}")
+            action = rule.get("action", ENRICH)
+            if action not in ACTIONS:
+                raise ValueError(f"Filter rule {name}: unknown action {action!r}")
+            unknown = set(rule) - set(_SET_CONDITIONS) - {"name", "action", "level", "full_log"}
+            if unknown:
+                raise ValueError(f"Filter rule {name}: unknown conditions {sorted(unknown)}")
+            self.decisions.append(Decision(action, name))
+            for key in _SET_CONDITIONS:
+                if key not in rule:
+                    continue
+                values = rule[key] if isinstance(rule[key], list) else [rule[key]]
+                self._wildcard[key] &= ~bit
+                for value in values:
+                    self._index[key][str(value)] = self._index[key].get(str(value), 0) | bit
+            if "level" in rule:
+                bounds = rule["level"]
+                self._wildcard["level"] &= ~bit
+                level_ranges.append((bounds.get("min", float("-inf")), bounds.get("max", float("inf")), bit))
+            if "full_log" in rule:
+                try:
+                    patterns[bit] = re.compile(rule["full_log"])
+                except re.error as e:
+                    raise ValueError(f"Filter rule {name}: invalid full_log regex: {e}")
+                self._wildcard["full_log"] &= ~bit
+        self._build_level_table(level_ranges)
+        self._all = all_rules
+        self._conditioned = {key: all_rules & ~bits for key, bits in self._wildcard.items()}
+        self._patterns = patterns
+        self._build_gate(patterns)
+
+    def _build_gate(self, patterns: Dict[int, "re.Pattern"]):
+        """Combines the patterns that keep their meaning inside one alternation into ``_gate``."""
+        plain_flags = re.compile("").flags
+        gated = {bit: p for bit, p in patterns.items() if p.groups == 0 and p.flags == plain_flags}
+        self._gate = None
+        self._gated = 0  # Rules whose pattern is in the gate
+        if gated:
+            try:
+                self._gate = re.compile("|".join(f"(?:{p.pattern})" for p in gated.values()))
+            except re.error as e:
+                log(f"full_log patterns could not be combined ({e}); searching each on its own", tag="!")
+                return
+            for bit in gated:
+                self._gated |= bit
+
+    def _build_level_table(self, ranges):
+        """Splits the level axis at every range bound; each segment gets the bitset of ranges covering it."""
+        edges = sorted({lo for lo, _, _ in ranges} | {hi + 1 for _, hi, _ in ranges if hi != float("inf")})
+        self._level_edges = edges
+        self._level_bits = []
+        for j in range(len(edges) + 1):
+            probe = edges[j - 1] if j else (edges[0] - 1 if edges else 0)
+            bits = 0
+            for lo, hi, bit in ranges:
+                if lo <= probe <= hi:
+                    bits |= bit
+            self._level_bits.append(bits)
+
+    def _bits(self, key: str, values) -> int:
+        index = self._index[key]
+        bits = self._wildcard[key]
+        for value in values:
+            if value is not None:
+                bits |= index.get(str(value), 0)
+        return bits
+
+    def route(self, alert: WazuhAlertInput) -> Decision:
+        """Returns the decision of the first matching rule, or the default."""
+        if not self.decisions:
+            return self.default
+        rule = alert.rule
+        candidates = self._bits("rule_id", (rule.id,))
+        if candidates:
+            candidates &= self._bits("groups", rule.groups or ())
+        if candidates:
+            candidates &= self._bits("agent", (alert.agent.name, alert.agent.id) if alert.agent else ())
+        if candidates:
+            candidates &= self._bits("decoder", (alert.decoder.name,) if alert.decoder else ())
+        if candidates:
+            candidates &= self._level_candidates(rule.level)
+        gate_open = None
+        while candidates:
+            bit = candidates & -candidates
+            pattern = self._patterns.get(bit)
+            if pattern is None:
+                return self.decisions[bit.bit_length() - 1]
+            if bit & self._gated:
+                if gate_open is None:
+                    gate_open = bool(alert.full_log) and self._gate.search(alert.full_log) is not None
+                matched = gate_open and pattern.search(alert.full_log)
+            else:
+                matched = bool(alert.full_log) and pattern.search(alert.full_log)
+            if matched:
+                return self.decisions[bit.bit_length() - 1]
+            candidates &= ~bit
+        return self.default
+
+    def _level_candidates(self, level: int) -> int:
+        return self._wildcard["level"] | self._level_bits[bisect.bisect_right(self._level_edges, level)]
+
+    def prefilter(self, rule_id: Optional[str], level: Optional[int]) -> Optional[Decision]:
+        """
+        Decides from the rule ID and level alone, for alerts that are not parsed yet.
+
+        Returns:
+            Decision: The same decision ``route`` would make, or None if a rule that
+            depends on other fields (or on an unknown ID/level) could come first.
+        """
+        if not self.decisions:
+            return self.default
+        undecided = 0
+        for key in ("groups", "agent", "decoder", "full_log"):
+            undecided |= self._conditioned[key]
+        candidates = self._all
+        if rule_id is None:
+            undecided |= self._conditioned["rule_id"]
+        else:
+            candidates &= self._bits("rule_id", (rule_id,))
+        if level is None:
+            undecided |= self._conditioned["level"]
+        else:
+            candidates &= self._level_candidates(level)
+        if not candidates:
+            return self.default
+        first = candidates & -candidates
+        if first & undecided:
+            return None
+        return self.decisions[first.bit_length() - 1]
+
+
+def load_filter_engine(path: str = FILTER_RULES_PATH) -> FilterEngine:
+    """
+    Builds a FilterEngine from a JSON file holding a list of filter rules.
+    With no path configured every alert gets FILTER_DEFAULT_ACTION.
+    """
+    rules = []
+    if path:
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+        log(f"Loaded {len(rules)} filter rules from {path}", tag="i")
+    return FilterEngine(rules, FILTER_DEFAULT_ACTION)
+
+
+_engine: Optional[FilterEngine] = None
+
+
+def get_filter_engine() -> FilterEngine:
+    """Returns the process-wide filter engine, loading it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = load_filter_engine()
+    return _engine
+
+
+def filtered_output(alert: WazuhAlertInput, decision: Decision, yara_matches: Optional[list] = None) -> EnrichedAlertOutput:
+    """
+    Output for an alert the filter kept away from the LLM: no summary or scores,
+    ``enriched_by`` naming the filter rule, and the YARA matches for yara_only.
+    """
+    enrichment = Enrichment.model_construct(
+        summary_text=None,
+        tags=[],
+        risk_score=None,
+        false_positive_likelihood=None,
+        alert_category=None,
+        remediation_steps=[],
+        related_cves=[],
+        external_refs=[],
+        llm_model_version=None,
+        enriched_by=f"filter:{decision.rule}",
+        enrichment_duration_ms=0,
+        yara_matches=yara_matches or [],
+    )
+    return EnrichedAlertOutput.model_construct(
+        alert_id=alert.id,
+        timestamp=datetime.now(timezone.utc),
+        alert=alert,
+        enrichment=enrichment
+    )
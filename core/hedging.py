@@ -0,0 +1,179 @@
+"""
+Hedged LLM requests for tail-latency control.
+If the primary provider call has not returned by a percentile of recent latency,
+a second (hedge) request is fired and the first valid result wins.
+"""
+# core/hedging.py
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+
+from core.logger import log
+from core.utils import enrichment_failed
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """
+        Returns the given percentile (0-100) of recorded latencies, or None if empty.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        idx = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+        return samples[idx]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._samples)
+
+
+class HedgeBudget:
+    """
+    Token bucket that bounds hedges to a fraction of primary requests.
+
+    Every primary request deposits ``ratio`` tokens (capped at ``burst``); a hedge
+    spends one token. Over time hedges cannot exceed ``ratio`` x requests.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class HedgedQuery:
+    """
+    Callable wrapper with the same signature as a provider query function.
+
+    Args:
+        primary (callable): Provider query function, ``fn(alert, model=None)``.
+        hedge (callable): Query function used for the hedge (same or alternate provider).
+        hedge_model (str, optional): Model for the hedge call. None reuses the primary
+            model when hedging to the same provider, else the hedge provider's default.
+        percentile (float): Latency percentile (0-100) after which the hedge fires.
+        min_samples (int): Samples needed before hedging starts (no hedges while warming up).
+        min_delay_ms (int): Lower bound on the hedge delay.
+        budget (HedgeBudget): Shared budget limiting how many hedges are issued.
+        max_workers (int): Size of each thread pool (primary and hedge calls). Set it to
+            the most concurrent callers the process has, so primaries do not queue.
+
+    Provider calls are blocking HTTP requests, so the losing call cannot be interrupted
+    mid-flight: it is cancelled if it has not started yet, otherwise its result is discarded.
+    The hedge delay counts from when the primary call starts on a worker, so time spent
+    waiting for a free worker never triggers a hedge.
+    """
+
+    def __init__(
+        self,
+        primary: Callable,
+        hedge: Callable,
+        hedge_model: Optional[str] = None,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        min_delay_ms: int = 500,
+        budget: Optional[HedgeBudget] = None,
+        window: int = 200,
+        max_workers: int = 32,
+    ):
+        self.primary = primary
+        self.hedge = hedge
+        self.hedge_model = hedge_model
+        self.same_provider = hedge is primary
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay_ms / 1000.0
+        self.budget = budget or HedgeBudget()
+        self.tracker = LatencyTracker(window)
+        self.hedges_issued = 0
+        self.hedges_won = 0
+        self._counts_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-primary")
+        # Hedges get their own pool, so a burst of them never delays primary calls
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None if there is not enough history yet."""
+        if len(self.tracker) < self.min_samples:
+            return None
+        p = self.tracker.percentile(self.percentile)
+        return max(self.min_delay, p) if p is not None else None
+
+    def _timed(self, fn: Callable, alert: dict, model: Optional[str], started: Optional[threading.Event] = None):
+        if started is not None:
+            started.set()
+        start = time.time()
+        result = fn(alert, model=model)
+        if not enrichment_failed(result):
+            self.tracker.record(time.time() - start)
+        return result
+
+    def __call__(self, alert: dict, model: Optional[str] = None):
+        self.budget.deposit()
+        delay = self.hedge_delay()
+        # Copy the context so trace spans from pool threads land in the caller's trace
+        started = threading.Event()
+        primary = self._executor.submit(contextvars.copy_context().run, self._timed, self.primary, alert, model, started)
+        if delay is None:
+            return primary.result()
+
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.try_spend():
+            return primary.result()
+
+        hedge_model = self.hedge_model or (model if self.same_provider else None)
+        log(f"Primary LLM call exceeded p{self.percentile:g} ({delay:.2f}s); issuing hedge request", tag="i")
+        hedge = self._hedge_executor.submit(contextvars.copy_context().run, self._timed, self.hedge, alert, hedge_model)
+        with self._counts_lock:
+            self.hedges_issued += 1
+
+        pending = {primary, hedge}
+        first_result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    log(f"{'Hedge' if fut is hedge else 'Primary'} LLM call raised: {e}", tag="!")
+                    continue
+                if not enrichment_failed(result):
+                    for loser in pending:
+                        loser.cancel()
+                    if fut is hedge:
+                        with self._counts_lock:
+                            self.hedges_won += 1
+                    return result
+                if first_result is None or fut is primary:
+                    first_result = result
+        if first_result is None:
+            # Both calls raised; surface the primary's exception to the caller.
+            return primary.result()
+        return first_result
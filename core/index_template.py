@@ -0,0 +1,209 @@
+"""
+Managed index template for the enriched alert index.
+Maps the schema fields explicitly and keeps free-form objects (``alert.data``, YARA match
+``meta``) out of the field mapping, so new decoders do not add fields to the index.
+
+Print or apply the template by hand:
+    python -m core.index_template --print
+    python -m core.index_template
+"""
+# core/index_template.py
+import argparse
+from typing import Optional
+
+import requests
+
+from config import (
+    ENRICHED_INDEX,
+    ES_MANAGE_TEMPLATE,
+    ES_DATA_MAPPING,
+    ES_INDEX_SHARDS,
+    ES_INDEX_REPLICAS,
+    ES_INDEX_REFRESH_INTERVAL,
+    ES_INDEX_FIELD_LIMIT,
+    ES_ROLLOVER,
+    ES_ILM_POLICY
+)
+from core import codec
+from core.es_client import SearchClient
+from core.logger import log
+
+KEYWORD = {"type": "keyword", "ignore_above": 1024}
+TEXT = {"type": "text"}
+TEXT_KEYWORD = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+STORED_ONLY = {"type": "text", "index": False}
+DATE = {"type": "date", "format": "strict_date_optional_time||date_optional_time||epoch_millis"}
+
+
+def _free_form(opensearch: bool, mode: str) -> dict:
+    """Mapping for an arbitrary object: one field however many keys it has, or not indexed."""
+    if mode == "disabled":
+        return {"type": "object", "enabled": False}
+    if mode != "flattened":
+        raise ValueError(f"Unsupported ES_DATA_MAPPING: {mode}")
+    return {"type": "flat_object"} if opensearch else {"type": "flattened"}
+
+
+def _keywords(*names) -> dict:
+    return {name: KEYWORD for name in names}
+
+
+def enriched_mappings(opensearch: bool = False, data_mapping: str = ES_DATA_MAPPING) -> dict:
+    """Mappings for EnrichedAlertOutput documents."""
+    free_form = _free_form(opensearch, data_mapping)
+    return {
+        "dynamic_templates": [
+            # Unmapped alert strings (syscheck, previous_output, ...): one keyword, no text twin
+            {"strings_as_keywords": {"match_mapping_type": "string", "mapping": KEYWORD}},
+        ],
+        "properties": {
+            "alert_id": KEYWORD,
+            "timestamp": DATE,
+            "alert": {
+                "properties": {
+                    "id": KEYWORD,
+                    "timestamp": DATE,
+                    "rule": {
+                        "properties": {
+                            "id": KEYWORD,
+                            "level": {"type": "integer"},
+                            "description": TEXT_KEYWORD,
+                            "firedtimes": {"type": "integer"},
+                            "mail": {"type": "boolean"},
+                            "mitre": {"properties": _keywords("id", "tactic", "technique")},
+                            **_keywords("groups", "pci_dss", "gpg13", "gdpr", "hipaa", "nist_800_53", "tsc"),
+                        }
+                    },
+                    "agent": {"properties": _keywords("id", "name", "ip")},
+                    "manager": {"properties": _keywords("name")},
+                    "decoder": {"properties": _keywords("name", "parent", "ftscomment")},
+                    "predecoder": {"properties": _keywords("program_name", "timestamp", "hostname")},
+                    "full_log": TEXT,
+                    "location": KEYWORD,
+                    "input": {"properties": _keywords("type")},
+                    "data": free_form,
+                }
+            },
+            "enrichment": {
+                "properties": {
+                    "summary_text": TEXT,
+                    "remediation_steps": TEXT,
+                    "error": TEXT,
+                    "raw_llm_response": STORED_ONLY,
+                    "risk_score": {"type": "integer"},
+                    "false_positive_likelihood": {"type": "float"},
+                    "enrichment_duration_ms": {"type": "long"},
+                    "input_tokens": {"type": "integer"},
+                    "output_tokens": {"type": "integer"},
+                    "estimated_cost_usd": {"type": "float"},
+                    "yara_matches": {"properties": {"rule": KEYWORD, "tags": KEYWORD, "meta": free_form}},
+                    **_keywords("tags", "alert_category", "related_cves", "external_refs",
+                                "llm_model_version", "enriched_by"),
+                }
+            },
+        },
+    }
+
+
+def index_template(opensearch: bool = False, index: str = ENRICHED_INDEX, rollover: bool = ES_ROLLOVER,
+                   ilm_policy: str = ES_ILM_POLICY) -> dict:
+    """
+    Composable index template (``PUT _index_template/<index>``) for ``index`` and, with
+    rollover, its ``<index>-000001``... backing indices.
+    """
+    settings = {
+        "number_of_shards": ES_INDEX_SHARDS,
+        "number_of_replicas": ES_INDEX_REPLICAS,
+        "refresh_interval": ES_INDEX_REFRESH_INTERVAL,
+        "mapping.total_fields.limit": ES_INDEX_FIELD_LIMIT,
+    }
+    if rollover:
+        if opensearch:
+            settings["plugins.index_state_management.rollover_alias"] = index
+        elif ilm_policy:
+            settings["lifecycle.name"] = ilm_policy
+            settings["lifecycle.rollover_alias"] = index
+    return {
+        "index_patterns": [f"{index}-*" if rollover else index],
+        "priority": 200,
+        "template": {"settings": {"index": settings}, "mappings": enriched_mappings(opensearch)},
+        "_meta": {"managed_by": "llm-alert-enrichment"},
+    }
+
+
+def install_index_template(client: Optional[SearchClient] = None, index: str = ENRICHED_INDEX,
+                           rollover: bool = ES_ROLLOVER) -> None:
+    """
+    Puts the index template and, with rollover, creates ``<index>-000001`` with ``index``
+    as its write alias unless the alias already exists.
+
+    Raises:
+        requests.exceptions.RequestException: If the cluster rejects a request.
+    """
+    client = client or SearchClient()
+    client.request("PUT", f"/_index_template/{index}", index_template(client.opensearch, index, rollover))
+    log(f"Index template {index} installed", tag="i")
+    if not rollover:
+        return
+    if client.exists(f"/_alias/{index}"):
+        return
+    if client.exists(f"/{index}"):
+        log(f"{index} is a concrete index; reindex it before switching to a rollover alias", tag="!")
+        return
+    client.request("PUT", f"/{index}-000001", {"aliases": {index: {"is_write_index": True}}})
+    log(f"Created {index}-000001 with write alias {index}", tag="i")
+
+
+_client: Optional[SearchClient] = None
+_mapped_alert_indices = set()
+
+
+def ensure_enrichment_mapping(index: str) -> None:
+    """
+    Adds the bounded ``enrichment`` mapping to an original alert index once per process,
+    before partial updates (ES_OUTPUT_MODE=update) write enrichments into it. Wazuh's
+    own template for the alert indices is left alone.
+    """
+    global _client
+    if not ES_MANAGE_TEMPLATE or index in _mapped_alert_indices:
+        return
+    _mapped_alert_indices.add(index)
+    try:
+        _client = _client or SearchClient()
+        enrichment = enriched_mappings(_client.opensearch)["properties"]["enrichment"]
+        _client.request("PUT", f"/{index}/_mapping", {"properties": {"enrichment": enrichment}})
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log(f"Could not add the enrichment mapping to {index}: {e}", tag="!")
+
+
+_installed = False
+
+
+def ensure_index_template() -> None:
+    """
+    Installs the template once per process when ES_MANAGE_TEMPLATE is on. A failure is
+    logged, not raised, so enrichment still runs while the cluster is unreachable.
+    """
+    global _installed
+    if _installed or not ES_MANAGE_TEMPLATE:
+        return
+    try:
+        install_index_template()
+        _installed = True
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log(f"Could not install the index template for {ENRICHED_INDEX}: {e}", tag="!")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Install the enriched index template.")
+    parser.add_argument("--print", action="store_true", help="Print the template instead of installing it")
+    parser.add_argument("--opensearch", action="store_true", help="With --print: OpenSearch field types")
+    args = parser.parse_args(argv)
+    if args.print:
+        print(codec.dumps(index_template(args.opensearch), indent=True))
+    else:
+        install_index_template()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Raw-bytes ingest for the alert log tailer.
+Block-reads alerts.json without decoding, and pulls a few keys (alert id, rule id, rule
+level) with a byte scanner so duplicates and filtered alerts can be dropped before the
+line is parsed as JSON.
+"""
+# core/ingest.py
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+from core import codec
+
+
+class Peek(NamedTuple):
+    alert_id: Optional[str]
+    rule_id: Optional[str]
+    level: Optional[int]
+
+
+_NOTHING = Peek(None, None, None)
+_LEVEL = re.compile(rb'"?(-?\d+)"?\s*[,}]')
+
+
+def _string_at(line: bytes, pos: int) -> Optional[str]:
+    """The JSON string value whose content starts at ``pos``, if it has no escapes."""
+    end = line.find(b'"', pos)
+    if end == -1:
+        return None
+    value = line[pos:end]
+    if b"\\" in value:
+        return None
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def _key_in(zone: bytes, key: bytes) -> int:
+    """Offset just past ``key`` in ``zone`` if it occurs outside a string, else -1."""
+    k = zone.find(key)
+    if k == -1 or zone.count(b'"', 0, k) % 2:
+        return -1
+    return k + len(key)
+
+
+def peek_alert(line: bytes) -> Peek:
+    """
+    Extracts the top-level ``id``, ``rule.id`` and ``rule.level`` from one alert line
+    without parsing it, relying on Wazuh's key order (timestamp, rule, ..., id).
+
+    Values are only taken where their nesting is certain from brace and quote counts:
+    ``rule.level``/``rule.id`` before the first brace inside the rule, and the alert id
+    where the object depth outside strings is back to 1. A backslash, unexpected brace
+    or other layout makes the affected values None, so the caller parses the line.
+    """
+    r = line.find(b'"rule":{')
+    if r == -1:
+        return _NOTHING
+    prefix = line[:r]
+    if prefix.count(b"{") != 1 or b"}" in prefix or b"\\" in prefix or prefix.count(b'"') % 2:
+        return _NOTHING
+
+    # Rule keys up to the first brace (nested object, end of rule, or a brace in a string)
+    body = r + 8
+    zone_end = len(line)
+    for brace in (b"{", b"}"):
+        i = line.find(brace, body, zone_end)
+        if i != -1:
+            zone_end = i
+    zone = line[body:zone_end]
+    if b"\\" in zone:
+        return _NOTHING
+    level = rule_id = alert_id = None
+    k = _key_in(zone, b'"level":')
+    if k != -1:
+        m = _LEVEL.match(zone, k) or _LEVEL.match(line, body + k)
+        level = int(m.group(1)) if m else None
+    k = _key_in(zone, b'"id":"')
+    if k != -1:
+        rule_id = _string_at(line, body + k)
+
+    # Alert id: the first '},"id":"' where the depth outside strings drops back to 1
+    in_string = zone.count(b'"') % 2 == 1
+    depth, pos = 2, zone_end
+    while True:
+        cand = line.find(b'},"id":"', pos)
+        if cand == -1:
+            break
+        segment = line[pos:cand + 1]
+        if b"\\" in segment:
+            break
+        parts = segment.split(b'"')
+        outside = b"".join(parts[1::2] if in_string else parts[0::2])
+        depth += outside.count(b"{") - outside.count(b"}")
+        if len(parts) % 2 == 0:
+            in_string = not in_string
+        if depth == 1 and not in_string:
+            alert_id = _string_at(line, cand + 8)
+            break
+        pos = cand + 1
+    if alert_id is None and rule_id is None and level is None:
+        return _NOTHING
+    return Peek(alert_id, rule_id, level)
+
+
+def parse_line(line: bytes) -> dict:
+    """Parses one alert line; invalid UTF-8 is dropped as the text reader used to do."""
+    try:
+        return codec.loads(line)
+    except (ValueError, UnicodeDecodeError):
+        return codec.loads(line.decode("utf-8", errors="ignore"))
+
+
+class BlockReader:
+    """
+    Reads complete lines from a growing file in large raw blocks.
+
+    Each ``read_lines`` call returns the whole lines available (stripped, non-empty,
+    starting with ``{``); a trailing partial line is kept until its newline arrives.
+
+    Args:
+        path (str): File to read.
+        block_size (int): Bytes per read.
+    """
+
+    def __init__(self, path: str, block_size: int = 1 << 20):
+        self.path = path
+        self.block_size = block_size
+        self._fd = os.open(path, os.O_RDONLY)
+        self._pending = b""
+
+    def seek(self, offset: int):
+        """Continues from ``offset``; ignored past the end of the file (truncated since)."""
+        if offset <= os.fstat(self._fd).st_size:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            self._pending = b""
+
+    def read_lines(self) -> List[bytes]:
+        chunks = []
+        while True:
+            block = os.read(self._fd, self.block_size)
+            if not block:
+                break
+            chunks.append(block)
+            if len(block) < self.block_size:
+                break
+        if not chunks:
+            return []
+        data = self._pending + b"".join(chunks)
+        cut = data.rfind(b"\n") + 1
+        self._pending = data[cut:]
+        return [line for line in (raw.strip() for raw in data[:cut].split(b"\n")) if line.startswith(b"{")]
+
+    def inode(self) -> int:
+        return os.fstat(self._fd).st_ino
+
+    def position(self) -> int:
+        """Offset just past the last complete line returned."""
+        return os.lseek(self._fd, 0, os.SEEK_CUR) - len(self._pending)
+
+    def lag(self) -> int:
+        """Bytes between the last complete line returned and the end of the file."""
+        return max(0, os.fstat(self._fd).st_size - os.lseek(self._fd, 0, os.SEEK_CUR) + len(self._pending))
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
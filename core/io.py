@@ -31,9 +31,14 @@ def get_elasticsearch_client():
 I/O utilities for the LLM enrichment project.
 Handles reading alert logs, writing enriched output, and pushing to Elasticsearch.
 """
-import json
 import requests
+from urllib.parse import quote
+from core import codec
 from core.logger import log
+from core.metrics import time_stage, DLQ_WRITES
+from core.tracing import span
+from schemas.input_schema import RESERVED_FIELDS, as_alert
+from schemas.output_schema import EnrichedAlertOutput
 
 def read_alert_log(path):
     """
@@ -53,88 +58,292 @@ def write_enriched_output(path, data):
 
     Args:
         path (str): Path to the output file.
-        data (dict): Enriched alert data to write.
+        data (EnrichedAlertOutput or dict): Enriched alert data to write.
     """
     try:
-        with open(path, "a") as f:
-            f.write(json.dumps(data) + "\n")
-        log(f"Wrote enriched alert {data['alert_id']} to file", tag="\u2192")
+        with time_stage("file_write"), open(path, "a") as f:
+            f.write(codec.dumps(data) + "\n")
+        log(f"Wrote enriched alert {_doc_alert_id(data)} to file", tag="\u2192")
     except Exception as e:
         log(f"Failed to write to {path}: {e}", tag="!")
 
-def push_to_elasticsearch(doc):
+def write_enriched_outputs(path, docs, raise_errors=False):
     """
-    Pushes an enriched alert document to Elasticsearch.
+    Appends a batch of enriched alerts to the output file with a single write.
 
     Args:
-        doc (dict): The enriched alert document to push.
+        path (str): Path to the output file.
+        docs (list): EnrichedAlertOutput objects or dicts.
+        raise_errors (bool): Re-raise a failed write (after logging it) instead of
+            only logging it, for callers that must not record the batch as done.
     """
-    from config import ELASTICSEARCH_URL, ELASTIC_USER, ELASTIC_PASS, ENRICHED_INDEX
+    if not docs:
+        return
+    try:
+        with time_stage("file_write"), open(path, "ab") as f:
+            f.write(b"".join(codec.dumps_bytes(doc) + b"\n" for doc in docs))
+        log(f"Wrote {len(docs)} enriched alerts to file", tag="\u2192")
+    except Exception as e:
+        log(f"Failed to write to {path}: {e}", tag="!")
+        if raise_errors:
+            raise
+
+def push_bulk_to_elasticsearch(docs, batch_size=None, locations=None, raise_errors=False):
+    """
+    Indexes enriched alert documents through the ``_bulk`` API, ``batch_size`` per request.
 
-    import datetime
-    def json_serial(obj):
-        if isinstance(obj, datetime.datetime):
-            return obj.isoformat()
-        raise TypeError(f"Type {type(obj)} not serializable")
+    Documents are checked and keyed as in ``push_to_elasticsearch``. With
+    ES_OUTPUT_MODE=update, only each document's ``enrichment`` is sent, as a partial
+    update of the original alert document (see ``_update_items``). A request is retried
+    on transport errors; documents the cluster still rejects are dead-lettered.
+
+    Args:
+        docs (list): EnrichedAlertOutput objects or dicts.
+        batch_size (int): Documents per ``_bulk`` request (default ES_BULK_BATCH_SIZE).
+        locations (dict): Update mode: ``{alert_id: (index, _id)}`` of original alert
+            documents already known (e.g. from a search); others are looked up.
+        raise_errors (bool): For callers that retry and dead-letter on their own (the
+            output sinks): each request is tried once, a transport error is raised and
+            rejected documents are returned instead of dead-lettered.
+
+    Returns:
+        list: With ``raise_errors``, the documents the cluster rejected; else empty.
+    """
+    from config import ES_BULK_BATCH_SIZE, ES_OUTPUT_MODE
+    batch_size = batch_size or ES_BULK_BATCH_SIZE
+    rejected = []
+    with time_stage("es_push"):
+        checked = []
+        for doc in docs:
+            if not isinstance(doc, EnrichedAlertOutput):
+                doc = _validate_document(doc)
+                if doc is None:
+                    continue
+            checked.append(doc)
+        for i in range(0, len(checked), batch_size):
+            batch = checked[i:i + batch_size]
+            if ES_OUTPUT_MODE == "update":
+                items = _update_items(batch, locations or {})
+            else:
+                items = [_index_item(doc) for doc in batch]
+            rejected.extend(batch[j] for j in _push_bulk(items, raise_errors))
+    return rejected
+
+def _index_item(doc):
+    """``(action, source, dead-letter line)`` indexing a full copy into ENRICHED_INDEX."""
+    from config import ENRICHED_INDEX
+    body = codec.dumps_bytes(doc)
+    doc_id = _doc_id(doc)
+    action = {"index": {"_index": ENRICHED_INDEX, **({"_id": doc_id} if doc_id else {})}}
+    return codec.dumps_bytes(action), body, body
+
+def _update_items(docs, locations):
+    """
+    Partial ``update`` items adding ``enrichment`` to each original alert document.
+
+    Alerts without a known location are looked up by ``id`` in ES_ALERTS_INDEX with one
+    search; alerts that are not indexed (yet) are written as full copies instead.
+    """
+    from core.index_template import ensure_enrichment_mapping
+    ids = [str(_doc_alert_id(doc)) for doc in docs]
+    missing = [alert_id for alert_id in ids if alert_id not in locations]
+    if missing:
+        locations = {**locations, **_locate_alerts(missing)}
+    items = []
+    copies = 0
+    for alert_id, doc in zip(ids, docs):
+        location = locations.get(alert_id)
+        if location is None:
+            copies += 1
+            items.append(_index_item(doc))
+            continue
+        ensure_enrichment_mapping(location[0])
+        enrichment = doc.enrichment if isinstance(doc, EnrichedAlertOutput) else doc.get("enrichment")
+        action = codec.dumps_bytes({"update": {"_index": location[0], "_id": location[1]}})
+        items.append((action, codec.dumps_bytes({"doc": {"enrichment": enrichment}}), codec.dumps_bytes(doc)))
+    if copies:
+        log(f"{copies} alerts not found in the alert indices; indexed as full copies", tag="!")
+    return items
+
+def _locate_alerts(alert_ids):
+    """``{alert_id: (index, _id)}`` for the alert documents found in ES_ALERTS_INDEX."""
+    from config import ELASTICSEARCH_URL, ELASTIC_USER, ELASTIC_PASS, ES_ALERTS_INDEX
+    body = {"size": len(alert_ids), "_source": ["id"], "query": {"terms": {"id": alert_ids}}}
+    try:
+        response = requests.post(
+            f"{ELASTICSEARCH_URL}/{ES_ALERTS_INDEX}/_search",
+            data=codec.dumps_bytes(body),
+            headers={"Content-Type": "application/json"},
+            auth=(ELASTIC_USER, ELASTIC_PASS),
+            verify=False
+        )
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        log(f"Alert lookup in {ES_ALERTS_INDEX} failed: {e}", tag="!")
+        return {}
+    found = {}
+    for hit in codec.loads(response.content)["hits"]["hits"]:
+        found.setdefault(str(hit["_source"].get("id")), (hit["_index"], hit["_id"]))
+    return found
+
+def _push_bulk(items, raise_errors=False):
+    """
+    Sends ``(action, body, dead-letter line)`` items in one ``_bulk`` request, with up to
+    three attempts; items still not indexed are dead-lettered. With ``raise_errors``,
+    one attempt is made, a transport error is raised and the positions of rejected items
+    are returned instead.
+    """
+    from config import ELASTICSEARCH_URL, ELASTIC_USER, ELASTIC_PASS
 
     import time
-    import re
+    payload = b"".join(action + b"\n" + body + b"\n" for action, body, _ in items)
     start_time = time.time()
-    max_retries = 3
-    attempt = 0
-    success = False
-    # --- Bulletproof schema validation with Pydantic ---
-    from core.wazuh_alert_schema import WazuhAlert
-    if "alert" not in doc:
-        doc = {"alert": doc}
-    reserved = ["_index", "_id", "_version", "_score", "_source", "fields", "sort", "highlight"]
-    for field in reserved:
-        if field in doc["alert"]:
-            del doc["alert"][field]
-    # Validate with Pydantic model
-    try:
-        validated_alert = WazuhAlert(**doc["alert"])
-        doc["alert"] = validated_alert.model_dump()
-    except Exception as e:
-        log(f"[WARNING] Alert schema validation failed: {e}", tag="!")
-        log(f"[DEBUG] Failed payload due to schema validation: {json.dumps(doc, default=json_serial)[:1000]}", tag="!")
-        # Dead letter queue for schema failures
+    failed = list(range(len(items)))
+    for attempt in range(1 if raise_errors else 3):
         try:
-            with open("dead_letter_queue.jsonl", "a") as f:
-                f.write(json.dumps(doc, default=json_serial) + "\n")
-            log("Document written to dead_letter_queue.jsonl after schema validation failure.", tag="!")
+            with span("es_push.bulk", attempt=attempt + 1, docs=len(items)):
+                response = requests.post(
+                    f"{ELASTICSEARCH_URL}/_bulk",
+                    data=payload,
+                    headers={"Content-Type": "application/x-ndjson"},
+                    auth=(ELASTIC_USER, ELASTIC_PASS),
+                    verify=False
+                )
+                response.raise_for_status()
+            result = codec.loads(response.content)
+            failed = []
+            if result.get("errors"):
+                for i, item in enumerate(result.get("items", [])):
+                    status = next(iter(item.values()), {})
+                    if status.get("error"):
+                        log(f"Bulk item rejected: {codec.dumps(status.get('error'))[:300]}", tag="!")
+                        failed.append(i)
+            elapsed = int((time.time() - start_time) * 1000)
+            log(f"Bulk indexed {len(items) - len(failed)}/{len(items)} documents in {elapsed}ms", tag="\u2713")
+            break
+        except requests.exceptions.RequestException as e:
+            log(f"Elasticsearch bulk push failed (attempt {attempt+1}): {e}", tag="!")
+            if raise_errors:
+                raise
+            time.sleep(2)
+    if raise_errors:
+        return failed
+    if failed:
+        try:
+            with open("dead_letter_queue.jsonl", "ab") as f:
+                f.write(b"".join(items[i][2] + b"\n" for i in failed))
+            DLQ_WRITES.labels("push").inc(len(failed))
+            log(f"{len(failed)} documents written to dead_letter_queue.jsonl after bulk indexing failed.", tag="!")
         except Exception as e:
             log(f"Failed to write to dead letter queue: {e}", tag="!")
+    return []
+
+def push_to_elasticsearch(doc):
+    """
+    Pushes an enriched alert document to Elasticsearch, with its alert ID as ``_id``.
+    With ES_OUTPUT_MODE=update, it goes through the bulk path as a partial update of the
+    original alert document instead.
+
+    Args:
+        doc (EnrichedAlertOutput or dict): The enriched alert document to push. An
+            EnrichedAlertOutput holds an alert validated at ingest and is sent as-is;
+            a dict is validated here and dead-lettered if it does not match the schema.
+    """
+    from config import ES_OUTPUT_MODE
+    if ES_OUTPUT_MODE == "update":
+        push_bulk_to_elasticsearch([doc])
         return
+    with time_stage("es_push"):
+        _push_to_elasticsearch(doc)
+
+def _push_to_elasticsearch(doc):
+    from config import ELASTICSEARCH_URL, ELASTIC_USER, ELASTIC_PASS, ENRICHED_INDEX
+
+    import time
+    start_time = time.time()
+    max_retries = 3
+    attempt = 0
+    success = False
+    # An EnrichedAlertOutput was validated at ingest; only dicts are checked here
+    if not isinstance(doc, EnrichedAlertOutput):
+        doc = _validate_document(doc)
+        if doc is None:
+            return
+    # Serialized once; datetimes are encoded natively by the codec
+    body = codec.dumps_bytes(doc)
+    alert_id = _doc_alert_id(doc)
+    doc_id = _doc_id(doc)
+    url = f"{ELASTICSEARCH_URL}/{ENRICHED_INDEX}/_doc" + (f"/{quote(doc_id, safe='')}" if doc_id else "")
     # --- Retry logic for transient errors ---
     while attempt < max_retries and not success:
         try:
-            doc_json = json.loads(json.dumps(doc, default=json_serial))
-            log(f"[DEBUG] Elasticsearch payload: {json.dumps(doc_json)[:1000]}", tag="i")
-            response = requests.post(
-                f"{ELASTICSEARCH_URL}/{ENRICHED_INDEX}/_doc",
-                json=doc_json,
-                auth=(ELASTIC_USER, ELASTIC_PASS),
-                verify=False
-            )
-            log(f"[DEBUG] Elasticsearch response status: {response.status_code}", tag="i")
-            log(f"[DEBUG] Elasticsearch response body: {response.text[:1000]}", tag="i")
-            response.raise_for_status()
+            with span("es_push.attempt", attempt=attempt + 1):
+                log(f"[DEBUG] Elasticsearch payload: {body[:1000].decode('utf-8', errors='replace')}", tag="i")
+                response = requests.post(
+                    url,
+                    data=body,
+                    headers={"Content-Type": "application/json"},
+                    auth=(ELASTIC_USER, ELASTIC_PASS),
+                    verify=False
+                )
+                log(f"[DEBUG] Elasticsearch response status: {response.status_code}", tag="i")
+                log(f"[DEBUG] Elasticsearch response body: {response.text[:1000]}", tag="i")
+                response.raise_for_status()
             elapsed = int((time.time() - start_time) * 1000)
-            log(f"Alert {doc.get('alert_id', doc.get('alert', {}).get('alert_id', 'unknown'))} pushed to Elasticsearch in {elapsed}ms", tag="\u2713")
+            log(f"Alert {alert_id} pushed to Elasticsearch in {elapsed}ms", tag="\u2713")
             success = True
         except requests.exceptions.RequestException as e:
             import traceback
             log(f"Elasticsearch push failed (attempt {attempt+1}): {e}", tag="!")
             log(f"[DEBUG] Elasticsearch exception traceback: {traceback.format_exc()}", tag="!")
-            log(f"[DEBUG] Failed payload: {json.dumps(doc, default=json_serial)[:1000]}", tag="!")
+            log(f"[DEBUG] Failed payload: {body[:1000].decode('utf-8', errors='replace')}", tag="!")
             attempt += 1
             time.sleep(2)
     if not success:
         # Dead letter queue: write failed doc to file
         try:
-            with open("dead_letter_queue.jsonl", "a") as f:
-                f.write(json.dumps(doc, default=json_serial) + "\n")
+            with open("dead_letter_queue.jsonl", "ab") as f:
+                f.write(body + b"\n")
+            DLQ_WRITES.labels("push").inc()
             log("Document written to dead_letter_queue.jsonl after repeated failures.", tag="!")
         except Exception as e:
-            log(f"Failed to write to dead letter queue: {e}", tag="!")
\ No newline at end of file
+            log(f"Failed to write to dead letter queue: {e}", tag="!")
+
+def _doc_alert_id(doc):
+    if isinstance(doc, EnrichedAlertOutput):
+        return doc.alert_id
+    return doc.get("alert_id", doc.get("alert", {}).get("id", "unknown"))
+
+def _doc_id(doc):
+    """The enriched index ``_id``: the alert ID, so re-enriching an alert overwrites it."""
+    alert_id = _doc_alert_id(doc)
+    return None if not alert_id or alert_id == "unknown" else str(alert_id)
+
+def _validate_document(doc):
+    """
+    Validates the alert of an untrusted document dict.
+
+    Returns:
+        dict: The document with its alert normalized, or None if it was dead-lettered.
+    """
+    # --- Bulletproof schema validation with Pydantic ---
+    if "alert" not in doc:
+        doc = {"alert": doc}
+    for field in RESERVED_FIELDS:
+        if field in doc["alert"]:
+            del doc["alert"][field]
+    try:
+        doc["alert"] = as_alert(doc["alert"]).model_dump()
+    except Exception as e:
+        log(f"[WARNING] Alert schema validation failed: {e}", tag="!")
+        log(f"[DEBUG] Failed payload due to schema validation: {codec.dumps(doc)[:1000]}", tag="!")
+        # Dead letter queue for schema failures
+        try:
+            with open("dead_letter_queue.jsonl", "a") as f:
+                f.write(codec.dumps(doc) + "\n")
+            DLQ_WRITES.labels("schema").inc()
+            log("Document written to dead_letter_queue.jsonl after schema validation failure.", tag="!")
+        except Exception as e:
+            log(f"Failed to write to dead letter queue: {e}", tag="!")
+        return None
+    return doc
@@ -0,0 +1,339 @@
+"""
+Static fast-path enrichment for well-known Wazuh rules.
+An in-memory table keyed by rule ID (and optionally decoder) of precomputed enrichments,
+with summaries templated from alert fields, that answers without an LLM call.
+
+Build a table from past enrichments:
+    python -m core.knowledge_base build llm_enriched_alerts.json -o knowledge_base.json --min-count 20
+"""
+# core/knowledge_base.py
+import argparse
+import os
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core import codec
+from core.logger import log
+from core.metrics import CACHE_HITS
+from core.utils import enrichment_failed
+from core.yara_integration import get_yara_matches
+from schemas.input_schema import as_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput
+
+DEFAULT_SUMMARY_TEMPLATE = "{rule.description} (rule {rule.id}, level {rule.level}) on agent {agent.name}."
+MISSING_FIELD = "unknown"
+STATIC = "static"
+REFRESH = "refresh"
+
+# Enrichment fields an entry carries (and a refresh overwrites)
+ENTRY_FIELDS = (
+    "alert_category",
+    "tags",
+    "risk_score",
+    "false_positive_likelihood",
+    "remediation_steps",
+    "related_cves",
+    "external_refs",
+    "llm_model_version",
+)
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][\w.]*)\}")
+
+
+def compile_template(template: str) -> Callable[[Any], str]:
+    """
+    Compiles a summary template such as ``"{rule.description} from {data.srcip}"`` into
+    ``render(alert) -> str``. Dotted paths walk model attributes and dict keys; missing
+    values render as MISSING_FIELD.
+    """
+    parts: List[Any] = []
+    pos = 0
+    for m in _PLACEHOLDER.finditer(template):
+        parts.append(template[pos:m.start()])
+        parts.append(tuple(m.group(1).split(".")))
+        pos = m.end()
+    parts.append(template[pos:])
+
+    def resolve(alert, path):
+        value = alert
+        for key in path:
+            if value is None:
+                break
+            value = value.get(key) if isinstance(value, dict) else getattr(value, key, None)
+        return MISSING_FIELD if value is None or value == "" else str(value)
+
+    def render(alert) -> str:
+        return "".join(part if type(part) is str else resolve(alert, part) for part in parts)
+    return render
+
+
+class KnowledgeBase:
+    """
+    Precomputed enrichments keyed by ``(rule_id, decoder)``; entries without a decoder
+    match any decoder for their rule.
+
+    Args:
+        entries (list): Entry dicts with ``rule_id``, optional ``decoder``, ``summary_template``,
+            the ENTRY_FIELDS and optional ``refreshed_at`` (ISO 8601).
+    """
+
+    def __init__(self, entries: List[dict]):
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # One save at a time: the temp file and rename are shared
+        self._table: Dict[Tuple[str, Optional[str]], dict] = {}
+        for entry in entries:
+            entry = dict(entry)
+            entry["rule_id"] = str(entry["rule_id"])
+            entry.setdefault("summary_template", DEFAULT_SUMMARY_TEMPLATE)
+            entry["_render"] = compile_template(entry["summary_template"])
+            entry["_refreshed"] = _epoch(entry.get("refreshed_at"))
+            self._table[(entry["rule_id"], entry.get("decoder") or None)] = entry
+
+    def __len__(self):
+        return len(self._table)
+
+    def lookup(self, alert) -> Optional[Tuple[Tuple[str, Optional[str]], dict]]:
+        """Returns ``(key, entry)`` for a WazuhAlertInput, or None."""
+        rule_id = alert.rule.id
+        decoder = alert.decoder.name if alert.decoder else None
+        if decoder:
+            entry = self._table.get((rule_id, decoder))
+            if entry is not None:
+                return (rule_id, decoder), entry
+        entry = self._table.get((rule_id, None))
+        return None if entry is None else ((rule_id, None), entry)
+
+    def update(self, key: Tuple[str, Optional[str]], enrichment) -> None:
+        """Replaces an entry's fields with a fresh LLM enrichment (the summary template is kept)."""
+        with self._lock:
+            entry = dict(self._table[key])
+            for field in ENTRY_FIELDS:
+                entry[field] = getattr(enrichment, field, entry.get(field))
+            entry["_refreshed"] = time.time()
+            entry["refreshed_at"] = datetime.now(timezone.utc).isoformat()
+            self._table[key] = entry
+
+    def entries(self) -> List[dict]:
+        return [{k: v for k, v in e.items() if not k.startswith("_")} for e in self._table.values()]
+
+    def save(self, path: str) -> None:
+        """
+        Writes the table to ``path`` atomically (a temporary file, then a rename). Saves
+        are serialized, so a later snapshot is never replaced by an earlier one.
+        """
+        with self._save_lock:
+            with self._lock:
+                data = codec.dumps({"entries": self.entries()}, indent=True) + "\n"
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+
+def _epoch(iso: Optional[str]) -> float:
+    try:
+        return datetime.fromisoformat(iso.replace("Z", "+00:00")).timestamp()
+    except Exception:
+        return 0.0
+
+
+def load_knowledge_base(path: str) -> KnowledgeBase:
+    """Loads a knowledge base file (``{"entries": [...]}``, or a bare list of entries)."""
+    with open(path, encoding="utf-8") as f:
+        data = codec.loads(f.read())
+    kb = KnowledgeBase(data["entries"] if isinstance(data, dict) else data)
+    log(f"Loaded {len(kb)} knowledge base entries from {path}", tag="i")
+    return kb
+
+
+class KnowledgeBaseQuery:
+    """
+    Callable wrapper with the same signature as a provider query function.
+
+    Alerts with a knowledge base entry are answered from it, with no LLM call (counted in
+    ``enrichment_cache_hits_total{cache="knowledge_base"}``). Other alerts, and hits that
+    match a YARA rule (they need a per-alert look, as when the table was built), go to
+    ``query``. In refresh mode, a hit on an entry older than ``refresh_after`` seconds also
+    queues one background ``query`` call for that alert and updates the entry from its
+    result; with ``save_path`` the updated table is written back there, so refreshes
+    survive a restart.
+
+    Args:
+        kb (KnowledgeBase): The table to answer from.
+        query (callable): Query function for misses and refreshes, ``fn(alert, model=None)``.
+        mode (str): "static" or "refresh".
+        refresh_after (float): Entry age (seconds) that triggers a refresh.
+        workers (int): Background refresh threads.
+        save_path (str): File to write the table to after each refresh (None keeps
+            refreshed entries in memory only).
+    """
+
+    def __init__(self, kb: KnowledgeBase, query: Callable, mode: str = STATIC,
+                 refresh_after: float = 86400.0, workers: int = 1, save_path: Optional[str] = None):
+        if mode not in (STATIC, REFRESH):
+            raise ValueError(f"Unsupported KB_MODE: {mode}")
+        self.kb = kb
+        self.query = query
+        self.mode = mode
+        self.refresh_after = refresh_after
+        self.save_path = save_path
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="kb-refresh") \
+            if mode == REFRESH else None
+
+    def __call__(self, alert, model: Optional[str] = None):
+        alert = as_alert(alert)
+        hit = self.kb.lookup(alert)
+        if hit is None:
+            return self.query(alert, model=model)
+        key, entry = hit
+        start = time.perf_counter()
+        if get_yara_matches(alert):
+            return self.query(alert, model=model)
+        CACHE_HITS.labels("knowledge_base").inc()
+        if self._executor is not None and time.time() - entry["_refreshed"] >= self.refresh_after:
+            self._schedule_refresh(key, alert, model)
+        enrichment = Enrichment.model_construct(
+            summary_text=entry["_render"](alert),
+            tags=list(entry.get("tags") or []),
+            risk_score=entry.get("risk_score"),
+            false_positive_likelihood=entry.get("false_positive_likelihood"),
+            alert_category=entry.get("alert_category"),
+            remediation_steps=list(entry.get("remediation_steps") or []),
+            related_cves=list(entry.get("related_cves") or []),
+            external_refs=list(entry.get("external_refs") or []),
+            llm_model_version=entry.get("llm_model_version"),
+            enriched_by="knowledge_base",
+            enrichment_duration_ms=int((time.perf_counter() - start) * 1000),
+            yara_matches=[],
+            input_tokens=0,
+            output_tokens=0,
+            estimated_cost_usd=0.0,
+        )
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert.id,
+            timestamp=datetime.now(timezone.utc),
+            alert=alert,
+            enrichment=enrichment
+        )
+
+    def _schedule_refresh(self, key, alert, model):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._executor.submit(self._refresh, key, alert, model)
+
+    def _refresh(self, key, alert, model):
+        try:
+            result = self.query(alert, model=model)
+            if enrichment_failed(result):
+                log(f"Knowledge base refresh for rule {key[0]} failed; keeping the current entry", tag="!")
+            else:
+                self.kb.update(key, result.enrichment)
+                if self.save_path:
+                    self.kb.save(self.save_path)
+        except Exception as e:
+            log(f"Knowledge base refresh for rule {key[0]} failed: {e}", tag="!")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+def build_entries(docs, min_count: int = 20, by_decoder: bool = False) -> List[dict]:
+    """
+    Aggregates past enriched documents into knowledge base entries.
+
+    Rules with fewer than ``min_count`` successful enrichments, or with any YARA match
+    (those need a per-alert look), are left out. Per rule: the most common category,
+    remediation steps and model, tags present in at least half of the enrichments,
+    CVEs and references by frequency, and median risk score and false-positive likelihood.
+    """
+    groups: Dict[Tuple[str, Optional[str]], List[dict]] = defaultdict(list)
+    excluded = set()
+    for doc in docs:
+        enrichment = doc.get("enrichment") or {}
+        alert = doc.get("alert") or {}
+        rule_id = str((alert.get("rule") or {}).get("id") or "")
+        if not rule_id or enrichment.get("error") or not enrichment.get("summary_text"):
+            continue
+        decoder = (alert.get("decoder") or {}).get("name") or None if by_decoder else None
+        key = (rule_id, decoder)
+        if enrichment.get("yara_matches"):
+            excluded.add(key)
+        groups[key].append(enrichment)
+
+    entries = []
+    for (rule_id, decoder), samples in sorted(groups.items(), key=lambda kv: -len(kv[1])):
+        if (rule_id, decoder) in excluded or len(samples) < min_count:
+            continue
+
+        def most_common(field):
+            values = Counter(codec.dumps(s.get(field), sort_keys=True) for s in samples)
+            return codec.loads(values.most_common(1)[0][0])
+
+        def frequent(field, share=0.0, limit=10):
+            counts = Counter(v for s in samples for v in dict.fromkeys(s.get(field) or []))
+            return [v for v, n in counts.most_common(limit) if n >= share * len(samples)]
+
+        def median(field):
+            values = [s[field] for s in samples if s.get(field) is not None]
+            return statistics.median(values) if values else None
+
+        risk = median("risk_score")
+        entry = {
+            "rule_id": rule_id,
+            "alert_category": most_common("alert_category"),
+            "tags": frequent("tags", share=0.5),
+            "risk_score": None if risk is None else int(risk),
+            "false_positive_likelihood": median("false_positive_likelihood"),
+            "remediation_steps": most_common("remediation_steps") or [],
+            "related_cves": frequent("related_cves"),
+            "external_refs": frequent("external_refs"),
+            "llm_model_version": most_common("llm_model_version"),
+            "summary_template": DEFAULT_SUMMARY_TEMPLATE,
+            "source_count": len(samples),
+            "refreshed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if decoder:
+            entry["decoder"] = decoder
+        entries.append(entry)
+    return entries
+
+
+def _read_docs(path: str):
+    with open(path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    yield codec.loads(line)
+                except codec.JSONDecodeError:
+                    continue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Knowledge base tools for fast-path enrichment.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build a knowledge base from enriched output (JSON lines)")
+    build.add_argument("inputs", nargs="+", help="Enriched output files (ENRICHED_OUTPUT_PATH)")
+    build.add_argument("-o", "--output", required=True)
+    build.add_argument("--min-count", type=int, default=20, help="Successful enrichments needed per rule")
+    build.add_argument("--by-decoder", action="store_true", help="Key entries by rule ID and decoder")
+    args = parser.parse_args(argv)
+
+    docs = (doc for path in args.inputs for doc in _read_docs(path))
+    entries = build_entries(docs, min_count=args.min_count, by_decoder=args.by_decoder)
+    KnowledgeBase(entries).save(args.output)
+    print(f"Wrote {len(entries)} entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
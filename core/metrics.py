@@ -0,0 +1,155 @@
+"""
+Prometheus metrics for the LLM enrichment project.
+Defines per-stage latency histograms, pipeline counters and gauges, and the metrics listener.
+"""
+# core/metrics.py
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+from core.tracing import span
+
+# Stages: preprocess, validation, filter, yara, llm, es_push, file_write
+STAGE_LATENCY = Histogram(
+    "enrichment_stage_duration_seconds",
+    "Latency of each enrichment pipeline stage",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 90),
+)
+ALERTS_PROCESSED = Counter(
+    "enrichment_alerts_total",
+    "Alerts that went through the pipeline, by source",
+    ["source"],
+)
+CACHE_HITS = Counter(
+    "enrichment_cache_hits_total",
+    "Enrichments served without a new LLM call, by cache",
+    ["cache"],
+)
+FALLBACKS = Counter(
+    "enrichment_fallbacks_total",
+    "Alerts written with a fallback enrichment, by reason",
+    ["reason"],
+)
+FILTERED = Counter(
+    "enrichment_filtered_total",
+    "Alerts routed by the pre-enrichment filter, by action and filter rule",
+    ["action", "rule"],
+)
+INGEST_PREFILTERED = Counter(
+    "enrichment_ingest_prefiltered_total",
+    "Alert lines dropped from raw bytes before JSON parsing, by reason",
+    ["reason"],
+)
+INPUT_DROPPED = Counter(
+    "enrichment_input_dropped_total",
+    "Input lines dropped before parsing, by input source and reason",
+    ["source", "reason"],
+)
+DLQ_WRITES = Counter(
+    "enrichment_dlq_writes_total",
+    "Documents written to the dead letter queue, by reason",
+    ["reason"],
+)
+QUEUE_DEPTH = Gauge(
+    "enrichment_queue_depth",
+    "Items waiting in an internal queue",
+    ["queue"],
+)
+LLM_INFLIGHT = Gauge(
+    "enrichment_llm_inflight_calls",
+    "Provider calls currently in flight",
+    ["provider"],
+)
+SINK_DOCUMENTS = Counter(
+    "enrichment_sink_documents_total",
+    "Documents handled by an output sink, by result (written, dead_letter, overflow)",
+    ["sink", "result"],
+)
+SINK_FLUSH_LATENCY = Histogram(
+    "enrichment_sink_flush_seconds",
+    "Time to write one batch to an output sink, retries included",
+    ["sink"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+INPUT_CONNECTIONS = Gauge(
+    "enrichment_input_connections",
+    "Open connections to a socket input source",
+    ["source"],
+)
+CONSUMER_LAG = Gauge(
+    "enrichment_consumer_lag_bytes",
+    "Bytes between the tailer position and the end of the alert log",
+)
+
+
+@contextmanager
+def time_stage(stage: str):
+    """
+    Context manager that observes the wall time of a pipeline stage.
+    Also records the stage as a span when the alert is being traced.
+
+    Args:
+        stage (str): Stage label (preprocess, validation, filter, yara, llm, es_push, file_write).
+    """
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def instrumented(provider: str, query):
+    """
+    Wraps a provider query function to track in-flight calls for that provider
+    (and record a per-attempt span, so failover and hedge calls show up in traces).
+    """
+    gauge = LLM_INFLIGHT.labels(provider)
+
+    def wrapper(alert: dict, model=None):
+        with gauge.track_inprogress(), span(f"provider.{provider}", model=model or "default"):
+            return query(alert, model=model)
+    wrapper.__name__ = getattr(query, "__name__", "query")
+    return wrapper
+
+
+def render_metrics():
+    """
+    Returns the current metrics in Prometheus text format.
+
+    Returns:
+        tuple: (payload bytes, content type).
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+_server_started = False
+
+
+def start_metrics_server(port: int = None, addr: str = None):
+    """
+    Starts the Prometheus HTTP listener for the daemon (no-op if port is 0 or already started).
+
+    Args:
+        port (int, optional): Listen port (default: METRICS_PORT).
+        addr (str, optional): Bind address (default: METRICS_ADDR).
+    """
+    global _server_started
+    from config import METRICS_PORT, METRICS_ADDR
+    from core.logger import log
+    port = METRICS_PORT if port is None else port
+    addr = addr or METRICS_ADDR
+    if not port or _server_started:
+        return
+    start_http_server(port, addr=addr)
+    _server_started = True
+    log(f"Prometheus metrics listening on {addr}:{port}/metrics", tag="i")
@@ -2,11 +2,20 @@
 """
 Preprocessing utilities for the LLM enrichment project.
 Handles filling missing fields and normalizing alert types.
+
+``normalize_alert`` / ``normalize_alerts`` are the pipeline entry points: an
+``AlertNormalizer`` compiled once from the input schema. ``fill_missing_fields`` and
+``normalize_alert_types`` are the original implementations, kept for existing callers
+and as the baseline for ``python -m bench.normalizer``.
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterable, List, Optional, Union, get_args, get_origin
 import copy
 
+from pydantic import BaseModel
+
+from schemas.input_schema import WazuhAlertInput
+
 # Module-level constants for defaults
 PREDECODER_DEFAULTS = {
     "program_name": "",
@@ -19,6 +28,12 @@ RULE_DEFAULTS = {
     "hipaa": [],
     "mitre": {"id": [], "technique": []}
 }
+ALERT_DEFAULTS = {"full_log": ""}
+SECTION_DEFAULTS = {
+    "predecoder": PREDECODER_DEFAULTS,
+    "decoder": DECODER_DEFAULTS,
+    "rule": RULE_DEFAULTS
+}
 
 
 def fill_missing_fields(
@@ -143,3 +158,166 @@ def normalize_alert_types(alert: Dict[str, Any]) -> Dict[str, Any]:
 
     # Data (leave as-is, can be any dict)
     return alert
+
+
+def _copier(value):
+    """Precompiled constructor for a fresh copy of a default value (no per-call deepcopy)."""
+    if isinstance(value, dict):
+        items = [(k, _copier(v)) for k, v in value.items()]
+        return lambda: {k: make() for k, make in items}
+    if isinstance(value, list):
+        if not value:
+            return list
+        makers = [_copier(v) for v in value]
+        return lambda: [make() for make in makers]
+    return lambda: value
+
+
+def _unwrap_optional(annotation):
+    if get_origin(annotation) is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _to_str(value):
+    return value if value is None or type(value) is str else str(value)
+
+
+def _to_int(value):
+    if value is None or type(value) is int:
+        return value
+    try:
+        return int(value)
+    except Exception:
+        return 0
+
+
+def _to_str_list(value):
+    if type(value) is list:
+        return value
+    return [] if value is None else [str(value)]
+
+
+def _coercer(annotation, default=None):
+    """
+    Returns ``fn(value) -> value`` for a schema annotation, or None if pydantic's own
+    coercion is enough (bools, free-form dicts). Scalars keep None; lists turn it into [].
+    """
+    annotation = _unwrap_optional(annotation)
+    if annotation is str:
+        return _to_str
+    if annotation is int:
+        return _to_int
+    origin = get_origin(annotation)
+    if origin is list and get_args(annotation) == (str,):
+        return _to_str_list
+    if origin is dict and get_args(annotation) and get_origin(get_args(annotation)[1]) is list:
+        fresh = _copier(default) if isinstance(default, dict) else dict
+
+        def to_list_map(value):
+            if type(value) is not dict:
+                return fresh()
+            for k, v in value.items():
+                if type(v) is not list:
+                    value[k] = [] if v is None else [str(v)]
+            return value
+        return to_list_map
+    return None
+
+
+def _compile_fields(model, defaults):
+    """(key, coerce) for each model field that needs coercion."""
+    fields = []
+    for name, field in model.model_fields.items():
+        coerce = _coercer(field.annotation, defaults.get(name))
+        if coerce is not None:
+            fields.append((name, coerce))
+    return tuple(fields)
+
+
+class AlertNormalizer:
+    """
+    Fills missing fields and coerces types for alert dicts, compiled once from a schema.
+
+    Field paths, coercions and default constructors are worked out at construction,
+    so normalizing an alert is a fixed sequence of dict lookups. Sections required by
+    the schema (``rule``) are only filled if present; optional ones with defaults
+    (``predecoder``, ``decoder``) are created when missing. Alerts are modified in place.
+
+    Args:
+        schema (type): Pydantic alert model (default: WazuhAlertInput).
+        alert_defaults (dict): Top-level field defaults.
+        section_defaults (dict): Defaults for nested sections, keyed by field name.
+    """
+
+    def __init__(self, schema=WazuhAlertInput, alert_defaults=None, section_defaults=None):
+        alert_defaults = ALERT_DEFAULTS if alert_defaults is None else alert_defaults
+        section_defaults = SECTION_DEFAULTS if section_defaults is None else section_defaults
+        self._always = []     # top-level scalars the schema always expects (str(...) as before)
+        self._scalars = []    # other top-level scalars: (key, default maker or None, coerce)
+        self._sections = []   # (key, create when missing, default items, fresh defaults, fields)
+        for name, field in schema.model_fields.items():
+            annotation = _unwrap_optional(field.annotation)
+            if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+                defaults = section_defaults.get(name, {})
+                self._sections.append((
+                    name,
+                    bool(defaults) and not field.is_required(),
+                    tuple((k, _copier(v)) for k, v in defaults.items()),
+                    _copier(defaults),
+                    _compile_fields(annotation, defaults),
+                ))
+            elif annotation is str and (field.is_required() or field.default is not None):
+                self._always.append(name)
+            else:
+                default = alert_defaults.get(name)
+                coerce = _coercer(annotation, default)
+                if default is not None or coerce is not None:
+                    self._scalars.append((name, None if default is None else _copier(default), coerce))
+
+    def __call__(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalizes one alert dict in place and returns it."""
+        for key in self._always:
+            alert[key] = str(alert.get(key, ""))
+        for key, make_default, coerce in self._scalars:
+            if key not in alert:
+                if make_default is not None:
+                    alert[key] = make_default()
+            elif coerce is not None:
+                alert[key] = coerce(alert[key])
+        for key, create, default_items, fresh, fields in self._sections:
+            section = alert.get(key)
+            if type(section) is not dict:
+                if create:
+                    alert[key] = fresh()
+                continue
+            for k, make in default_items:
+                if k not in section:
+                    section[k] = make()
+            for k, coerce in fields:
+                if k in section:
+                    section[k] = coerce(section[k])
+        return alert
+
+    def normalize_many(self, alerts: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Normalizes a batch of alert dicts in one pass (in place) and returns them as a list."""
+        normalize = self.__call__
+        return [normalize(alert) for alert in alerts]
+
+
+_normalizer = AlertNormalizer()
+
+
+def normalize_alert(alert: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fills missing fields and coerces types of one alert (in place) to match the input schema.
+    Replaces ``normalize_alert_types(fill_missing_fields(alert))``.
+    """
+    return _normalizer(alert)
+
+
+def normalize_alerts(alerts: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Batch form of ``normalize_alert``."""
+    return _normalizer.normalize_many(alerts)
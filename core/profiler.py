@@ -0,0 +1,129 @@
+"""
+On-demand statistical profiler for the LLM enrichment project.
+Samples every thread's stack for N seconds and dumps collapsed stacks for flame graphs.
+"""
+# core/profiler.py
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+
+from core.logger import log
+
+_active_lock = threading.Lock()
+_active = False
+
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter:
+    """
+    Samples all thread stacks (except the sampler's own) for ``seconds``.
+
+    Args:
+        seconds (float): How long to sample.
+        interval (float): Seconds between samples.
+
+    Returns:
+        Counter: Collapsed stack ("thread;outer;...;inner") -> sample count.
+    """
+    me = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            parts = []
+            while frame is not None:
+                parts.append(_frame_key(frame))
+                frame = frame.f_back
+            parts.append(names.get(ident, str(ident)))
+            stacks[";".join(reversed(parts))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def run_profile(seconds: float, output_dir: Optional[str] = None, interval: float = 0.005) -> str:
+    """
+    Profiles the running process and writes collapsed stacks (flamegraph.pl / speedscope format).
+
+    Args:
+        seconds (float): Sampling duration.
+        output_dir (str, optional): Directory for the dump (default: PROFILE_OUTPUT_DIR).
+        interval (float): Seconds between samples.
+
+    Returns:
+        str: Path of the written ``.folded`` file.
+
+    Raises:
+        RuntimeError: If a profile is already running.
+    """
+    global _active
+    from config import PROFILE_OUTPUT_DIR
+    with _active_lock:
+        if _active:
+            raise RuntimeError("A profile is already running")
+        _active = True
+    try:
+        output_dir = output_dir or PROFILE_OUTPUT_DIR
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"profile-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.folded")
+        log(f"Profiling for {seconds:g}s...", tag="i")
+        stacks = sample_stacks(seconds, interval)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        log(f"Profile written to {path} ({sum(stacks.values())} samples)", tag="\u2713")
+        return path
+    finally:
+        with _active_lock:
+            _active = False
+
+
+def start_profile(seconds: float, output_dir: Optional[str] = None) -> str:
+    """
+    Starts ``run_profile`` in a background thread and returns immediately.
+
+    Returns:
+        str: The output directory the profile will be written to.
+    """
+    from config import PROFILE_OUTPUT_DIR
+    output_dir = output_dir or PROFILE_OUTPUT_DIR
+
+    def run():
+        try:
+            run_profile(seconds, output_dir)
+        except Exception as e:
+            log(f"Profiler failed: {e}", tag="!")
+
+    threading.Thread(target=run, name="profiler", daemon=True).start()
+    return output_dir
+
+
+def install_signal_trigger(seconds: Optional[float] = None):
+    """
+    Profiles the process for ``seconds`` (default: PROFILE_SECONDS) whenever it receives SIGUSR1.
+
+    Must be called from the main thread; silently unavailable on platforms without SIGUSR1.
+    """
+    import signal
+    from config import PROFILE_SECONDS
+    seconds = seconds or PROFILE_SECONDS
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    try:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: start_profile(seconds))
+        log(f"Send SIGUSR1 to pid {os.getpid()} to profile for {seconds:g}s", tag="i")
+    except ValueError:
+        # Not in the main thread (e.g. the loop was started from a worker thread)
+        pass
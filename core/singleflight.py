@@ -0,0 +1,85 @@
+"""
+Single-flight coalescing of identical in-flight LLM requests.
+Concurrent calls for alerts with the same fingerprint share one provider call and its result.
+"""
+# core/singleflight.py
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from core import codec
+from core.metrics import CACHE_HITS
+from schemas.input_schema import alert_fields, as_alert
+
+# Fields that differ between copies of the same event and do not change the enrichment
+VOLATILE_FIELDS = ("id", "timestamp", "@timestamp", "_id")
+VOLATILE_RULE_FIELDS = ("firedtimes",)
+
+
+def alert_fingerprint(alert, model: Optional[str] = None) -> str:
+    """
+    Hashes the parts of an alert (WazuhAlertInput or dict) that determine its enrichment
+    (everything except ids, timestamps and rule fire counters) together with the model.
+    """
+    content = {k: v for k, v in alert_fields(alert).items() if k not in VOLATILE_FIELDS}
+    rule = content.get("rule")
+    if isinstance(rule, dict):
+        content["rule"] = {k: v for k, v in rule.items() if k not in VOLATILE_RULE_FIELDS}
+    canonical = codec.dumps_bytes({"model": model or "", "alert": content}, sort_keys=True)
+    return hashlib.sha256(canonical).hexdigest()
+
+
+class SingleFlightQuery:
+    """
+    Callable wrapper with the same signature as a provider query function.
+
+    The first caller for a fingerprint (the leader) makes the call; callers arriving while
+    it is in flight wait for it and receive a copy re-addressed to their own alert, with
+    zero token usage since no call was made for them. Exceptions are shared the same way.
+
+    Args:
+        query (callable): Query function, ``fn(alert, model=None)``.
+    """
+
+    def __init__(self, query: Callable):
+        self.query = query
+        self.coalesced = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, alert, model: Optional[str] = None):
+        key = alert_fingerprint(alert, model)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self.coalesced += 1
+            CACHE_HITS.labels("singleflight").inc()
+            return self._readdress(future.result(), alert)
+
+        try:
+            result = self.query(alert, model=model)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    @staticmethod
+    def _readdress(result, alert):
+        alert = as_alert(alert)
+        enrichment = result.enrichment.model_copy(
+            update={"input_tokens": 0, "output_tokens": 0, "estimated_cost_usd": 0.0}
+        )
+        return result.model_copy(update={
+            "alert_id": alert.id,
+            "alert": alert,
+            "enrichment": enrichment,
+        })
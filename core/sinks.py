@@ -0,0 +1,402 @@
+"""
+Output sinks for enriched alerts.
+Each sink (file, Elasticsearch, stdout, webhook, Unix socket) runs behind its own bounded
+queue and worker threads, writes in batches and retries on its own, so a slow or failing
+sink never holds up enrichment or the other sinks.
+"""
+# core/sinks.py
+import logging
+import queue
+import socket
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+import requests
+
+from config import (
+    ENRICHED_OUTPUT_PATH,
+    OUTPUT_SINKS,
+    INDEX_WORKERS,
+    SINK_QUEUE_SIZE,
+    SINK_BATCH_SIZE,
+    SINK_LINGER_MS,
+    SINK_RETRIES,
+    SINK_RETRY_BACKOFF,
+    SINK_OVERFLOW,
+    SINK_WEBHOOK_URL,
+    SINK_WEBHOOK_TOKEN,
+    SINK_WEBHOOK_TIMEOUT,
+    SINK_SOCKET_PATH
+)
+from core import codec
+from core.io import push_bulk_to_elasticsearch
+from core.logger import log
+from core.metrics import time_stage, DLQ_WRITES, QUEUE_DEPTH, SINK_DOCUMENTS, SINK_FLUSH_LATENCY
+
+_STOP = object()
+
+
+def _ndjson(docs: list) -> bytes:
+    return b"".join(codec.dumps_bytes(doc) + b"\n" for doc in docs)
+
+
+class PartialWriteError(Exception):
+    """Raised by ``write_batch`` when only some documents failed; ``docs`` are those."""
+
+    def __init__(self, docs: list, message: str):
+        super().__init__(message)
+        self.docs = docs
+
+
+class Sink:
+    """
+    A destination for enriched documents. ``write_batch`` raises on failure
+    (PartialWriteError if only some documents failed); retries, batching and queueing
+    are done by ``QueuedSink``.
+    """
+
+    name = "sink"
+    workers = 1  # Concurrent write_batch calls the destination handles well
+
+    def write_batch(self, docs: list) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink(Sink):
+    """Appends each batch to a JSON lines file in one write."""
+
+    name = "file"
+
+    def __init__(self, path: str = ENRICHED_OUTPUT_PATH):
+        self.path = path
+
+    def write_batch(self, docs):
+        with time_stage("file_write"), open(self.path, "ab") as f:
+            f.write(_ndjson(docs))
+
+
+class ElasticsearchSink(Sink):
+    """
+    Indexes each batch with ``_bulk`` requests (partial updates with ES_OUTPUT_MODE=update).
+    A transport error fails the batch; documents the cluster rejects fail on their own.
+    """
+
+    name = "elasticsearch"
+
+    def __init__(self, workers: int = INDEX_WORKERS):
+        self.workers = workers
+
+    def write_batch(self, docs):
+        rejected = push_bulk_to_elasticsearch(docs, raise_errors=True)
+        if rejected:
+            raise PartialWriteError(rejected, f"Elasticsearch rejected {len(rejected)} documents")
+
+
+class StdoutSink(Sink):
+    """
+    Writes NDJSON to standard output, for piping into a log shipper. Log lines are moved
+    to standard error so they do not mix with the documents.
+    """
+
+    name = "stdout"
+
+    def __init__(self):
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+
+    def write_batch(self, docs):
+        sys.stdout.buffer.write(_ndjson(docs))
+        sys.stdout.buffer.flush()
+
+
+class WebhookSink(Sink):
+    """POSTs each batch as one ``application/x-ndjson`` body."""
+
+    name = "webhook"
+
+    def __init__(self, url: str = SINK_WEBHOOK_URL, token: str = SINK_WEBHOOK_TOKEN,
+                 timeout: float = SINK_WEBHOOK_TIMEOUT):
+        if not url:
+            raise ValueError("The webhook sink needs SINK_WEBHOOK_URL")
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/x-ndjson"
+        if token:
+            self._session.headers["Authorization"] = f"Bearer {token}"
+
+    def write_batch(self, docs):
+        response = self._session.post(self.url, data=_ndjson(docs), timeout=self.timeout)
+        response.raise_for_status()
+
+    def close(self):
+        self._session.close()
+
+
+class UnixSocketSink(Sink):
+    """Streams NDJSON to a Unix domain socket, reconnecting after an error."""
+
+    name = "unix_socket"
+
+    def __init__(self, path: str = SINK_SOCKET_PATH):
+        if not path:
+            raise ValueError("The unix_socket sink needs SINK_SOCKET_PATH")
+        self.path = path
+        self._sock = None
+
+    def write_batch(self, docs):
+        try:
+            if self._sock is None:
+                self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._sock.connect(self.path)
+            self._sock.sendall(_ndjson(docs))
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class QueuedSink:
+    """
+    Runs a sink on its own worker threads behind a bounded queue.
+
+    Workers take whatever is queued, up to ``batch_size`` documents (waiting up to
+    ``linger_ms`` for a batch to fill), and write it; a failed batch (or, after a
+    PartialWriteError, its failed documents) is retried ``retries`` times with doubling
+    backoff, then dead-lettered with reason ``sink``.
+    A document's ``done`` callback, if any, runs once it is written or dead-lettered.
+
+    Args:
+        sink (Sink): The destination.
+        max_queue (int): Queue capacity.
+        batch_size (int): Max documents per ``write_batch``.
+        linger_ms (float): How long a worker waits for more documents to fill a batch.
+        retries (int): Retries of a failed batch.
+        backoff (float): Seconds before the first retry.
+        overflow (str): When the queue is full, ``put`` either blocks ("block") or
+            dead-letters the document ("dead_letter").
+    """
+
+    def __init__(self, sink: Sink, max_queue: int = SINK_QUEUE_SIZE, batch_size: int = SINK_BATCH_SIZE,
+                 linger_ms: float = SINK_LINGER_MS, retries: int = SINK_RETRIES,
+                 backoff: float = SINK_RETRY_BACKOFF, overflow: str = SINK_OVERFLOW):
+        if overflow not in ("block", "dead_letter"):
+            raise ValueError(f"Unknown SINK_OVERFLOW: {overflow}")
+        self.sink = sink
+        self.name = sink.name
+        self.batch_size = max(1, batch_size)
+        self.linger = linger_ms / 1000.0
+        self.retries = retries
+        self.backoff = backoff
+        self.overflow = overflow
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._depth = QUEUE_DEPTH.labels(f"sink:{self.name}")
+        self._counts = {result: SINK_DOCUMENTS.labels(self.name, result)
+                        for result in ("written", "dead_letter", "overflow")}
+        self._latency = SINK_FLUSH_LATENCY.labels(self.name)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"sink-{self.name}-{i}", daemon=True)
+            for i in range(max(1, sink.workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, doc, done: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queues a document without blocking.
+
+        Returns:
+            bool: False if the queue is full.
+        """
+        try:
+            self._queue.put_nowait((doc, done))
+        except queue.Full:
+            return False
+        self._depth.inc()
+        return True
+
+    def put(self, doc, done: Optional[Callable[[], None]] = None) -> None:
+        """Queues a document, applying the overflow policy when the queue is full."""
+        if self.submit(doc, done):
+            return
+        if self.overflow == "block":
+            self._queue.put((doc, done))
+            self._depth.inc()
+            return
+        self._dead_letter([doc], "queue full", result="overflow")
+        if done is not None:
+            done()
+
+    def _next_batch(self) -> Optional[List]:
+        """Blocks for one document, then takes up to ``batch_size``; None after a stop marker."""
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Keep it for this worker's next turn
+                break
+            batch.append(item)
+        self._depth.dec(len(batch))
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._flush(batch)
+
+    def _flush(self, items: list):
+        batch = [doc for doc, _ in items]
+        start = time.perf_counter()
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            try:
+                self.sink.write_batch(batch)
+                self._counts["written"].inc(len(batch))
+                break
+            except Exception as e:
+                log(f"Sink {self.name} failed to write {len(batch)} documents (attempt {attempt + 1}): {e}", tag="!")
+                if isinstance(e, PartialWriteError):
+                    self._counts["written"].inc(len(batch) - len(e.docs))
+                    batch = e.docs
+                if attempt == self.retries:
+                    self._dead_letter(batch, str(e))
+                else:
+                    time.sleep(delay)
+                    delay *= 2
+        self._latency.observe(time.perf_counter() - start)
+        for _, done in items:
+            if done is not None:
+                done()
+
+    def _dead_letter(self, docs: list, reason: str, result: str = "dead_letter"):
+        try:
+            with open("dead_letter_queue.jsonl", "ab") as f:
+                f.write(_ndjson(docs))
+            self._counts[result].inc(len(docs))
+            DLQ_WRITES.labels("sink").inc(len(docs))
+            log(f"{len(docs)} documents for sink {self.name} written to dead_letter_queue.jsonl ({reason})", tag="!")
+        except Exception as e:
+            log(f"Failed to write to dead letter queue: {e}", tag="!")
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Writes everything still queued, then stops the workers and closes the sink."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+        if any(t.is_alive() for t in self._threads):
+            log(f"Sink {self.name} closed with {self._queue.qsize()} documents still queued", tag="!")
+        self.sink.close()
+
+
+class _Countdown:
+    """Calls ``callback`` on the ``n``-th call."""
+
+    def __init__(self, n: int, callback: Callable[[], None]):
+        self.n = n
+        self.callback = callback
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.n -= 1
+            last = self.n == 0
+        if last:
+            self.callback()
+
+
+SINK_TYPES = {
+    "file": FileSink,
+    "elasticsearch": ElasticsearchSink,
+    "stdout": StdoutSink,
+    "webhook": WebhookSink,
+    "unix_socket": UnixSocketSink,
+}
+
+
+class SinkFanout:
+    """Hands each enriched document to every configured sink's queue."""
+
+    def __init__(self, sinks: List[QueuedSink]):
+        self.sinks = sinks
+
+    def emit(self, doc, done: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queues a document on every sink. ``done`` runs once every sink has written (or
+        dead-lettered) it, e.g. to acknowledge the alert in the durable work queue.
+        """
+        if done is not None:
+            if not self.sinks:
+                done()
+                return
+            done = _Countdown(len(self.sinks), done)
+        for sink in self.sinks:
+            sink.put(doc, done)
+
+    def offer(self, doc) -> List[QueuedSink]:
+        """Queues a document on every sink without blocking; returns the sinks that were full."""
+        return [sink for sink in self.sinks if not sink.submit(doc)]
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def build_sinks(names: str = OUTPUT_SINKS) -> SinkFanout:
+    """
+    Builds the sinks named in a comma-separated list (see SINK_TYPES).
+
+    Raises:
+        ValueError: If a name is unknown or a sink is missing its settings.
+    """
+    sinks = []
+    for name in (n.strip() for n in names.split(",")):
+        if not name:
+            continue
+        if name not in SINK_TYPES:
+            raise ValueError(f"Unknown output sink {name!r}; expected one of {sorted(SINK_TYPES)}")
+        sinks.append(QueuedSink(SINK_TYPES[name]()))
+    log(f"Output sinks: {', '.join(s.name for s in sinks) or 'none'}", tag="i")
+    return SinkFanout(sinks)
+
+
+_fanout: Optional[SinkFanout] = None
+_fanout_lock = threading.Lock()
+
+
+def get_output_sinks() -> SinkFanout:
+    """Returns the process-wide sink fan-out for OUTPUT_SINKS, building it on first use."""
+    global _fanout
+    with _fanout_lock:
+        if _fanout is None:
+            _fanout = build_sinks()
+    return _fanout
+
+
+def close_output_sinks():
+    """Flushes and stops the process-wide sinks, if they were built."""
+    global _fanout
+    with _fanout_lock:
+        fanout, _fanout = _fanout, None
+    if fanout is not None:
+        fanout.close()
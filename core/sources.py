@@ -0,0 +1,312 @@
+"""
+Streaming alert sources for the enrichment engine.
+Each source yields batches of raw NDJSON alert lines: the alert log tailer, or alerts sent
+straight to the engine over stdin, a Unix domain socket or TCP (Wazuh integrations, log
+shippers), without a round trip through the filesystem.
+"""
+# core/sources.py
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from config import (
+    ALERT_LOG_PATH,
+    INGEST_BLOCK_SIZE,
+    INPUT_SOURCE,
+    INPUT_SOCKET_PATH,
+    INPUT_TCP_ADDR,
+    INPUT_TCP_PORT,
+    INPUT_MAX_LINE_BYTES,
+    INPUT_READ_SIZE,
+    INPUT_QUEUE_SIZE,
+    INPUT_MAX_CONNECTIONS
+)
+from core.ingest import BlockReader
+from core.logger import log
+from core.metrics import CONSUMER_LAG, INPUT_CONNECTIONS, INPUT_DROPPED, QUEUE_DEPTH
+
+_EOF = object()
+
+
+class LineFramer:
+    """
+    Splits a byte stream into NDJSON lines.
+
+    ``feed`` returns the complete lines in each chunk (stripped, starting with ``{``) and
+    keeps a trailing partial line. A line longer than ``max_line`` bytes is dropped as
+    soon as it exceeds the limit, without buffering the rest of it.
+
+    Args:
+        max_line (int): Max bytes per line.
+        source (str): ``enrichment_input_dropped_total`` source label.
+    """
+
+    def __init__(self, max_line: int = INPUT_MAX_LINE_BYTES, source: str = "stream"):
+        self.max_line = max_line
+        self._pending = b""
+        self._skipping = False
+        self._dropped = INPUT_DROPPED.labels(source, "too_long")
+
+    def feed(self, data: bytes) -> List[bytes]:
+        data = self._pending + data
+        cut = data.rfind(b"\n") + 1
+        self._pending = data[cut:]
+        lines = []
+        if cut:
+            raw_lines = data[:cut].split(b"\n")
+            if self._skipping:
+                raw_lines = raw_lines[1:]  # The tail of a line already dropped
+                self._skipping = False
+            for raw in raw_lines:
+                if len(raw) > self.max_line:
+                    self._drop()
+                    continue
+                line = raw.strip()
+                if line.startswith(b"{"):
+                    lines.append(line)
+        if len(self._pending) > self.max_line:
+            if not self._skipping:
+                self._drop()
+            self._pending = b""
+            self._skipping = True
+        return lines
+
+    def flush(self) -> List[bytes]:
+        """The last line of a stream that ended without a newline."""
+        line, self._pending = self._pending.strip(), b""
+        return [line] if line.startswith(b"{") and not self._skipping else []
+
+    def _drop(self):
+        self._dropped.inc()
+        log(f"Dropped an input line longer than {self.max_line} bytes", tag="!")
+
+
+class AlertSource:
+    """A stream of raw alert lines; ``batches`` yields lists of lines until the source ends."""
+
+    name = "source"
+
+    def batches(self) -> Iterator[List[bytes]]:
+        raise NotImplementedError
+
+    def position(self) -> Optional[str]:
+        """Resume point after the last batch yielded, for sources that can resume (else None)."""
+        return None
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileTailSource(AlertSource):
+    """
+    Tails the alert log with block reads, polling once a second when idle.
+
+    Args:
+        path (str): Alert log.
+        block_size (int): Bytes per read.
+        resume (str): A ``position()`` saved earlier; ignored if the file was replaced
+            (rotated) since.
+    """
+
+    name = "file"
+
+    def __init__(self, path: str = ALERT_LOG_PATH, block_size: int = INGEST_BLOCK_SIZE,
+                 resume: Optional[str] = None):
+        self.reader = BlockReader(path, block_size)
+        inode, _, offset = (resume or "").partition(":")
+        if offset and int(inode) == self.reader.inode():
+            self.reader.seek(int(offset))
+
+    def batches(self):
+        while True:
+            lines = self.reader.read_lines()
+            # Bytes between our read position and the end of alerts.json
+            CONSUMER_LAG.set(self.reader.lag())
+            if lines:
+                yield lines
+            else:
+                time.sleep(1)
+
+    def position(self):
+        return f"{self.reader.inode()}:{self.reader.position()}"
+
+    def close(self):
+        self.reader.close()
+
+
+class StreamSource(AlertSource):
+    """
+    Base for sources fed by reader threads.
+
+    Readers frame their input and put each chunk's lines on one bounded queue. When the
+    queue is full a reader blocks and stops reading, so its sender is slowed down by the
+    pipe or socket buffer filling up (per-connection backpressure) while other
+    connections keep their own pace.
+    """
+
+    def __init__(self, max_line: int = INPUT_MAX_LINE_BYTES, read_size: int = INPUT_READ_SIZE,
+                 queue_size: int = INPUT_QUEUE_SIZE):
+        self.max_line = max_line
+        self.read_size = read_size
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._depth = QUEUE_DEPTH.labels(f"input:{self.name}")
+        self._closed = threading.Event()
+
+    def _put(self, lines: List[bytes]):
+        if lines:
+            self._queue.put(lines)
+            self._depth.inc()
+
+    def _read_stream(self, read, label: str):
+        """Reads with ``read(n)`` until it returns no data, putting the framed lines on the queue."""
+        framer = LineFramer(self.max_line, self.name)
+        try:
+            while not self._closed.is_set():
+                data = read(self.read_size)
+                if not data:
+                    break
+                self._put(framer.feed(data))
+            self._put(framer.flush())
+        except OSError as e:
+            if not self._closed.is_set():
+                log(f"Input {label} closed: {e}", tag="!")
+
+    def batches(self):
+        while True:
+            lines = self._queue.get()
+            if lines is _EOF:
+                return
+            self._depth.dec()
+            yield lines
+
+    def close(self):
+        self._closed.set()
+
+
+class StdinSource(StreamSource):
+    """NDJSON on standard input; the source ends at end of input."""
+
+    name = "stdin"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        fd = sys.stdin.fileno()
+        threading.Thread(target=self._run, args=(fd,), name="input-stdin", daemon=True).start()
+
+    def _run(self, fd: int):
+        self._read_stream(lambda n: os.read(fd, n), "stdin")
+        self._queue.put(_EOF)
+
+
+class SocketSource(StreamSource):
+    """
+    Accepts NDJSON connections on a listening socket, one reader thread per connection,
+    up to ``max_connections`` at once (further connections are closed right away).
+    """
+
+    def __init__(self, listener: socket.socket, label: str, max_connections: int = INPUT_MAX_CONNECTIONS, **kwargs):
+        super().__init__(**kwargs)
+        self.listener = listener
+        self.max_connections = max_connections
+        self._connections = INPUT_CONNECTIONS.labels(self.name)
+        self._active = 0
+        self._lock = threading.Lock()
+        log(f"Accepting alerts on {label}", tag="i")
+        threading.Thread(target=self._accept, name=f"input-{self.name}", daemon=True).start()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                conn, peer = self.listener.accept()
+            except OSError:
+                break
+            with self._lock:
+                full = self._active >= self.max_connections
+                if not full:
+                    self._active += 1
+            if full:
+                log(f"Refused an input connection: {self.max_connections} already open", tag="!")
+                conn.close()
+                continue
+            self._connections.inc()
+            threading.Thread(target=self._serve, args=(conn, peer or "local"), name=f"input-{self.name}-conn",
+                             daemon=True).start()
+
+    def _serve(self, conn: socket.socket, peer):
+        try:
+            with conn:
+                self._read_stream(conn.recv, f"connection {peer}")
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._connections.dec()
+
+    def close(self):
+        super().close()
+        self.listener.close()
+
+
+class UnixSocketSource(SocketSource):
+    """NDJSON over a Unix domain socket at ``path`` (a stale socket file is replaced)."""
+
+    name = "unix"
+
+    def __init__(self, path: str = INPUT_SOCKET_PATH, **kwargs):
+        if not path:
+            raise ValueError("The unix input needs INPUT_SOCKET_PATH")
+        if os.path.exists(path):
+            os.unlink(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen(64)
+        self.path = path
+        super().__init__(listener, path, **kwargs)
+
+    def close(self):
+        super().close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class TcpSource(SocketSource):
+    """NDJSON over TCP on ``addr:port``."""
+
+    name = "tcp"
+
+    def __init__(self, addr: str = INPUT_TCP_ADDR, port: int = INPUT_TCP_PORT, **kwargs):
+        listener = socket.create_server((addr, port), backlog=64)
+        super().__init__(listener, f"tcp://{addr}:{listener.getsockname()[1]}", **kwargs)
+
+
+SOURCE_TYPES = {
+    "file": FileTailSource,
+    "stdin": StdinSource,
+    "unix": UnixSocketSource,
+    "tcp": TcpSource,
+}
+
+
+def open_input_source(name: Optional[str] = None, resume: Optional[str] = None) -> AlertSource:
+    """
+    Opens the input source named by ``name`` (default INPUT_SOURCE), resuming the file
+    tailer from ``resume`` (a saved ``position()``) when given.
+
+    Raises:
+        ValueError: If the name is unknown or the source is missing its settings.
+    """
+    name = name or INPUT_SOURCE
+    if name not in SOURCE_TYPES:
+        raise ValueError(f"Unknown input source {name!r}; expected one of {sorted(SOURCE_TYPES)}")
+    if name == "file":
+        return FileTailSource(resume=resume)
+    return SOURCE_TYPES[name]()
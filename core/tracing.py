@@ -0,0 +1,146 @@
+"""
+Lightweight per-alert stage tracing for the LLM enrichment project.
+Records spans in a context-local trace and writes slow traces as OTLP/JSON lines.
+"""
+# core/tracing.py
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from core.logger import log
+from core import codec
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("enrichment_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("enrichment_span", default=None)
+_write_lock = threading.Lock()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Trace:
+    """Spans recorded while processing one alert."""
+
+    def __init__(self, alert_id: str):
+        self.trace_id = os.urandom(16).hex()
+        self.alert_id = alert_id
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Dict[str, Any]):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Renders the trace as an OTLP/JSON ExportTraceServiceRequest."""
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": "llm-alert-enrichment"}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "core.tracing"},
+                    "spans": [{
+                        "traceId": self.trace_id,
+                        "spanId": s["span_id"],
+                        "parentSpanId": s["parent_span_id"] or "",
+                        "name": s["name"],
+                        "kind": 1,
+                        "startTimeUnixNano": str(s["start_ns"]),
+                        "endTimeUnixNano": str(s["end_ns"]),
+                        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+                        "status": {"code": 2, "message": s["error"]} if s["error"] else {},
+                    } for s in spans],
+                }],
+            }]
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Records a span in the current alert's trace (no-op outside a trace).
+
+    Args:
+        name (str): Span name (e.g. "llm", "es_push.attempt").
+        **attributes: Span attributes (str, int, float or bool).
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    span_id = os.urandom(8).hex()
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start_ns = time.time_ns()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{e.__class__.__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.add_span({
+            "name": name,
+            "span_id": span_id,
+            "parent_span_id": parent,
+            "start_ns": start_ns,
+            "end_ns": time.time_ns(),
+            "attributes": attributes,
+            "error": error,
+        })
+
+
+@contextmanager
+def start_trace(alert_id: str, source: str = "file"):
+    """
+    Starts a trace for one alert; the root span covers the whole block.
+
+    When the block takes at least TRACE_SLOW_MS, the trace is appended to
+    TRACE_OUTPUT_PATH as one OTLP/JSON line (the OpenTelemetry file exporter format).
+    Tracing is disabled when TRACE_OUTPUT_PATH is empty.
+
+    Yields:
+        Trace or None: The active trace.
+    """
+    from config import TRACE_OUTPUT_PATH, TRACE_SLOW_MS
+    if not TRACE_OUTPUT_PATH:
+        yield None
+        return
+    trace = Trace(str(alert_id))
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        with span("enrich_alert", alert_id=str(alert_id), source=source):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        if (time.perf_counter() - start) * 1000 >= TRACE_SLOW_MS:
+            _write_trace(trace, TRACE_OUTPUT_PATH)
+
+
+def _write_trace(trace: Trace, path: str):
+    try:
+        line = codec.dumps(trace.to_otlp())
+        with _write_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except Exception as e:
+        log(f"Failed to write trace for alert {trace.alert_id}: {e}", tag="!")
+
+
+def current_trace() -> Optional[Trace]:
+    """Returns the trace active in this context, if any."""
+    return _current_trace.get()
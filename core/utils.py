@@ -44,4 +44,53 @@ def load_prompt_template(path: str) -> str:
         with open(path, encoding="utf-8") as f:
             return f.read()
     except Exception as e:
-        raise RuntimeError(f"Failed to load prompt template: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to load prompt template: {e}")
+
+def enrichment_failed(result) -> bool:
+    """
+    Returns True if a provider result is missing or carries a fallback enrichment.
+
+    Providers never raise on LLM/API errors; they return an EnrichedAlertOutput whose
+    enrichment has ``error`` set. Wrappers (hedging, failover) use this to tell a
+    usable answer from a fallback.
+
+    Args:
+        result: The value returned by a provider query function (or None).
+
+    Returns:
+        bool: True if the result should be treated as a failed enrichment.
+    """
+    enrichment = getattr(result, "enrichment", None)
+    return enrichment is None or getattr(enrichment, "error", None) is not None
+
+
+def parse_llm_json(raw: str) -> dict:
+    """
+    Parses a JSON object from free-form LLM text.
+
+    Used when a backend does not support constrained output (or it is disabled):
+    strips ``` code fences and leading commentary, and retries once with trailing
+    commas removed.
+
+    Args:
+        raw (str): The raw text returned by the LLM.
+
+    Returns:
+        dict: The parsed JSON object.
+
+    Raises:
+        json.JSONDecodeError: If the text cannot be parsed even after cleanup.
+    """
+    import re
+    from core import codec
+    text = raw.strip()
+    if text.startswith("```"):
+        text = text.replace("```json", "").replace("```", "").strip()
+    if not text.startswith("{"):
+        idx = text.find("{")
+        if idx != -1:
+            text = text[idx:]
+    try:
+        return codec.loads(text)
+    except codec.JSONDecodeError:
+        return codec.loads(re.sub(r",([ \t\r\n]*[}\]])", r"\1", text))
@@ -0,0 +1,246 @@
+"""
+Durable work queue for raw alert lines, stored in SQLite (WAL).
+Ingestion appends alerts at disk speed and enrichment workers (threads or processes)
+lease them in batches, so a crash or restart loses nothing that was read: delivery is
+at least once, an unacknowledged lease becomes visible again after its timeout.
+
+Inspect a queue:
+    python -m core.workqueue stats
+"""
+# core/workqueue.py
+import argparse
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Iterable, List, NamedTuple, Optional
+
+from config import (
+    WORKQUEUE_PATH,
+    WORKQUEUE_VISIBILITY_TIMEOUT,
+    WORKQUEUE_MAX_ATTEMPTS,
+    WORKQUEUE_SYNCHRONOUS
+)
+from core import codec
+from core.logger import log
+from core.metrics import DLQ_WRITES, QUEUE_DEPTH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload BLOB NOT NULL,
+    enqueued_at REAL NOT NULL,
+    visible_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_visible ON jobs (visible_at, id);
+CREATE TABLE IF NOT EXISTS cursors (
+    source TEXT PRIMARY KEY,
+    position TEXT NOT NULL
+);
+"""
+
+
+class Job(NamedTuple):
+    id: int
+    payload: bytes
+    attempts: int  # Deliveries so far, this one included
+    lease: str
+
+
+class WorkQueue:
+    """
+    SQLite-backed queue with leased, batched dequeue.
+
+    ``get_batch`` leases up to ``n`` visible jobs for ``visibility_timeout`` seconds;
+    ``extend`` keeps them leased for longer, ``ack`` deletes them and ``nack`` makes
+    them visible again. A lease that is neither acknowledged nor extended in time
+    expires and the job is delivered again. Jobs delivered ``max_attempts`` times
+    without an ack are moved to the dead letter queue.
+
+    Every process opens its own WorkQueue on the same file; leases are taken in an
+    ``IMMEDIATE`` transaction, so no job is leased twice at once.
+
+    Args:
+        path (str): Database file; created on first use.
+        visibility_timeout (float): Seconds a leased job stays invisible.
+        max_attempts (int): Deliveries before a job is dead-lettered (0 = no limit).
+        synchronous (str): SQLite ``synchronous`` level. NORMAL survives a process
+            crash; FULL also survives a power loss, at a cost per commit.
+    """
+
+    def __init__(self, path: str = WORKQUEUE_PATH, visibility_timeout: float = WORKQUEUE_VISIBILITY_TIMEOUT,
+                 max_attempts: int = WORKQUEUE_MAX_ATTEMPTS, synchronous: str = WORKQUEUE_SYNCHRONOUS):
+        if not path:
+            raise ValueError("The work queue needs WORKQUEUE_PATH")
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript(SCHEMA)
+        self._depth = QUEUE_DEPTH.labels("workqueue")
+
+    def _transaction(self, sql_calls):
+        """Runs ``sql_calls(conn)`` in one IMMEDIATE transaction and returns its result."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = sql_calls(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def put_many(self, payloads: Iterable[bytes], cursor: Optional[tuple] = None) -> int:
+        """
+        Appends jobs in one transaction.
+
+        Args:
+            payloads: Raw alert lines.
+            cursor (tuple): ``(source, position)`` saved in the same transaction, so an
+                input resumes exactly after the last line it enqueued.
+
+        Returns:
+            int: Jobs added.
+        """
+        now = time.time()
+        rows = [(payload, now, now) for payload in payloads]
+
+        def insert(conn):
+            conn.executemany("INSERT INTO jobs (payload, enqueued_at, visible_at) VALUES (?, ?, ?)", rows)
+            if cursor is not None:
+                conn.execute("INSERT OR REPLACE INTO cursors VALUES (?, ?)", cursor)
+
+        self._transaction(insert)
+        return len(rows)
+
+    def cursor(self, source: str) -> Optional[str]:
+        """The position last saved for ``source`` with ``put_many``, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT position FROM cursors WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def get_batch(self, n: int, visibility_timeout: Optional[float] = None) -> List[Job]:
+        """
+        Leases up to ``n`` visible jobs, oldest first. Jobs past ``max_attempts`` are
+        written to the dead letter queue before they are deleted; if that write fails they
+        stay leased, and are retried once the lease expires.
+        """
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        lease = uuid.uuid4().hex
+        now = time.time()
+
+        def lease_jobs(conn):
+            rows = conn.execute(
+                "UPDATE jobs SET visible_at = ?, attempts = attempts + 1, lease = ? "
+                "WHERE id IN (SELECT id FROM jobs WHERE visible_at <= ? ORDER BY id LIMIT ?) "
+                "RETURNING id, payload, attempts",
+                (now + timeout, lease, now, n),
+            ).fetchall()
+            poison = [row for row in rows if self.max_attempts and row[2] > self.max_attempts]
+            if poison and self._dead_letter([row[1] for row in poison]):
+                conn.executemany("DELETE FROM jobs WHERE id = ?", [(row[0],) for row in poison])
+            return sorted(rows), poison
+
+        rows, poison = self._transaction(lease_jobs)
+        poisoned = {row[0] for row in poison}
+        return [Job(row[0], row[1], row[2], lease) for row in rows if row[0] not in poisoned]
+
+    def extend(self, jobs: Iterable[Job], visibility_timeout: Optional[float] = None) -> int:
+        """
+        Keeps leased jobs invisible for another ``visibility_timeout`` seconds from now.
+        Jobs no longer held under their lease (acknowledged, or expired and taken by
+        another worker) are left alone.
+
+        Returns:
+            int: Leases extended.
+        """
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        keys = [(time.time() + timeout, job.id, job.lease) for job in jobs]
+        if not keys:
+            return 0
+
+        def update(conn):
+            before = conn.total_changes
+            conn.executemany("UPDATE jobs SET visible_at = ? WHERE id = ? AND lease = ?", keys)
+            return conn.total_changes - before
+
+        return self._transaction(update)
+
+    def ack(self, jobs: Iterable[Job]) -> int:
+        """
+        Deletes finished jobs. A job whose lease expired and was taken by another worker
+        is left alone (that worker acknowledges it).
+
+        Returns:
+            int: Jobs deleted.
+        """
+        keys = [(job.id, job.lease) for job in jobs]
+        if not keys:
+            return 0
+
+        def delete(conn):
+            before = conn.total_changes
+            conn.executemany("DELETE FROM jobs WHERE id = ? AND lease = ?", keys)
+            return conn.total_changes - before
+
+        return self._transaction(delete)
+
+    def nack(self, jobs: Iterable[Job], delay: float = 0.0) -> None:
+        """Makes leased jobs visible again after ``delay`` seconds."""
+        keys = [(time.time() + delay, job.id, job.lease) for job in jobs]
+        if keys:
+            self._transaction(lambda conn: conn.executemany(
+                "UPDATE jobs SET visible_at = ?, lease = NULL WHERE id = ? AND lease = ?", keys))
+
+    def stats(self) -> dict:
+        """
+        Job counts: ``ready`` (visible), ``leased`` and ``total``, and the oldest job's age.
+        Also sets ``enrichment_queue_depth{queue="workqueue"}`` (the count covers every
+        process using the file).
+        """
+        now = time.time()
+        with self._lock:
+            total, ready, oldest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(visible_at <= ?), 0), MIN(enqueued_at) FROM jobs", (now,)
+            ).fetchone()
+        self._depth.set(total)
+        return {"total": total, "ready": ready, "leased": total - ready,
+                "oldest_age_seconds": round(now - oldest, 1) if oldest else 0.0}
+
+    def _dead_letter(self, payloads: List[bytes]) -> bool:
+        """Appends payloads to the dead letter queue; returns False if the write failed."""
+        try:
+            with open("dead_letter_queue.jsonl", "ab") as f:
+                f.write(b"".join(payload + b"\n" for payload in payloads))
+        except Exception as e:
+            log(f"Failed to write to dead letter queue; {len(payloads)} queued alerts stay queued: {e}", tag="!")
+            return False
+        DLQ_WRITES.labels("queue").inc(len(payloads))
+        log(f"{len(payloads)} queued alerts written to dead_letter_queue.jsonl after "
+            f"{self.max_attempts} deliveries", tag="!")
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the durable alert work queue.")
+    parser.add_argument("command", choices=["stats"])
+    parser.add_argument("--path", default=WORKQUEUE_PATH)
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path or ""):
+        parser.error(f"No work queue at {args.path!r}")
+    print(codec.dumps(WorkQueue(args.path).stats(), indent=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,10 @@ Provides functions to load YARA rules and scan alert data.
 # core/yara_integration.py
 import yara
 import os
-import json
+import threading
 from typing import List, Dict, Any
+from core.metrics import time_stage
+from core import codec
 
 def load_yara_rules(rules_path: str = "yara_rules/") -> yara.Rules:
     """
@@ -34,8 +36,7 @@ def scan_alert_with_yara(alert: dict, rules: yara.Rules) -> List[Dict[str, Any]]
     Returns:
         List[Dict[str, Any]]: List of YARA match results (rule name, tags, meta).
     """
-    alert_json = json.dumps(alert)
-    matches = rules.match(data=alert_json)
+    matches = rules.match(data=codec.dumps_bytes(alert))
     results = []
     for match in matches:
         results.append({
@@ -53,14 +54,44 @@ def safe_scan_alert_with_yara(alert: dict, rules) -> list:
         logging.getLogger("llm_enrichment").warning(f"YARA scan failed: {e}")
         return []
 
+_rules_cache: Dict[str, tuple] = {}  # rules_path -> (file mtimes, compiled rules)
+_rules_lock = threading.Lock()
+
+def _rule_files_state(rules_path: str) -> tuple:
+    """``(path, mtime)`` of every rule file under ``rules_path``, to detect edits."""
+    if os.path.isdir(rules_path):
+        paths = sorted(os.path.join(rules_path, f) for f in os.listdir(rules_path) if f.endswith(('.yar', '.yara')))
+    else:
+        paths = [rules_path]
+    return tuple((p, os.stat(p).st_mtime_ns) for p in paths)
+
+def get_yara_rules(rules_path: str = "yara_rules/") -> yara.Rules:
+    """
+    Returns the compiled rules for ``rules_path``, compiling them only on first use
+    and again after a rule file is added, removed or modified.
+    Raises:
+        Exception: If rules cannot be loaded or compiled.
+    """
+    state = _rule_files_state(rules_path)
+    cached = _rules_cache.get(rules_path)
+    if cached is not None and cached[0] == state:
+        return cached[1]
+    with _rules_lock:
+        cached = _rules_cache.get(rules_path)
+        if cached is None or cached[0] != state:
+            cached = (state, load_yara_rules(rules_path))
+            _rules_cache[rules_path] = cached
+    return cached[1]
+
 def get_yara_matches(alert: dict, rules_path: str = "yara_rules/") -> list:
     """
-    Defensive YARA scan for any alert.
+    Defensive YARA scan for any alert, with rules compiled once (see ``get_yara_rules``).
     Always returns a list, never raises.
     """
     try:
-        rules = load_yara_rules(rules_path)
-        return scan_alert_with_yara(alert, rules)
+        with time_stage("yara"):
+            rules = get_yara_rules(rules_path)
+            return scan_alert_with_yara(alert, rules)
     except Exception as e:
         import logging
         logging.getLogger("llm_enrichment").warning(f"YARA scan failed or no rules loaded: {e}")
@@ -7,32 +7,9 @@ from config import ELASTICSEARCH_URL, ELASTIC_USER, ELASTIC_PASS, ENRICHED_INDEX
 from core.engine import run_enrichment_loop
 from config import ALERT_LOG_PATH
 from core.factory import get_llm_query_function
+from core.preprocessing import normalize_alert
 
 
-def fill_missing_fields(alert):
-    alert.setdefault("full_log", "")
-    # Ensure predecoder exists and has required fields
-    predecoder_defaults = {
-        "program_name": "",
-        "timestamp": "",
-        "hostname": ""
-    }
-    if "predecoder" not in alert or not isinstance(alert["predecoder"], dict):
-        alert["predecoder"] = predecoder_defaults.copy()
-    else:
-        for k, v in predecoder_defaults.items():
-            alert["predecoder"].setdefault(k, v)
-
-    alert.setdefault("decoder", {"name": "", "parent": "", "ftscomment": ""})
-    if "decoder" in alert:
-        alert["decoder"].setdefault("parent", "")
-        alert["decoder"].setdefault("ftscomment", "")
-    if "rule" in alert:
-        alert["rule"].setdefault("gpg13", [])
-        alert["rule"].setdefault("hipaa", [])
-        alert["rule"].setdefault("mitre", {"id": [], "technique": []})
-    return alert
-
 def run_single_alert_file():
     # Try to load the file as a single JSON object
     with open(ALERT_LOG_PATH, 'r', encoding='utf-8') as f:
@@ -41,7 +18,7 @@ def run_single_alert_file():
             # If the alert is wrapped in _source (Kibana export), extract it
             if '_source' in alert:
                 alert = alert['_source']
-            alert = fill_missing_fields(alert)
+            alert = normalize_alert(alert)
             query_llm = get_llm_query_function()
             result = query_llm(alert)
             result_dict = result.model_dump()
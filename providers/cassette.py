@@ -0,0 +1,201 @@
+"""
+Cassette (record/replay) provider for LLM enrichment.
+Records request-hash -> response from a real provider into a local SQLite store and
+replays them deterministically, for cost-free load testing with production alerts.
+"""
+# providers/cassette.py
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from schemas.input_schema import alert_fields, as_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput
+from core.utils import enrichment_failed
+from config import (
+    CASSETTE_MODE,
+    CASSETTE_PATH,
+    CASSETTE_PROVIDER,
+    CASSETTE_LATENCY_SCALE,
+    CASSETTE_ON_MISS,
+)
+
+logger = logging.getLogger("llm_enrichment")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    request_key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    alert_id TEXT,
+    response TEXT NOT NULL,
+    latency_ms REAL NOT NULL,
+    recorded_at TEXT NOT NULL
+)
+"""
+
+
+# Left out of the key: the validator fills a missing timestamp with the current time
+KEY_EXCLUDED_FIELDS = ("timestamp", "@timestamp")
+
+
+def request_key(provider: str, model: Optional[str], alert) -> str:
+    """
+    Hashes everything that determines the provider request: provider, model and the
+    (preprocessed) alert without its timestamp, serialized canonically so key order
+    does not matter.
+    """
+    content = {k: v for k, v in alert_fields(alert).items() if k not in KEY_EXCLUDED_FIELDS}
+    canonical = json.dumps(
+        {"provider": provider, "model": model or "", "alert": content},
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    SQLite-backed store of recorded provider responses, keyed by request hash.
+
+    Args:
+        path (str): Database file; created on first use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def get(self, key: str):
+        """Returns ``(response_json, latency_ms)`` for a key, or None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT response, latency_ms FROM recordings WHERE request_key = ?", (key,)
+            ).fetchone()
+
+    def put(self, key: str, provider: str, model: Optional[str], alert_id: str, response: str, latency_ms: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recordings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model or "", alert_id, response, latency_ms,
+                 datetime.now(timezone.utc).isoformat()),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+
+class CassetteQuery:
+    """
+    Query function (``fn(alert, model=None)``) that records or replays provider calls.
+
+    Args:
+        cassette (Cassette): Response store.
+        provider (str): Name of the recorded provider; part of the request hash.
+        mode (str): "record" calls ``inner`` and stores successful responses;
+            "replay" serves stored responses without any network call.
+        inner (callable, optional): Real provider query function (required to record).
+        latency_scale (float): Replay sleeps recorded latency x this factor (0: no delay).
+        on_miss (str): Replay behaviour for unrecorded requests: "fallback" returns a
+            failed enrichment, "error" raises LookupError.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        provider: str,
+        mode: str = "replay",
+        inner: Optional[Callable] = None,
+        latency_scale: float = 0.0,
+        on_miss: str = "fallback",
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported CASSETTE_MODE: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Cassette record mode needs a provider to wrap")
+        self.cassette = cassette
+        self.provider = provider
+        self.mode = mode
+        self.inner = inner
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+        self.__name__ = f"query_cassette_{mode}"
+
+    def __call__(self, alert, model: Optional[str] = None) -> EnrichedAlertOutput:
+        alert = as_alert(alert)
+        key = request_key(self.provider, model, alert)
+        if self.mode == "record":
+            start = time.perf_counter()
+            result = self.inner(alert, model=model)
+            latency_ms = (time.perf_counter() - start) * 1000
+            # Failures are not recorded so a later re-record can fill them in
+            if not enrichment_failed(result):
+                self.cassette.put(key, self.provider, model, alert.id,
+                                  result.model_dump_json(), latency_ms)
+            return result
+
+        row = self.cassette.get(key)
+        if row is None:
+            if self.on_miss == "error":
+                raise LookupError(f"No cassette recording for alert {alert.id}")
+            return self._miss(alert, model)
+        response, latency_ms = row
+        if self.latency_scale > 0:
+            time.sleep(latency_ms * self.latency_scale / 1000.0)
+        return EnrichedAlertOutput.model_validate_json(response)
+
+    def _miss(self, alert, model: Optional[str]) -> EnrichedAlertOutput:
+        logger.warning(f"Cassette miss for alert {alert.id}")
+        fallback = Enrichment(
+            summary_text="Cassette has no recording for this alert.",
+            tags=[],
+            risk_score=0,
+            false_positive_likelihood=1.0,
+            alert_category="Unknown",
+            remediation_steps=[],
+            related_cves=[],
+            external_refs=[],
+            llm_model_version=model,
+            enriched_by=f"{model}@cassette",
+            enrichment_duration_ms=0,
+            yara_matches=[],
+            raw_llm_response=None,
+            error="Cassette miss",
+        )
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert.id,
+            timestamp=datetime.now(timezone.utc),
+            alert=alert,
+            enrichment=fallback
+        )
+
+
+def get_cassette_query() -> CassetteQuery:
+    """
+    Builds the cassette query function from CASSETTE_* settings. In record mode the
+    wrapped provider is CASSETTE_PROVIDER, metered as usual (real spend).
+    """
+    from core.factory import get_provider_function
+    if CASSETTE_PROVIDER == "cassette":
+        raise ValueError("CASSETTE_PROVIDER must name a real provider")
+    inner = get_provider_function(CASSETTE_PROVIDER) if CASSETTE_MODE == "record" else None
+    cassette = Cassette(CASSETTE_PATH)
+    logger.info(f"Cassette {CASSETTE_MODE} for {CASSETTE_PROVIDER}: {CASSETTE_PATH} ({len(cassette)} recordings)")
+    return CassetteQuery(
+        cassette,
+        CASSETTE_PROVIDER,
+        mode=CASSETTE_MODE,
+        inner=inner,
+        latency_scale=CASSETTE_LATENCY_SCALE,
+        on_miss=CASSETTE_ON_MISS,
+    )
@@ -3,25 +3,26 @@ Claude provider integration for LLM enrichment.
 Handles API key loading, prompt formatting, and enrichment logic.
 """
 # providers/claude.py
-import json
 import time
 import requests
 import os
 import logging
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from schemas.input_schema import WazuhAlertInput
-from schemas.output_schema import Enrichment, EnrichedAlertOutput
+from schemas.input_schema import as_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput, enrichment_response_schema
 from core.yara_integration import get_yara_matches
-from providers.ollama import query_ollama
 from core.logger import log
-from core.utils import load_prompt_template
+from core.utils import load_prompt_template, parse_llm_json
+from core.cost import usage_fields
+from core import codec
+from config import STRUCTURED_OUTPUT
 
 load_dotenv()
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 if not ANTHROPIC_API_KEY:
     raise EnvironmentError("ANTHROPIC_API_KEY not found in .env")
-CLAUDE_API_URL = "https://api.anthropic.com/v1/messages"
+CLAUDE_API_URL = os.getenv("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages")
 
 HEADERS = {
     "x-api-key": ANTHROPIC_API_KEY,
@@ -29,6 +30,13 @@ HEADERS = {
     "content-type": "application/json"
 }
 
+# Anthropic has no JSON mode; forcing a single tool call constrains output to its input schema
+ENRICHMENT_TOOL = {
+    "name": "record_enrichment",
+    "description": "Record the structured enrichment for the Wazuh alert.",
+    "input_schema": enrichment_response_schema(),
+}
+
 logger = logging.getLogger("llm_enrichment")
 
 def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
@@ -36,7 +44,7 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
     Enriches a Wazuh alert using the Claude API.
 
     Args:
-        alert (dict): The alert data to enrich.
+        alert (WazuhAlertInput or dict): The alert to enrich; dicts are validated first.
         model (str): The Claude model to use (default: "claude-3-sonnet").
 
     Returns:
@@ -51,12 +59,12 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
         model = os.getenv("LLM_MODEL", "claude-3-sonnet")
 
     try:
-        alert_obj = WazuhAlertInput(**alert)
+        alert_obj = as_alert(alert)
     except Exception as e:
         raise ValueError(f"Invalid input alert format: {e}")
 
     # YARA integration: load rules and scan alert
-    yara_results = get_yara_matches(alert)
+    yara_results = get_yara_matches(alert_obj)
 
     try:
         template = load_prompt_template("templates/prompt_template.txt")
@@ -64,8 +72,8 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
         raise RuntimeError(f"Failed to load prompt template: {e}")
 
     prompt = template.format(
-        alert_json=json.dumps(alert_obj.model_dump(), indent=2),
-        # Always keep yara_results as a list for schema consistency
+        alert_json=codec.dumps(alert_obj.model_dump(), indent=True),
+        yara_results=codec.dumps(yara_results, indent=True) if yara_results else "None"
     )
 
     payload = {
@@ -79,17 +87,25 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
             }
         ]
     }
+    if STRUCTURED_OUTPUT:
+        payload["tools"] = [ENRICHMENT_TOOL]
+        payload["tool_choice"] = {"type": "tool", "name": ENRICHMENT_TOOL["name"]}
 
+    usage = {}
     try:
         start = time.time()
         response = requests.post(CLAUDE_API_URL, headers=HEADERS, json=payload, timeout=45)
         response.raise_for_status()
 
-        content = response.json()["content"][0]["text"].strip()
-        if content.startswith("```"):
-            content = content.replace("```json", "").replace("```", "").strip()
-
-        enrichment_data = json.loads(content)
+        api_json = response.json()
+        usage = api_json.get("usage") or {}
+        blocks = api_json["content"]
+        tool_input = next((b["input"] for b in blocks if b.get("type") == "tool_use"), None)
+        if tool_input is not None:
+            enrichment_data = dict(tool_input)
+        else:
+            content = next(b["text"] for b in blocks if b.get("type") == "text")
+            enrichment_data = parse_llm_json(content)
         if "yara_results" in enrichment_data and "yara_matches" not in enrichment_data:
             enrichment_data["yara_matches"] = enrichment_data.pop("yara_results")
         enrichment_data["yara_matches"] = enrichment_data.get("yara_matches", yara_results)
@@ -97,10 +113,11 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
             "llm_model_version": model,
             "enriched_by": f"{model}@claude-api",
             "enrichment_duration_ms": int((time.time() - start) * 1000),
+            **usage_fields("claude", model, usage.get("input_tokens"), usage.get("output_tokens")),
         })
         enrichment = Enrichment(**enrichment_data)
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=enrichment
@@ -110,6 +127,7 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
         logger.error(f"Claude error: {e}")
         fallback_enrichment = Enrichment(
             summary_text=f"Enrichment failed: {e}",
+            error=str(e),
             tags=[],
             risk_score=0,
             false_positive_likelihood=1.0,
@@ -120,10 +138,11 @@ def query_claude(alert: dict, model: str = None) -> EnrichedAlertOutput:
             llm_model_version=model,
             enriched_by=f"{model}@claude-api",
             enrichment_duration_ms=0,
-            yara_matches=yara_results
+            yara_matches=yara_results,
+            **usage_fields("claude", model, usage.get("input_tokens"), usage.get("output_tokens"))
         )
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=fallback_enrichment
@@ -5,16 +5,17 @@ Handles API key loading, prompt formatting, and enrichment logic.
 # providers/gemini.py
 
 import os
-import json
 import time
 import logging
 import requests
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from schemas.input_schema import WazuhAlertInput
-from schemas.output_schema import Enrichment, EnrichedAlertOutput
-from providers.ollama import query_ollama
-from core.utils import load_prompt_template
+from schemas.input_schema import as_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput, enrichment_response_schema
+from core.utils import load_prompt_template, parse_llm_json
+from core.cost import usage_fields
+from core import codec
+from config import STRUCTURED_OUTPUT
 
 load_dotenv()
 logger = logging.getLogger("llm_enrichment")
@@ -28,28 +29,23 @@ HEADERS = {
     "Content-Type": "application/json",
     "x-goog-api-key": GEMINI_API_KEY
 }
-GEMINI_API_URL_TEMPLATE = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+GEMINI_API_URL_TEMPLATE = os.getenv(
+    "GEMINI_API_URL_TEMPLATE",
+    "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+)
 PROMPT_TEMPLATE_PATH = "templates/prompt_template.txt"
-
-def clean_llm_response(text: str) -> str:
-    """Cleans LLM JSON code block wrappers like ```json ...```."""
-    if text.startswith("```"):
-        text = text.replace("```json", "").replace("```", "").strip()
-    text = text.strip()
-    if not text.startswith('{'):
-        idx = text.find('{')
-        if idx != -1:
-            text = text[idx:]
-    import re
-    text = re.sub(r',([ \t\r\n]*[}\]])', r'\1', text)
-    return text
+# JSON mode with a response schema; Gemini accepts the OpenAPI schema subset
+GENERATION_CONFIG = {
+    "responseMimeType": "application/json",
+    "responseSchema": enrichment_response_schema(openapi_subset=True),
+}
 
 def query_gemini(alert: dict, model: str = None) -> EnrichedAlertOutput:
     """
     Enriches a Wazuh alert using the Gemini API.
 
     Args:
-        alert (dict): The alert data to enrich.
+        alert (WazuhAlertInput or dict): The alert to enrich; dicts are validated first.
         model (str): The Gemini model to use (default: from .env).
 
     Returns:
@@ -60,39 +56,22 @@ def query_gemini(alert: dict, model: str = None) -> EnrichedAlertOutput:
     raw_llm_response = None
 
     try:
-        alert_obj = WazuhAlertInput(**alert)
+        alert_obj = as_alert(alert)
     except Exception as e:
-        # Defensive: yara_results is always defined
-        fallback_enrichment = Enrichment(
-            summary_text=f"Enrichment failed: {e}",
-            tags=[],
-            risk_score=0,
-            false_positive_likelihood=1.0,
-            alert_category="Unknown",
-            remediation_steps=[],
-            related_cves=[],
-            external_refs=[],
-            llm_model_version=model,
-            enriched_by=f"{model}@gemini-api",
-            enrichment_duration_ms=0,
-            yara_matches=[],
-            raw_llm_response=raw_llm_response
-        )
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
-            timestamp=datetime.now(timezone.utc),
-            alert=alert,
-            enrichment=fallback_enrichment
-        )
+        raise ValueError(f"Invalid input alert format: {e}")
 
+    usage = {}
     try:
         template = load_prompt_template(PROMPT_TEMPLATE_PATH)
         prompt = template.format(
-            alert_json=json.dumps(alert_obj.model_dump(), indent=2),
+            alert_json=codec.dumps(alert_obj.model_dump(), indent=True),
+            yara_results=codec.dumps(yara_results, indent=True) if yara_results else "None"
         )
         payload = {
             "contents": [{"parts": [{"text": prompt}]}]
         }
+        if STRUCTURED_OUTPUT:
+            payload["generationConfig"] = GENERATION_CONFIG
 
         start = time.time()
         response = requests.post(
@@ -103,12 +82,12 @@ def query_gemini(alert: dict, model: str = None) -> EnrichedAlertOutput:
         )
         response.raise_for_status()
         api_json = response.json()
+        usage = api_json.get("usageMetadata") or {}
         raw_llm_response = api_json["candidates"][0]["content"]["parts"][0]["text"].strip()
         enrichment_data = {}
         if raw_llm_response:
-            json_text = clean_llm_response(raw_llm_response)
             try:
-                enrichment_data = json.loads(json_text)
+                enrichment_data = parse_llm_json(raw_llm_response)
                 # Normalize key if LLM returns 'yara_results'
                 if "yara_results" in enrichment_data and "yara_matches" not in enrichment_data:
                     enrichment_data["yara_matches"] = enrichment_data.pop("yara_results")
@@ -123,12 +102,13 @@ def query_gemini(alert: dict, model: str = None) -> EnrichedAlertOutput:
             "llm_model_version": model,
             "enriched_by": f"{model}@gemini-api",
             "enrichment_duration_ms": int((time.time() - start) * 1000),
-            "raw_llm_response": raw_llm_response
+            "raw_llm_response": raw_llm_response,
+            **usage_fields("gemini", model, usage.get("promptTokenCount"), usage.get("candidatesTokenCount")),
         })
 
         enrichment = Enrichment(**enrichment_data)
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=enrichment
@@ -139,6 +119,7 @@ def query_gemini(alert: dict, model: str = None) -> EnrichedAlertOutput:
         # Defensive: ensure yara_results is always defined
         fallback_enrichment = Enrichment(
             summary_text=f"Enrichment failed: {e}",
+            error=str(e),
             tags=[],
             risk_score=0,
             false_positive_likelihood=1.0,
@@ -150,10 +131,11 @@ def query_gemini(alert: dict, model: str = None) -> EnrichedAlertOutput:
             enriched_by=f"{model}@gemini-api",
             enrichment_duration_ms=0,
             yara_matches=[],
-            raw_llm_response=raw_llm_response
+            raw_llm_response=raw_llm_response,
+            **usage_fields("gemini", model, usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
         )
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=fallback_enrichment
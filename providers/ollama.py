@@ -10,31 +10,21 @@ import time
 import logging
 import requests
 from datetime import datetime, timezone
-from schemas.input_schema import WazuhAlertInput
-from schemas.output_schema import Enrichment, EnrichedAlertOutput
+from schemas.input_schema import as_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput, enrichment_response_schema
 from core.yara_integration import get_yara_matches
-from core.utils import load_prompt_template  # shared utility
+from core.utils import load_prompt_template, parse_llm_json  # shared utilities
+from core.cost import usage_fields
+from core import codec
+from config import STRUCTURED_OUTPUT
 
 logger = logging.getLogger("llm_enrichment")
 
 OLLAMA_API = os.getenv("OLLAMA_API", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3:8b")
 PROMPT_TEMPLATE_PATH = "templates/prompt_template.txt"
-
-
-def clean_llm_response(raw: str) -> str:
-    """
-    Removes code block formatting from LLM responses.
-
-    Args:
-        raw (str): The raw response string from the LLM.
-
-    Returns:
-        str: Cleaned string without code block formatting.
-    """
-    if raw.startswith("```"):
-        raw = raw.replace("```json", "").replace("```", "").strip()
-    return raw
+# Ollama >= 0.5 accepts a JSON schema in "format" and constrains decoding to it
+RESPONSE_FORMAT = enrichment_response_schema() if STRUCTURED_OUTPUT else None
 
 
 from typing import Optional
@@ -44,7 +34,7 @@ def query_ollama(alert: dict, model: Optional[str] = None) -> EnrichedAlertOutpu
     Enriches a Wazuh alert using the Ollama API.
 
     Args:
-        alert (dict): The alert data to enrich.
+        alert (WazuhAlertInput or dict): The alert to enrich; dicts are validated first.
         model (str, optional): The Ollama model to use. If not provided, uses OLLAMA_MODEL from env.
 
     Returns:
@@ -54,7 +44,7 @@ def query_ollama(alert: dict, model: Optional[str] = None) -> EnrichedAlertOutpu
         model = os.getenv("OLLAMA_MODEL", "phi3:mini")
 
     try:
-        alert_obj = WazuhAlertInput(**alert)
+        alert_obj = as_alert(alert)
     except Exception as e:
         logger.error(f"Invalid input alert format: {e}")
         raise ValueError(f"Invalid input alert format: {e}")
@@ -62,28 +52,34 @@ def query_ollama(alert: dict, model: Optional[str] = None) -> EnrichedAlertOutpu
     # Defensive YARA handling: always define yara_results
     yara_results = []
     try:
-        yara_results = get_yara_matches(alert)
+        yara_results = get_yara_matches(alert_obj)
     except Exception as e:
         logger.warning(f"YARA scan failed or no rules loaded: {e}")
         yara_results = []
 
+    api_json = {}
     try:
         template = load_prompt_template(PROMPT_TEMPLATE_PATH)
         prompt = template.format(
-            alert_json=json.dumps(alert_obj.model_dump(), indent=2),
-            yara_results=json.dumps(yara_results, indent=2) if yara_results else "None"
+            alert_json=codec.dumps(alert_obj.model_dump(), indent=True),
+            yara_results=codec.dumps(yara_results, indent=True) if yara_results else "None"
         )
 
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if RESPONSE_FORMAT:
+            payload["format"] = RESPONSE_FORMAT
+
         start = time.time()
         response = requests.post(
             OLLAMA_API,
-            json={"model": model, "prompt": prompt, "stream": False},
+            json=payload,
             timeout=45
         )
         response.raise_for_status()
 
-        raw = response.json().get("response", "").strip()
-        parsed_json = json.loads(clean_llm_response(raw))
+        api_json = response.json()
+        raw = api_json.get("response", "").strip()
+        parsed_json = parse_llm_json(raw)
 
         # Normalize key if LLM returns 'yara_results'
         if "yara_results" in parsed_json and "yara_matches" not in parsed_json:
@@ -94,11 +90,12 @@ def query_ollama(alert: dict, model: Optional[str] = None) -> EnrichedAlertOutpu
         parsed_json.update({
             "llm_model_version": model,
             "enriched_by": f"{model}@ollama-api",
-            "enrichment_duration_ms": int((time.time() - start) * 1000)
+            "enrichment_duration_ms": int((time.time() - start) * 1000),
+            **usage_fields("ollama", model, api_json.get("prompt_eval_count"), api_json.get("eval_count"))
         })
         enrichment = Enrichment(**parsed_json)
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=enrichment
@@ -106,10 +103,13 @@ def query_ollama(alert: dict, model: Optional[str] = None) -> EnrichedAlertOutpu
 
     except (json.JSONDecodeError, KeyError) as e:
         logger.warning(f"Ollama returned invalid JSON: {e}")
+        error = f"Invalid JSON from Ollama: {e}"
     except requests.RequestException as e:
         logger.error(f"Ollama API request failed: {e}")
+        error = f"Ollama API request failed: {e}"
     except Exception as e:
         logger.error(f"Ollama enrichment error: {e}")
+        error = f"Ollama enrichment error: {e}"
     # Defensive: ensure yara_results is always defined
     fallback = Enrichment(
         summary_text=f"Ollama enrichment failed.",
@@ -124,11 +124,13 @@ def query_ollama(alert: dict, model: Optional[str] = None) -> EnrichedAlertOutpu
         enriched_by=f"{model}@ollama-api",
         enrichment_duration_ms=0,
         yara_matches=yara_results,
-        raw_llm_response=None
+        raw_llm_response=None,
+        error=error,
+        **usage_fields("ollama", model, api_json.get("prompt_eval_count"), api_json.get("eval_count"))
     )
 
-    return EnrichedAlertOutput(
-        alert_id=alert.get("id", "unknown-id"),
+    return EnrichedAlertOutput.model_construct(
+        alert_id=alert_obj.id,
         timestamp=datetime.now(timezone.utc),
         alert=alert_obj,
         enrichment=fallback
@@ -3,17 +3,18 @@ OpenAI provider integration for LLM enrichment.
 Handles API key loading, prompt formatting, and enrichment logic.
 """
 # providers/openai.py
-import json
 import time
 import openai
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
-from schemas.input_schema import WazuhAlertInput
-from schemas.output_schema import Enrichment, EnrichedAlertOutput
-from providers.ollama import query_ollama
+from schemas.input_schema import as_alert
+from schemas.output_schema import Enrichment, EnrichedAlertOutput, enrichment_response_schema
 from core.logger import log
-from core.utils import load_prompt_template
+from core.utils import load_prompt_template, parse_llm_json
+from core.cost import usage_fields
+from core import codec
+from config import STRUCTURED_OUTPUT
 from core.yara_integration import get_yara_matches
 import logging
 
@@ -25,13 +26,23 @@ openai.api_key = OPENAI_API_KEY
 
 logger = logging.getLogger("llm_enrichment")
 
+# Strict structured outputs: the model can only emit JSON matching the Enrichment schema
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "enrichment",
+        "schema": enrichment_response_schema(),
+        "strict": True,
+    },
+}
+
 
 def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
     """
     Enriches a Wazuh alert using the OpenAI API.
 
     Args:
-        alert (dict): The alert data to enrich.
+        alert (WazuhAlertInput or dict): The alert to enrich; dicts are validated first.
         model (str): The OpenAI model to use (default: "gpt-4").
 
     Returns:
@@ -47,12 +58,12 @@ def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
 
     # Validate alert input
     try:
-        alert_obj = WazuhAlertInput(**alert)
+        alert_obj = as_alert(alert)
     except Exception as e:
         raise ValueError(f"Invalid input alert format: {e}")
 
     # YARA integration: load rules and scan alert
-    yara_results = get_yara_matches(alert)
+    yara_results = get_yara_matches(alert_obj)
 
     # Load prompt template and include YARA results if present
     try:
@@ -61,10 +72,12 @@ def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
         raise RuntimeError(f"Failed to load prompt template: {e}")
 
     prompt = template.format(
-        alert_json=json.dumps(alert_obj.model_dump(), indent=2),
-        # Always keep yara_results as a list for schema consistency
+        alert_json=codec.dumps(alert_obj.model_dump(), indent=True),
+        yara_results=codec.dumps(yara_results, indent=True) if yara_results else "None"
     )
+    extra = {"response_format": RESPONSE_FORMAT} if STRUCTURED_OUTPUT else {}
 
+    usage = None
     try:
         start = time.time()
         response = openai.chat.completions.create(
@@ -73,18 +86,14 @@ def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=1024
+            max_tokens=1024,
+            **extra
         )
+        usage = response.usage
         content_raw = response.choices[0].message.content
         if content_raw is None:
             raise ValueError("OpenAI response content is None")
-        content = content_raw.strip()
-
-        # Remove code block formatting if present
-        if content.startswith("```"):
-            content = content.replace("```json", "").replace("```", "").strip()
-
-        enrichment_data = json.loads(content)
+        enrichment_data = parse_llm_json(content_raw)
         if "yara_results" in enrichment_data and "yara_matches" not in enrichment_data:
             enrichment_data["yara_matches"] = enrichment_data.pop("yara_results")
         enrichment_data["yara_matches"] = enrichment_data.get("yara_matches", yara_results)
@@ -92,10 +101,14 @@ def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
             "llm_model_version": model,
             "enriched_by": f"{model}@openai-api",
             "enrichment_duration_ms": int((time.time() - start) * 1000),
+            **usage_fields(
+                "openai", model,
+                getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+            ),
         })
         enrichment = Enrichment(**enrichment_data)
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=enrichment
@@ -105,6 +118,7 @@ def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
         logger.error(f"OpenAI error: {e}")
         fallback_enrichment = Enrichment(
             summary_text=f"Enrichment failed: {e}",
+            error=str(e),
             tags=[],
             risk_score=0,
             false_positive_likelihood=1.0,
@@ -115,10 +129,14 @@ def query_openai(alert: dict, model: str = None) -> EnrichedAlertOutput:
             llm_model_version=model,
             enriched_by=f"{model}@openai-api",
             enrichment_duration_ms=0,
-            yara_matches=yara_results
+            yara_matches=yara_results,
+            **usage_fields(
+                "openai", model,
+                getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+            )
         )
-        return EnrichedAlertOutput(
-            alert_id=alert.get("id", "unknown-id"),
+        return EnrichedAlertOutput.model_construct(
+            alert_id=alert_obj.id,
             timestamp=datetime.now(timezone.utc),
             alert=alert_obj,
             enrichment=fallback_enrichment
@@ -25,6 +25,9 @@ class Enrichment(BaseModel):
     yara_matches: Optional[List[Any]] = None
     raw_llm_response: Optional[str] = None
     error: Optional[str] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    estimated_cost_usd: Optional[float] = None
 
 class EnrichResponse(BaseModel):
     """Response payload for enrichment API."""
@@ -33,6 +36,32 @@ class EnrichResponse(BaseModel):
     alert: Dict[str, Any]
     enrichment: Enrichment
 
+class BatchItemResult(BaseModel):
+    """One NDJSON line of a /v1/enrich/batch response, in completion order."""
+    index: int = Field(..., description="Position of the item in the request body.")
+    status: str = Field(..., description="\"ok\" or \"error\".")
+    alert_id: Optional[str] = None
+    timestamp: Optional[str] = None
+    alert: Optional[Dict[str, Any]] = None
+    enrichment: Optional[Enrichment] = None
+    error: Optional[str] = None
+
+class JobAccepted(BaseModel):
+    """Response to POST /v1/jobs."""
+    job_id: str
+    status: str
+    status_url: str
+
+class JobStatus(BaseModel):
+    """Status of an enrichment job (queued, running, succeeded, failed)."""
+    job_id: str
+    status: str
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[EnrichResponse] = None
+    error: Optional[str] = None
+
 class ErrorResponse(BaseModel):
     """Error response schema."""
     error: str
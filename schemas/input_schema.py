@@ -1,59 +1,113 @@
-
 """
 Input schema definitions for Wazuh alerts in the LLM enrichment project.
 Uses Pydantic models for validation and type safety.
+
+This is the single alert schema: alerts are validated once at ingest (``as_alert``) and
+the resulting ``WazuhAlertInput`` is passed through enrichment, output and indexing.
 """
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from datetime import datetime, timezone
+import re
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import List, Optional, Dict, Any, Union
+
+# Fields Elasticsearch rejects inside a document (present in Kibana/ES exports)
+RESERVED_FIELDS = ("_index", "_id", "_version", "_score", "_source", "fields", "sort", "highlight")
+
+_ISO_PREFIX = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}")
 
 class Rule(BaseModel):
     """Schema for Wazuh rule details."""
-    level: Optional[int]
-    description: Optional[str]
-    id: Optional[str]
-    firedtimes: Optional[int]
-    mail: Optional[bool]
-    groups: Optional[List[str]]
-    pci_dss: Optional[List[str]]
-    gpg13: Optional[List[str]]
-    gdpr: Optional[List[str]]
-    hipaa: Optional[List[str]]
-    nist_800_53: Optional[List[str]]
-    tsc: Optional[List[str]]
-    mitre: Optional[Dict[str, List[str]]]
+    model_config = ConfigDict(extra="allow")
+    id: str = Field(..., description="Rule ID")
+    level: int = Field(..., description="Alert level")
+    description: Optional[str] = None
+    firedtimes: Optional[int] = None
+    mail: Optional[bool] = None
+    groups: Optional[List[str]] = None
+    pci_dss: Optional[List[str]] = None
+    gpg13: Optional[List[str]] = None
+    gdpr: Optional[List[str]] = None
+    hipaa: Optional[List[str]] = None
+    nist_800_53: Optional[List[str]] = None
+    tsc: Optional[List[str]] = None
+    mitre: Optional[Dict[str, List[str]]] = None
 
 class Agent(BaseModel):
     """Schema for Wazuh agent details."""
-    id: Optional[str]
-    name: Optional[str]
+    model_config = ConfigDict(extra="allow")
+    id: Optional[str] = None
+    name: Optional[str] = None
 
 class Manager(BaseModel):
     """Schema for Wazuh manager details."""
-    name: Optional[str]
+    model_config = ConfigDict(extra="allow")
+    name: Optional[str] = None
 
 class Decoder(BaseModel):
     """Schema for Wazuh decoder details."""
-    name: Optional[str]
-    parent: Optional[str]
-    ftscomment: Optional[str]
+    model_config = ConfigDict(extra="allow")
+    name: Optional[str] = None
+    parent: Optional[str] = None
+    ftscomment: Optional[str] = None
 
 class Predecoder(BaseModel):
     """Schema for Wazuh predecoder details."""
-    program_name: Optional[str]
-    timestamp: Optional[str]
-    hostname: Optional[str]
+    model_config = ConfigDict(extra="allow")
+    program_name: Optional[str] = None
+    timestamp: Optional[str] = None
+    hostname: Optional[str] = None
 
 class WazuhAlertInput(BaseModel):
     """Schema for the main Wazuh alert input."""
-    timestamp: str
-    rule: Rule
-    agent: Agent
-    manager: Optional[Manager]
+    model_config = ConfigDict(extra="allow")  # Allow extra fields for future compatibility
     id: str
-    full_log: Optional[str]
-    decoder: Optional[Decoder]
-    predecoder: Optional[Predecoder]
-    location: Optional[str]
+    timestamp: str = Field("", validate_default=True)
+    rule: Rule
+    agent: Optional[Agent] = None
+    manager: Optional[Manager] = None
+    full_log: Optional[str] = None
+    decoder: Optional[Decoder] = None
+    predecoder: Optional[Predecoder] = None
+    data: Optional[Dict[str, Any]] = None
+    input: Optional[Dict[str, Any]] = None
+    location: Optional[str] = None
+
+    @field_validator("timestamp", mode="before")
+    @classmethod
+    def validate_timestamp(cls, v):
+        """Ensure timestamp is ISO format, fallback to current UTC."""
+        if not v or not isinstance(v, str) or not _ISO_PREFIX.match(v):
+            return datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+        return v
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def validate_id(cls, v):
+        """Ensure alert ID is present and valid."""
+        if not v or not isinstance(v, str):
+            raise ValueError("Missing or invalid alert id")
+        return v
+
+def as_alert(alert: Union[WazuhAlertInput, Dict[str, Any]]) -> WazuhAlertInput:
+    """
+    Returns ``alert`` as a WazuhAlertInput, validating only if it is not one already.
+
+    Reserved Elasticsearch fields are dropped from dict input before validation.
+
+    Raises:
+        pydantic.ValidationError: If a dict does not match the schema.
+    """
+    if isinstance(alert, WazuhAlertInput):
+        return alert
+    if any(field in alert for field in RESERVED_FIELDS):
+        alert = {k: v for k, v in alert.items() if k not in RESERVED_FIELDS}
+    return WazuhAlertInput.model_validate(alert)
 
-    class Config:
-        extra = "allow"  # Allow extra fields for future compatibility
+def alert_fields(alert: Union[WazuhAlertInput, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the alert's fields as a dict; for a WazuhAlertInput only the fields it was
+    built with, so a validated alert hashes the same as the dict it came from.
+    """
+    if isinstance(alert, WazuhAlertInput):
+        return alert.model_dump(exclude_unset=True)
+    return alert
@@ -23,6 +23,10 @@ class Enrichment(BaseModel):
     enrichment_duration_ms: Optional[int]
     yara_matches: Optional[list] = None  # List of YARA match results (rule, tags, meta)
     raw_llm_response: Optional[str] = None  # For debugging: raw LLM output
+    error: Optional[str] = None  # Set on provider fallbacks; None means the LLM call succeeded
+    input_tokens: Optional[int] = None  # Prompt tokens reported by the provider
+    output_tokens: Optional[int] = None  # Completion tokens reported by the provider
+    estimated_cost_usd: Optional[float] = None  # From the configured price table; None if unpriced
 
 class EnrichedAlertOutput(BaseModel):
     """Schema for the final enriched alert output."""
@@ -30,3 +34,48 @@ class EnrichedAlertOutput(BaseModel):
     timestamp: datetime
     alert: WazuhAlertInput
     enrichment: Enrichment
+
+# Fields the LLM is asked to produce; the remaining Enrichment fields are set by the provider.
+LLM_RESPONSE_FIELDS = (
+    "summary_text",
+    "tags",
+    "risk_score",
+    "false_positive_likelihood",
+    "alert_category",
+    "remediation_steps",
+    "related_cves",
+    "external_refs",
+)
+
+def enrichment_response_schema(openapi_subset: bool = False) -> dict:
+    """
+    Builds the JSON schema for the LLM response from the Enrichment model.
+
+    Optional fields are rendered as their plain type (constrained decoders reject
+    ``anyOf`` with null) and every field is required, as OpenAI strict mode expects.
+
+    Args:
+        openapi_subset (bool): Emit the OpenAPI subset accepted by Gemini ``responseSchema``
+            (no ``additionalProperties``, explicit ``propertyOrdering``).
+
+    Returns:
+        dict: JSON schema for an object with the LLM_RESPONSE_FIELDS.
+    """
+    model_props = Enrichment.model_json_schema()["properties"]
+    properties = {}
+    for name in LLM_RESPONSE_FIELDS:
+        prop = model_props[name]
+        variants = [v for v in prop.get("anyOf", [prop]) if v.get("type") != "null"]
+        properties[name] = {
+            k: v for k, v in variants[0].items() if k in ("type", "items", "minimum", "maximum")
+        }
+    schema = {
+        "type": "object",
+        "properties": properties,
+        "required": list(LLM_RESPONSE_FIELDS),
+    }
+    if openapi_subset:
+        schema["propertyOrdering"] = list(LLM_RESPONSE_FIELDS)
+    else:
+        schema["additionalProperties"] = False
+    return schema
@@ -1,4 +1,5 @@
 from core.factory import get_llm_query_function
+from core.preprocessing import normalize_alert
 import json
 import time
 import requests
@@ -6,28 +7,6 @@ import sys
 
 USE_API = True  # Set to False for local enrichment
 
-def fill_missing_fields(alert):
-    alert.setdefault("full_log", "")
-    predecoder_defaults = {
-        "program_name": "",
-        "timestamp": "",
-        "hostname": ""
-    }
-    if "predecoder" not in alert or not isinstance(alert["predecoder"], dict):
-        alert["predecoder"] = predecoder_defaults.copy()
-    else:
-        for k, v in predecoder_defaults.items():
-            alert["predecoder"].setdefault(k, v)
-    alert.setdefault("decoder", {"name": "", "parent": "", "ftscomment": ""})
-    if "decoder" in alert:
-        alert["decoder"].setdefault("parent", "")
-        alert["decoder"].setdefault("ftscomment", "")
-    if "rule" in alert:
-        alert["rule"].setdefault("gpg13", [])
-        alert["rule"].setdefault("hipaa", [])
-        alert["rule"].setdefault("mitre", {"id": [], "technique": []})
-    return alert
-
 # Load and preprocess alert, then wrap for API compatibility
 try:
     with open("sample_alert.json", "r", encoding="utf-8") as f:
@@ -36,7 +15,7 @@ try:
             alert_obj = alert_json['_source']
         else:
             alert_obj = alert_json
-        alert_obj = fill_missing_fields(alert_obj)
+        alert_obj = normalize_alert(alert_obj)
 except Exception:
     alert_obj = {
         "id": "test-1",
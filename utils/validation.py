@@ -4,13 +4,14 @@ Validation utilities for the LLM enrichment project.
 Validates input alerts and enriched output schemas using Pydantic models.
 """
 # utils/validation.py
-from schemas.input_schema import WazuhAlertInput
+from schemas.input_schema import WazuhAlertInput, as_alert
 from schemas.output_schema import EnrichedAlertOutput
 from core.logger import log
 
-def validate_input_alert(data: dict):
+def validate_input_alert(data: dict) -> WazuhAlertInput:
     """
     Validates the input alert data against the WazuhAlertInput schema.
+    This is the one validation an alert gets; later stages take the returned object as trusted.
 
     Args:
         data (dict): The input alert data to validate.
@@ -22,13 +23,13 @@ def validate_input_alert(data: dict):
         Exception: If validation fails.
     """
     try:
-        return WazuhAlertInput(**data)
+        return as_alert(data)
     except Exception as e:
         log(f"Invalid input schema: {e}", tag="!")
         # Log the problematic alert data (truncate if very large)
-        import json
+        from core import codec
         try:
-            alert_str = json.dumps(data)
+            alert_str = codec.dumps(data)
         except Exception:
             alert_str = str(data)
         if len(alert_str) > 1000: